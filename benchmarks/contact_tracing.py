@@ -0,0 +1,116 @@
+"""
+Benchmarks contact tracing queries over a large gateway record table.
+
+Seeds --records check-ins of --tokens tokens spread over --gateways gateways
+and --days days, then times find_contacts for random tokens.
+
+Runs against a throwaway test database of the configured backend, so
+migrations must exist first (`python manage.py makemigrations`).
+
+    SECRET_KEY=bench python benchmarks/contact_tracing.py --records 10000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from gateway.helpers.contact_tracing import find_contacts  # noqa: E402
+from gateway.models import (  # noqa: E402
+    Gateway,
+    GatewayRecord,
+    Identity,
+    SiteOwner,
+    Token,
+)
+
+User = get_user_model()
+
+
+def token_uuid(n):
+    return ":".join(f"{byte:02x}" for byte in n.to_bytes(6, "big"))
+
+
+def seed(args):
+    User.objects.bulk_create(
+        User(email=f"owner{n}@gmail.com") for n in range(args.gateways)
+    )
+    users = User.objects.order_by("id")
+    SiteOwner.objects.bulk_create(
+        SiteOwner(user=user, postal_code=f"{n:06d}", unit_no="01-001", activation_key=n)
+        for n, user in enumerate(users)
+    )
+    Gateway.objects.bulk_create(
+        Gateway(gateway_id=f"{n:06d}-01-001-1", site_owner_id=user.pk)
+        for n, user in enumerate(users)
+    )
+    gateway_ids = list(Gateway.objects.values_list("id", flat=True))
+    Identity.objects.bulk_create(
+        Identity(nric=f"S{n:07d}A", fullname="", address="", phone_num=f"{n:08d}")
+        for n in range(args.tokens)
+    )
+    Token.objects.bulk_create(
+        Token(token_uuid=token_uuid(n), owner_id=owner_id, hashed_pin="")
+        for n, owner_id in enumerate(Identity.objects.values_list("id", flat=True))
+    )
+    token_ids = list(Token.objects.values_list("id", flat=True))
+
+    start = datetime(2021, 10, 1, tzinfo=timezone.utc)
+    seconds = args.days * 24 * 3600
+    for offset in range(0, args.records, args.batch_size):
+        GatewayRecord.objects.bulk_create(
+            GatewayRecord(
+                token_id=random.choice(token_ids),
+                gateway_id=random.choice(gateway_ids),
+                timestamp=start + timedelta(seconds=random.randrange(seconds)),
+            )
+            for _ in range(min(args.batch_size, args.records - offset))
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=1000000)
+    parser.add_argument("--tokens", type=int, default=100000)
+    parser.add_argument("--gateways", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--window", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"Seeding {args.records} records on {connection.vendor}...")
+        seed(args)
+        timings = []
+        contacts = []
+        for _ in range(args.queries):
+            uuid = token_uuid(random.randrange(args.tokens))
+            start = time.perf_counter()
+            result = find_contacts(uuid, args.window, scope="premises")
+            timings.append(time.perf_counter() - start)
+            contacts.append(len(result["contacts"]))
+
+        print(f"median: {statistics.median(timings) * 1000:.1f} ms")
+        print(f"max:    {max(timings) * 1000:.1f} ms")
+        print(f"contacts per token: {statistics.mean(contacts):.1f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Load script for comparing the WSGI and ASGI deployments under the same load.
+
+Each worker thread keeps one keep-alive connection and posts check-ins as fast
+as the server answers, while `--idle-connections` extra connections are held
+open without sending requests, like gateways waiting for the next scan.
+
+    python benchmarks/load_checkin.py --url http://localhost:8000 \\
+        --auth-token <knox token> --token-uuid <uuid> --gateway-id <id> --pin <pin>
+"""
+
+import argparse
+import http.client
+import json
+import socket
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+
+def worker(args, url, latencies, errors, deadline):
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+    body = json.dumps(
+        {"token_uuid": args.token_uuid, "gateway_id": args.gateway_id, "pin": args.pin}
+    )
+    headers = {
+        "Authorization": f"Token {args.auth_token}",
+        "Content-Type": "application/json",
+    }
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            connection.request(
+                "POST", f"{url.path}/api/v1/gatewayrecord/", body, headers
+            )
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            connection.close()
+            continue
+        if response.status != 200:
+            errors.append(response.status)
+        latencies.append(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--auth-token", required=True)
+    parser.add_argument("--token-uuid", required=True)
+    parser.add_argument("--gateway-id", required=True)
+    parser.add_argument("--pin", required=True)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--idle-connections", type=int, default=0)
+    parser.add_argument("--duration", type=float, default=30)
+    args = parser.parse_args()
+    url = urlparse(args.url)
+
+    idle_connections = [
+        socket.create_connection((url.hostname, url.port or 80))
+        for _ in range(args.idle_connections)
+    ]
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args, url, latencies, errors, deadline))
+        for _ in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for idle_connection in idle_connections:
+        idle_connection.close()
+
+    print(f"requests:   {len(latencies)} ({len(errors)} errors)")
+    print(f"throughput: {len(latencies) / args.duration:.1f} req/s")
+    if len(latencies) < 2:
+        return
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(f"p50:        {percentiles[49] * 1000:.1f} ms")
+    print(f"p95:        {percentiles[94] * 1000:.1f} ms")
+    print(f"p99:        {percentiles[98] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmarks site owner registration with the pre-checked and the insert-retry activation key.
+
+The pre-checked variant reproduces the previous flow: a uniqueness query
+per candidate key and an update once the site owner is created. Passwords
+are hashed with MD5 unless --real-hasher is given, so that the numbers show
+the database round trips rather than PBKDF2.
+
+Runs against a throwaway test database of the configured backend, so
+migrations must exist first (`python manage.py makemigrations`).
+
+    SECRET_KEY=bench python benchmarks/registration.py --registrations 2000
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils.crypto import get_random_string  # noqa: E402
+from gateway.helpers import verify_email  # noqa: E402
+from gateway.models import SiteOwner  # noqa: E402
+from gateway.serializers import SiteOwnerSerializer  # noqa: E402
+
+
+def registration(n, prefix):
+    return {
+        "email": f"{prefix}{n}@gmail.com",
+        "password": "Gateway-Pass-9021",
+        "password2": "Gateway-Pass-9021",
+        "postal_code": 100000 + n,
+        "unit_no": prefix[:3],
+    }
+
+
+def prechecked_activation_key(email):
+    while True:
+        activation_key = hashlib.sha512(
+            (get_random_string(20) + settings.SECRET_KEY + email).encode("utf-8")
+        ).hexdigest()
+        if not SiteOwner.objects.filter(activation_key=activation_key).exists():
+            return activation_key
+
+
+def register_prechecked(data):
+    serializer = SiteOwnerSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    activation_key = prechecked_activation_key(data["email"])
+    site_owner = serializer.save(activation_key=get_random_string(43))
+    site_owner.activation_key = activation_key
+    site_owner.save()
+
+
+def register_insert_retry(data):
+    serializer = SiteOwnerSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    verify_email.save_with_activation_key(
+        lambda activation_key: serializer.save(activation_key=activation_key)
+    )
+
+
+def run(register, registrations, prefix):
+    with CaptureQueriesContext(connection) as queries:
+        register(registration(0, prefix))
+    start = time.perf_counter()
+    for n in range(1, registrations):
+        register(registration(n, prefix))
+    elapsed = time.perf_counter() - start
+    return (registrations - 1) / elapsed, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--registrations", type=int, default=2000)
+    parser.add_argument("--real-hasher", action="store_true")
+    args = parser.parse_args()
+
+    # Only the first registration of each run is captured
+    settings.DEBUG = False
+    if not args.real_hasher:
+        settings.PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"Registering {args.registrations} site owners on {connection.vendor}...")
+        for label, register, prefix in (
+            ("pre-checked ", register_prechecked, "pre"),
+            ("insert-retry", register_insert_retry, "ins"),
+        ):
+            throughput, queries = run(register, args.registrations, prefix)
+            print(f"{label}: {throughput:.0f} registrations/s, {queries} queries each")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
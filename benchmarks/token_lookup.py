@@ -0,0 +1,88 @@
+"""
+Benchmarks check-in token lookups with and without the (token_uuid, status) index.
+
+Runs against a throwaway test database of the configured backend, so
+migrations must exist first (`python manage.py makemigrations`).
+
+    SECRET_KEY=bench python benchmarks/token_lookup.py --tokens 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from gateway.models import Identity, Token  # noqa: E402
+
+
+def token_uuid(n):
+    return ":".join(f"{byte:02x}" for byte in n.to_bytes(6, "big"))
+
+
+def seed(num_tokens, batch_size):
+    for start in range(0, num_tokens, batch_size):
+        stop = min(start + batch_size, num_tokens)
+        Identity.objects.bulk_create(
+            Identity(nric=f"S{n:07d}A", fullname="", address="", phone_num=f"{n:08d}")
+            for n in range(start, stop)
+        )
+        owner_ids = (
+            Identity.objects.filter(nric__in=[f"S{n:07d}A" for n in range(start, stop)])
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        Token.objects.bulk_create(
+            Token(token_uuid=token_uuid(n), owner_id=owner_id, hashed_pin="")
+            for n, owner_id in zip(range(start, stop), owner_ids)
+        )
+
+
+def time_lookups(uuids):
+    start = time.perf_counter()
+    for uuid in uuids:
+        Token.objects.filter(token_uuid=uuid, status=True).first()
+    return (time.perf_counter() - start) / len(uuids) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tokens", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"Seeding {args.tokens} tokens on {connection.vendor}...")
+        seed(args.tokens, args.batch_size)
+        uuids = [token_uuid(random.randrange(args.tokens)) for _ in range(args.lookups)]
+
+        index = next(
+            index
+            for index in Token._meta.indexes
+            if index.name == "token_uuid_status_idx"
+        )
+        indexed = time_lookups(uuids)
+        with connection.schema_editor() as schema_editor:
+            schema_editor.remove_index(Token, index)
+        scanned = time_lookups(uuids)
+
+        print(f"index lookup: {indexed:.3f} ms")
+        print(f"scan lookup:  {scanned:.3f} ms")
+        print(f"speedup:      {scanned / indexed:.1f}x")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+import hashlib
+
+
+def make_key(key, key_prefix, version):
+    """
+    Cache key function hashing the key, since keys embed client-supplied ids
+    that memcached does not accept verbatim (spaces, control characters or over
+    250 characters).
+    """
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"{key_prefix}:{version}:{digest}"
@@ -51,7 +51,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "knox.auth.TokenAuthentication",
+        "gateway.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
@@ -119,6 +119,44 @@ if os.environ.get("GITHUB_ACTIONS"):
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+#
+# Local memory caches are private to each worker. Production uses a memcached
+# server shared by the gunicorn workers (see production.yml), so invalidations
+# reach all of them and entries are only evicted once it is out of memory.
+
+CACHE_BACKEND = os.environ.get(
+    "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+)
+CACHE_LOCATION = os.environ.get("CACHE_LOCATION", "web-gateway")
+# Entries kept per alias by the local memory and file based caches
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "100000"))
+
+
+def cache_alias(name, **overrides):
+    if "memcached" in CACHE_BACKEND:
+        # Aliases share the server and are told apart by their key prefix
+        location, options = CACHE_LOCATION, {}
+    else:
+        location = os.path.join(CACHE_LOCATION, name)
+        options = {"MAX_ENTRIES": CACHE_MAX_ENTRIES, "CULL_FREQUENCY": 10}
+    return {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": location,
+        "KEY_PREFIX": name,
+        "KEY_FUNCTION": "config.cache.make_key",
+        "OPTIONS": options,
+        **overrides,
+    }
+
+
+CACHES = {
+    "default": cache_alias("default"),
+    "gateways": cache_alias("gateways", TIMEOUT=None),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -181,3 +219,126 @@ EMAIL_PORT = 587
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = True
+# Seconds before a stalled SMTP connection is given up on
+EMAIL_TIMEOUT = int(os.environ.get("EMAIL_TIMEOUT", "30"))
+
+# Verification emails are queued in the outbox and sent by `send_queued_emails`
+EMAIL_OUTBOX_BATCH_SIZE = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", "8"))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.environ.get("EMAIL_OUTBOX_RETRY_DELAY", "30"))
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.environ.get("EMAIL_OUTBOX_POLL_INTERVAL", "5"))
+# Seconds a batch of emails stays claimed by a sender, which must exceed the
+# time it takes to send a batch
+EMAIL_OUTBOX_LEASE = int(os.environ.get("EMAIL_OUTBOX_LEASE", "1800"))
+
+# Maximum number of gateways a site owner may provision
+MAX_GATEWAYS_PER_SITE_OWNER = int(os.environ.get("MAX_GATEWAYS_PER_SITE_OWNER", "4"))
+
+# Gateway records are partitioned by "day" or "month" and dropped once all the
+# records of a partition are older than the retention
+GATEWAY_RECORD_PARTITION_PERIOD = os.environ.get(
+    "GATEWAY_RECORD_PARTITION_PERIOD", "day"
+)
+GATEWAY_RECORD_RETENTION_DAYS = int(
+    os.environ.get("GATEWAY_RECORD_RETENTION_DAYS", "30")
+)
+GATEWAY_RECORD_PARTITIONS_AHEAD = int(
+    os.environ.get("GATEWAY_RECORD_PARTITIONS_AHEAD", "7")
+)
+
+# Seconds within which a repeat scan of a token at a gateway, with the same PIN,
+# is answered without being recorded again; 0 disables duplicate suppression
+CHECKIN_DEDUP_WINDOW = float(os.environ.get("CHECKIN_DEDUP_WINDOW", "30"))
+
+# Seconds the result of a check-in submitted with a sequence number is kept to
+# answer retries of the same scan
+CHECKIN_IDEMPOTENCY_TTL = int(os.environ.get("CHECKIN_IDEMPOTENCY_TTL", "86400"))
+
+# Seconds a gateway clock may be ahead; a check-in with a sequence number and a
+# later timestamp is rejected
+CHECKIN_MAX_CLOCK_SKEW = float(os.environ.get("CHECKIN_MAX_CLOCK_SKEW", "60"))
+
+# Seconds between two writes of the check-in counters of a process
+OCCUPANCY_FLUSH_INTERVAL = float(os.environ.get("OCCUPANCY_FLUSH_INTERVAL", "5"))
+
+# Seconds between two writes of the allow-list PIN verifiers of a process
+PIN_VERIFIER_FLUSH_INTERVAL = float(
+    os.environ.get("PIN_VERIFIER_FLUSH_INTERVAL", "1")
+)
+
+# Hours before the rollup watermark that are aggregated again on every run, so
+# that records arriving late are included
+GATEWAY_RECORD_ROLLUP_LOOKBACK = int(
+    os.environ.get("GATEWAY_RECORD_ROLLUP_LOOKBACK", "3")
+)
+
+# Seconds of allow-list changes before the version of a gateway that are sent
+# again in its delta, so that changes committed out of order are not missed
+ALLOW_LIST_SYNC_OVERLAP = int(os.environ.get("ALLOW_LIST_SYNC_OVERLAP", "60"))
+# Seconds a version can be the base of a delta; older versions get a full
+# snapshot, which also drops tokens whose medical record was deleted by another
+# service
+ALLOW_LIST_DELTA_MAX_AGE = int(os.environ.get("ALLOW_LIST_DELTA_MAX_AGE", "86400"))
+# Number of tokens fetched per query, and streamed per chunk, for an allow-list
+# snapshot
+ALLOW_LIST_CHUNK_SIZE = int(os.environ.get("ALLOW_LIST_CHUNK_SIZE", "2000"))
+
+# Number of gateway records fetched per query by the contact tracing export
+GATEWAY_RECORD_EXPORT_CHUNK_SIZE = int(
+    os.environ.get("GATEWAY_RECORD_EXPORT_CHUNK_SIZE", "2000")
+)
+
+# Default and maximum number of minutes around a visit searched for contacts
+CONTACT_TRACING_WINDOW = int(os.environ.get("CONTACT_TRACING_WINDOW", "30"))
+CONTACT_TRACING_MAX_WINDOW = int(os.environ.get("CONTACT_TRACING_MAX_WINDOW", "1440"))
+
+# Maximum number of scans accepted by a single batch gateway record request
+GATEWAY_RECORD_BATCH_LIMIT = int(os.environ.get("GATEWAY_RECORD_BATCH_LIMIT", "500"))
+
+# Verified PIN cache used by check-ins to skip the password hasher on repeat visits
+PIN_CACHE_TTL = int(os.environ.get("PIN_CACHE_TTL", "900"))
+PIN_CACHE_MAX_ENTRIES = int(os.environ.get("PIN_CACHE_MAX_ENTRIES", "10000"))
+
+# Process pool used to verify PINs off the request threads. 0 verifies inline and
+# "auto" sizes the pool to the number of cores.
+PIN_VERIFY_WORKERS = os.environ.get("PIN_VERIFY_WORKERS", "0")
+PIN_VERIFY_WORKERS = (
+    os.cpu_count() if PIN_VERIFY_WORKERS == "auto" else int(PIN_VERIFY_WORKERS)
+)
+PIN_VERIFY_QUEUE_SIZE = int(os.environ.get("PIN_VERIFY_QUEUE_SIZE", "16"))
+PIN_VERIFY_TIMEOUT = float(os.environ.get("PIN_VERIFY_TIMEOUT", "5"))
+
+# Write-behind mode for gateway records. Check-ins enqueue their record and a
+# background thread writes them in batches, spilling to a local file when the
+# database is unavailable.
+GATEWAY_RECORD_WRITE_BEHIND = (
+    os.environ.get("GATEWAY_RECORD_WRITE_BEHIND", "False") == "True"
+)
+GATEWAY_RECORD_FLUSH_SIZE = int(os.environ.get("GATEWAY_RECORD_FLUSH_SIZE", "200"))
+GATEWAY_RECORD_FLUSH_INTERVAL = float(
+    os.environ.get("GATEWAY_RECORD_FLUSH_INTERVAL", "1")
+)
+GATEWAY_RECORD_QUEUE_SIZE = int(os.environ.get("GATEWAY_RECORD_QUEUE_SIZE", "10000"))
+GATEWAY_RECORD_SPILL_PATH = os.environ.get(
+    "GATEWAY_RECORD_SPILL_PATH", BASE_DIR / "gatewayrecord_spill.jsonl"
+)
+
+# Serve GatewayList, GatewayRecordCreate and TokenDetail with async views. Set
+# when deployed under ASGI (production.asgi.yml).
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "False") == "True"
+
+# Seconds a verified auth token is cached by CachedTokenAuthentication
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get("AUTH_TOKEN_CACHE_TTL", "60"))
+
+# In-memory index of vaccinated identities used by check-ins, rebuilt every
+# ELIGIBILITY_INDEX_REFRESH_INTERVAL seconds
+ELIGIBILITY_INDEX_REFRESH_INTERVAL = int(
+    os.environ.get("ELIGIBILITY_INDEX_REFRESH_INTERVAL", "300")
+)
+ELIGIBILITY_INDEX_CHUNK_SIZE = int(
+    os.environ.get("ELIGIBILITY_INDEX_CHUNK_SIZE", "10000")
+)
+# Seconds between two reads of the medical records changed in the meantime
+ELIGIBILITY_INDEX_SYNC_INTERVAL = float(
+    os.environ.get("ELIGIBILITY_INDEX_SYNC_INTERVAL", "5")
+)
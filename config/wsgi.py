@@ -14,3 +14,16 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
+
+from gateway.helpers.allow_list import pin_verifier_writer  # noqa: E402
+from gateway.helpers.eligibility import eligibility_index  # noqa: E402
+from gateway.helpers.occupancy import occupancy_counters  # noqa: E402
+
+# Build the eligibility index before the worker serves check-ins
+eligibility_index.warm_up()
+
+# Write the check-in counters of the worker even when it gets no more scans
+occupancy_counters.start()
+
+# Write the allow-list PIN verifiers outside of check-in requests
+pin_verifier_writer.start()
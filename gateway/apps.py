@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class GatewayConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gateway"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .helpers.change_columns import install_change_columns
+
+        post_migrate.connect(install_change_columns, sender=self)
@@ -0,0 +1,136 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from .helpers.checkin import check_in
+from .helpers.pin_executor import PinVerificationBusy
+from .models import Gateway, Token
+from .serializers import GatewayRecordSerializer, GatewaySerializer, TokenSerializer
+from .views import GatewayList, GatewayRecordCreate
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of the DRF `APIView` for the gateway hot paths.
+
+    The request is authenticated with the default DRF authentication classes,
+    and the handler's database work runs in a worker thread, so an idle
+    keep-alive connection does not hold a thread while it waits. Handlers are
+    given the authenticated user and return `(data, status)`.
+
+    * Requires user to be authenticated
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        # Django 3.2 only calls views natively when they are coroutine functions
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        async_view.view_class = cls
+        async_view.view_initkwargs = initkwargs
+        async_view.csrf_exempt = True
+        return async_view
+
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    def authenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            user_auth_tuple = authentication_class().authenticate(request)
+            if user_auth_tuple is not None:
+                return user_auth_tuple[0]
+        return None
+
+    def _run(self, handler, request, *args, **kwargs):
+        try:
+            user = self.authenticate(request)
+            if user is None or not user.is_authenticated:
+                raise exceptions.NotAuthenticated
+            return handler(request, user, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return {"detail": exc.detail}, exc.status_code
+        finally:
+            close_old_connections()
+
+    async def run(self, handler, request, *args, **kwargs):
+        data, status = await sync_to_async(self._run, thread_sensitive=False)(
+            handler, request, *args, **kwargs
+        )
+        return JsonResponse(data, status=status, safe=False)
+
+    def get_data(self, request):
+        if request.content_type == "application/json":
+            try:
+                return json.loads(request.body)
+            except ValueError:
+                raise exceptions.ParseError
+        return request.POST
+
+
+class AsyncGatewayRecordCreate(AsyncAPIView):
+    """
+    Async version of `GatewayRecordCreate`.
+    """
+
+    authentication_classes = GatewayRecordCreate.authentication_classes
+
+    def _post(self, request, user):
+        serializer = GatewayRecordSerializer(data=self.get_data(request))
+        if not serializer.is_valid():
+            return "Invalid", 200
+        try:
+            return check_in(user, serializer.validated_data), 200
+        except PinVerificationBusy:
+            return "Server busy, please try again", 503
+
+    async def post(self, request, format=None):
+        return await self.run(self._post, request)
+
+
+class AsyncTokenDetail(AsyncAPIView):
+    """
+    Async version of `TokenDetail`.
+    """
+
+    def _get(self, request, user, token_uuid):
+        try:
+            token = Token.objects.select_related("owner").get(token_uuid=token_uuid)
+        except Token.DoesNotExist:
+            raise exceptions.NotFound
+        return TokenSerializer(token).data, 200
+
+    async def get(self, request, token_uuid, format=None):
+        return await self.run(self._get, request, token_uuid)
+
+
+class AsyncGatewayList(AsyncAPIView):
+    """
+    Async version of `GatewayList`.
+
+    Listing gateways is served natively, while adding and removing gateways
+    is handed to the synchronous `GatewayList` view in a worker thread.
+    """
+
+    sync_view = staticmethod(GatewayList.as_view())
+
+    def _get(self, request, user):
+        gateways = Gateway.objects.filter(site_owner_id=user.pk)
+        return GatewaySerializer(gateways, many=True).data, 200
+
+    async def get(self, request, format=None):
+        return await self.run(self._get, request)
+
+    async def post(self, request, format=None):
+        return await sync_to_async(self.sync_view)(request)
+
+    async def delete(self, request, format=None):
+        return await sync_to_async(self.sync_view)(request)
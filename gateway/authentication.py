@@ -0,0 +1,164 @@
+import binascii
+import hashlib
+from hmac import compare_digest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from knox.auth import TokenAuthentication
+from knox.crypto import hash_token
+from knox.models import AuthToken
+from knox.settings import CONSTANTS, knox_settings
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from .helpers.gateway_registry import gateway_registry
+
+User = get_user_model()
+
+
+def auth_token_cache_key(token_key):
+    return f"gateway:auth_token:{token_key}"
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Knox token authentication that caches verified tokens.
+
+    The token key of a verified token is cached with its digest, salt, user id
+    and expiry for `AUTH_TOKEN_CACHE_TTL` seconds. Later requests with the same
+    token are verified against the cached digest and only load the user, which
+    skips the token lookup, the cleanup of the user's other tokens and the
+    `AUTO_REFRESH` write. Deleted tokens are dropped from the cache by the
+    `post_delete` signal on `AuthToken`.
+
+    The user is always loaded together with its site owner, so views can use
+    `request.user.siteowner` without another query.
+    """
+
+    def authenticate_credentials(self, token):
+        msg = "Invalid token."
+        token_key = token[: CONSTANTS.TOKEN_KEY_LENGTH].decode("utf-8")
+        cached_token = cache.get(auth_token_cache_key(token_key))
+        if cached_token is not None:
+            auth_token = self.authenticate_cached_token(token, cached_token)
+            if auth_token is not None:
+                return self.validate_user(auth_token)
+
+        # Same as knox, but loading the user and site owner with the token
+        for auth_token in AuthToken.objects.filter(token_key=token_key).select_related(
+            "user__siteowner"
+        ):
+            if self._cleanup_token(auth_token):
+                continue
+
+            try:
+                digest = hash_token(token.decode("utf-8"), auth_token.salt)
+            except (TypeError, binascii.Error):
+                raise exceptions.AuthenticationFailed(msg)
+            if compare_digest(digest, auth_token.digest):
+                if knox_settings.AUTO_REFRESH and auth_token.expiry:
+                    self.renew_token(auth_token)
+                self.cache_token(auth_token)
+                return self.validate_user(auth_token)
+        raise exceptions.AuthenticationFailed(msg)
+
+    def cache_token(self, auth_token):
+        timeout = settings.AUTH_TOKEN_CACHE_TTL
+        if auth_token.expiry is not None:
+            timeout = min(timeout, (auth_token.expiry - timezone.now()).total_seconds())
+        cache.set(
+            auth_token_cache_key(auth_token.token_key),
+            (
+                auth_token.digest,
+                auth_token.salt,
+                auth_token.user_id,
+                auth_token.expiry,
+            ),
+            timeout,
+        )
+
+    def authenticate_cached_token(self, token, cached_token):
+        """
+        Returns an unsaved `AuthToken` for a token matching the cached one, or
+        None when it has to be verified against the database.
+        """
+        digest, salt, user_id, expiry = cached_token
+        try:
+            token_digest = hash_token(token.decode("utf-8"), salt)
+        except (TypeError, binascii.Error):
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        if not compare_digest(token_digest, digest):
+            return None
+        if expiry is not None and expiry < timezone.now():
+            return None
+
+        user = User.objects.select_related("siteowner").filter(pk=user_id).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return AuthToken(
+            digest=digest,
+            token_key=token[: CONSTANTS.TOKEN_KEY_LENGTH].decode("utf-8"),
+            salt=salt,
+            user=user,
+            expiry=expiry,
+        )
+
+
+class GatewayUser:
+    """
+    Principal of a request authenticated by a gateway. Its pk is the user id of
+    the site owner of the gateway.
+    """
+
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+    is_staff = False
+    is_superuser = False
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.pk = self.id = gateway.site_owner_id
+
+    def __str__(self):
+        return self.gateway.gateway_id
+
+
+class GatewayTokenAuthentication(BaseAuthentication):
+    """
+    Authenticates a started gateway by its authentication token.
+
+    `GatewayDetail.put` stores the SHA-256 of the site owner's token in
+    `Gateway.authentication_token` when a gateway is started. A request with
+    that token is matched to its gateway through the gateway registry, without
+    loading the user or site owner, and `request.gateway` is set. A gateway
+    stays authenticated until it is stopped, or until the knox token it was
+    started with expires or is deleted by logout, which stops it. Tokens that
+    do not belong to a started gateway are left to the next authentication
+    class.
+
+    If successful
+    - `request.user` will be a `GatewayUser`
+    - `request.gateway` will be a `GatewayEntry`
+    """
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if (
+            len(auth) != 2
+            or auth[0].lower() != knox_settings.AUTH_HEADER_PREFIX.lower().encode()
+        ):
+            return None
+
+        token_hash = hashlib.sha256(auth[1]).hexdigest()
+        gateway = gateway_registry.get_by_token(token_hash)
+        if gateway is None:
+            return None
+        expiry = gateway.authentication_expiry
+        if expiry is not None and expiry < timezone.now():
+            return None
+        request.gateway = gateway
+        return (GatewayUser(gateway), None)
+
+    def authenticate_header(self, request):
+        return knox_settings.AUTH_HEADER_PREFIX
@@ -0,0 +1,317 @@
+import hashlib
+import hmac
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from ..models import MedicalRecord, PinVerifier
+
+logger = logging.getLogger(__name__)
+
+PIN_SALT_KEY_SALT = "gateway.helpers.allow_list.pin_salt"
+
+# Hex digits kept of a PIN verifier. A wrong PIN is accepted offline once in
+# 4096 tries, and the verifier of a token matches about 244 of the 10**6 PINs.
+# Every premises gets the same salt and verifier of a token, so combining the
+# allow-lists of several premises narrows a PIN no further than one does. A
+# new hashed PIN, even of the same PIN, gets a new salt and an independent
+# verifier once the token checks in again.
+PIN_VERIFIER_LENGTH = 3
+
+
+def current_version():
+    """
+    Returns the current allow-list version, the time in milliseconds.
+    """
+    return int(timezone.now().timestamp() * 1000)
+
+
+def pin_salt(hashed_pin):
+    """
+    Returns the salt of the PIN verifier of a token, which changes with its
+    hashed PIN and reveals nothing about it.
+    """
+    return salted_hmac(PIN_SALT_KEY_SALT, hashed_pin).hexdigest()[:16]
+
+
+def pin_verifier(salt, pin):
+    """
+    Returns the truncated HMAC-SHA256 of a PIN under the salt of its token,
+    which a gateway computes from a scan to check its PIN offline.
+    """
+    digest = hmac.new(salt.encode(), pin.encode(), hashlib.sha256)
+    return digest.hexdigest()[:PIN_VERIFIER_LENGTH]
+
+
+def _verifiers_key(token_id):
+    return f"gateway:pin_verifier:{token_id}"
+
+
+class PinVerifierWriter:
+    """
+    Write-behind store of the PIN verifiers of tokens checked in at the
+    gateways of a site owner.
+
+    Check-ins only compare the verifiers with those cached for their tokens,
+    and the new or changed ones are written every `flush_interval` seconds by
+    a background thread once `start` is called, with one SELECT, one INSERT
+    and one UPDATE whatever their number. The cache is only updated once a
+    verifier is written, so that one that could not be written is offered
+    again by the next check-in of its token, as are those still queued when
+    the process exits.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self.flushed = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts flushing in a background thread, once per worker process.
+        """
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="pin-verifier-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            if not self._pending:
+                continue
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Unable to flush the PIN verifiers")
+
+    def add(self, verified):
+        """
+        Queues the PIN verifiers of (site_owner_id, token, pin) triples with a
+        verified PIN that are not stored yet.
+        """
+        if not verified:
+            return
+        cached = cache.get_many({_verifiers_key(token.pk) for _, token, _ in verified})
+        with self._lock:
+            for site_owner_id, token, pin in verified:
+                salt = pin_salt(token.hashed_pin)
+                entry = (salt, pin_verifier(salt, pin))
+                verifiers = cached.get(_verifiers_key(token.pk), {})
+                if verifiers.get(site_owner_id) != entry:
+                    self._pending[site_owner_id, token.pk] = entry
+
+    def flush(self):
+        """
+        Writes the queued PIN verifiers to the database.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if pending and not self._write(pending):
+                with self._lock:
+                    # Keep the verifiers queued since, which are newer
+                    self._pending = {**pending, **self._pending}
+
+    def _write(self, pending):
+        try:
+            stored = {
+                (verifier.site_owner_id, verifier.token_id): verifier
+                for verifier in PinVerifier.objects.filter(
+                    site_owner_id__in={site_owner_id for site_owner_id, _ in pending},
+                    token_id__in={token_id for _, token_id in pending},
+                )
+            }
+            now = timezone.now()
+            created = []
+            updated = []
+            for (site_owner_id, token_id), (salt, verifier) in pending.items():
+                stored_verifier = stored.get((site_owner_id, token_id))
+                if stored_verifier is None:
+                    created.append(
+                        PinVerifier(
+                            site_owner_id=site_owner_id,
+                            token_id=token_id,
+                            salt=salt,
+                            verifier=verifier,
+                        )
+                    )
+                elif (stored_verifier.salt, stored_verifier.verifier) != (
+                    salt,
+                    verifier,
+                ):
+                    stored_verifier.salt = salt
+                    stored_verifier.verifier = verifier
+                    stored_verifier.updated_at = now
+                    updated.append(stored_verifier)
+            # A verifier created by another worker in the meantime is kept
+            PinVerifier.objects.bulk_create(created, ignore_conflicts=True)
+            PinVerifier.objects.bulk_update(updated, ["salt", "verifier", "updated_at"])
+        except DatabaseError:
+            logger.exception("Unable to write %d PIN verifiers", len(pending))
+            return False
+        self.flushed += len(pending)
+
+        # The verifiers stored for a token are cached in one entry
+        keys = {_verifiers_key(token_id) for _, token_id in pending}
+        cached = cache.get_many(keys)
+        for (site_owner_id, token_id), entry in pending.items():
+            cached.setdefault(_verifiers_key(token_id), {})[site_owner_id] = entry
+        cache.set_many(cached, timeout=None)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+    def stats(self):
+        return {"pending": len(self._pending), "flushed": self.flushed}
+
+
+pin_verifier_writer = PinVerifierWriter(
+    flush_interval=settings.PIN_VERIFIER_FLUSH_INTERVAL
+)
+
+
+def record_pin_verifiers(verified):
+    """
+    Stores the PIN verifiers of tokens checked in at the gateways of a site
+    owner, given as (site_owner_id, token, pin) triples with a verified PIN,
+    through the write-behind writer.
+    """
+    pin_verifier_writer.add(verified)
+
+
+def allow_list_entries(site_owner_id, token_uuids=None):
+    """
+    Yields the token_uuid of every token checked in at the gateways of a site
+    owner, or of those among `token_uuids`, in order, with its entry: whether
+    its owner is vaccinated and its PIN salt and verifier, or None when the
+    token is no longer active or its PIN changed since it was checked in there.
+    The first token issued wins when several active tokens share a token_uuid,
+    as on check-in.
+    """
+    verifiers = PinVerifier.objects.filter(site_owner_id=site_owner_id)
+    if token_uuids is not None:
+        verifiers = verifiers.filter(token__token_uuid__in=token_uuids)
+    verifiers = (
+        verifiers.annotate(
+            eligible=Exists(
+                MedicalRecord.objects.filter(
+                    identity=OuterRef("token__owner_id"), vaccination_status=True
+                )
+            )
+        )
+        .order_by("token__token_uuid", "token_id")
+        .values_list(
+            "token__token_uuid",
+            "token__status",
+            "token__hashed_pin",
+            "eligible",
+            "salt",
+            "verifier",
+        )
+    )
+    last_token_uuid = entry = None
+    for token_uuid, status, hashed_pin, eligible, salt, verifier in verifiers.iterator(
+        chunk_size=settings.ALLOW_LIST_CHUNK_SIZE
+    ):
+        if token_uuid != last_token_uuid:
+            if last_token_uuid is not None:
+                yield last_token_uuid, entry
+            last_token_uuid, entry = token_uuid, None
+        if entry is None and status and salt == pin_salt(hashed_pin):
+            entry = (int(eligible), salt, verifier)
+    if last_token_uuid is not None:
+        yield last_token_uuid, entry
+
+
+def _changed_since(site_owner_id, since, version):
+    """
+    Returns the token_uuids checked in at the gateways of a site owner whose
+    token, medical record or PIN verifier changed after version `since`, or
+    None when `since` is too old or unknown and a full snapshot is needed.
+
+    Changes are read from the `updated_at` columns, which the database sets
+    for writers outside this service too.
+    """
+    max_age = settings.ALLOW_LIST_DELTA_MAX_AGE * 1000
+    if not version - max_age < since <= version:
+        return None
+    # Changes are not committed in time order, so the ones shortly before
+    # `since` are sent again
+    changed_at = datetime.fromtimestamp(since / 1000, timezone.utc) - timedelta(
+        seconds=settings.ALLOW_LIST_SYNC_OVERLAP
+    )
+    return set(
+        PinVerifier.objects.filter(site_owner_id=site_owner_id)
+        .filter(
+            Q(updated_at__gte=changed_at)
+            | Q(token__updated_at__gte=changed_at)
+            | Q(token__owner__medicalrecord__updated_at__gte=changed_at)
+        )
+        .values_list("token__token_uuid", flat=True)
+    )
+
+
+def allow_list_snapshot(site_owner_id, since=None):
+    """
+    Returns the current version and the lines of the allow-list of the gateways
+    of a site owner at that version, as the changes since version `since` when
+    it is still known, else in full.
+
+    The first line holds the version, the version it is a delta from under
+    `since`, and whether it is `full`. Each token follows as a
+    `[token_uuid, eligible, pin_salt, pin_verifier]` line, and a delta lists a
+    token that can no longer check in offline as a `[token_uuid]` line.
+    """
+    version = current_version()
+    changed = None
+    if since is not None:
+        changed = _changed_since(site_owner_id, since, version)
+
+    def lines():
+        yield {
+            "version": version,
+            "since": since if changed is not None else None,
+            "full": changed is None,
+        }
+        for token_uuid, entry in allow_list_entries(site_owner_id, changed):
+            if entry is not None:
+                yield [token_uuid, *entry]
+            elif changed is not None:
+                yield [token_uuid]
+
+    return version, lines()
+
+
+def encode_snapshot(lines, key):
+    """
+    Yields the compact JSON encoding of each line of a snapshot, then a
+    `{"signature": ...}` line with the HMAC-SHA256 under `key` of the lines
+    before it, so that a gateway can check a stored snapshot before using it.
+    """
+    signature = hmac.new(key.encode(), digestmod=hashlib.sha256)
+    chunk = []
+    for line in lines:
+        body = json.dumps(line, separators=(",", ":")).encode() + b"\n"
+        signature.update(body)
+        chunk.append(body)
+        if len(chunk) >= settings.ALLOW_LIST_CHUNK_SIZE:
+            yield b"".join(chunk)
+            chunk = []
+    chunk.append(json.dumps({"signature": signature.hexdigest()}).encode() + b"\n")
+    yield b"".join(chunk)
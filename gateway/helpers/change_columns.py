@@ -0,0 +1,57 @@
+from django.db import connections
+
+# Tables whose nullable `updated_at` column is kept up to date by the database,
+# so that rows inserted or updated by other services are seen as changed
+CHANGE_TABLES = ("medicalrecords", "token", "pin_verifier")
+
+
+def _install_mysql(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXTRA FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = "
+            "DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = 'updated_at'",
+            [table],
+        )
+        row = cursor.fetchone()
+        if row is None or "on update" in row[0].lower():
+            return
+        # CURRENT_TIMESTAMP is in the connection time zone, which Django
+        # requires to be UTC on MySQL when USE_TZ is set
+        cursor.execute(
+            f"ALTER TABLE {table} MODIFY updated_at DATETIME(6) NULL "
+            "DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"
+        )
+
+
+def _install_sqlite(connection, table):
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_updated_at_insert "
+            f"AFTER INSERT ON {table} FOR EACH ROW WHEN NEW.updated_at IS NULL "
+            f"BEGIN UPDATE {table} SET updated_at = {now} WHERE id = NEW.id; END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_updated_at_update "
+            f"AFTER UPDATE ON {table} FOR EACH ROW "
+            "WHEN NEW.updated_at IS OLD.updated_at "
+            f"BEGIN UPDATE {table} SET updated_at = {now} WHERE id = NEW.id; END"
+        )
+
+
+def install_change_columns(using="default", **kwargs):
+    """
+    Makes the database set `updated_at` on every insert or update of the
+    change tables that does not set it. Runs after each migrate, and only
+    alters what is missing.
+    """
+    connection = connections[using]
+    install = {"mysql": _install_mysql, "sqlite": _install_sqlite}.get(
+        connection.vendor
+    )
+    if install is None:
+        return
+    table_names = set(connection.introspection.table_names())
+    for table in CHANGE_TABLES:
+        if table in table_names:
+            install(connection, table)
@@ -0,0 +1,246 @@
+from django.db.models import Q
+from django.utils import timezone
+from ..models import GatewayRecord, Token
+from ..serializers import GatewayRecordSerializer
+from .allow_list import record_pin_verifiers
+from .eligibility import eligibility_index
+from .gateway_registry import gateway_registry
+from .idempotency import SEQUENCE_REUSED, check_in_results
+from .pin_cache import pin_cache
+from .record_queue import save_gateway_records
+from .scan_dedup import duplicate_scan_filter
+
+
+def _can_check_in_at(user, gateway):
+    """
+    Returns whether `user` may check in at `gateway`: a gateway only at itself,
+    and a site owner at any of their gateways.
+    """
+    authenticated_gateway = getattr(user, "gateway", None)
+    if authenticated_gateway is not None:
+        return authenticated_gateway.pk == gateway.pk
+    return gateway.site_owner_id == user.pk
+
+
+def _verify(token, scan, valid_pin=None):
+    """
+    Returns why `token` may not check in with `scan`, or None if it may.
+    `valid_pin` is whether the PIN of the scan matches, when already verified.
+    """
+    # Check valid token (active)
+    if token is None:
+        return "Invalid token or gateway"
+
+    # Check Token belongs to owner
+    if valid_pin is None:
+        valid_pin = pin_cache.verify(token, scan["pin"])
+    if not valid_pin:
+        return "Invalid PIN entered"
+
+    # Get vaccination status
+    if not eligibility_index.is_eligible(token.owner_id):
+        return "Person is not vaccinated"
+    return None
+
+
+def _save(gateway_records):
+    """
+    Saves gateway records and returns the result of each one. A record skipped
+    because its sequence is already recorded is a retry when the recorded scan
+    has the same token, and reuses the sequence of another scan otherwise.
+    """
+    saved = {
+        id(gateway_record) for gateway_record in save_gateway_records(gateway_records)
+    }
+    skipped = [
+        gateway_record
+        for gateway_record in gateway_records
+        if id(gateway_record) not in saved
+    ]
+    recorded = {}
+    if skipped:
+        query = Q()
+        for gateway_record in skipped:
+            query |= Q(
+                gateway_id=gateway_record.gateway_id, sequence=gateway_record.sequence
+            )
+        recorded = {
+            (gateway_id, sequence): token_id
+            for gateway_id, sequence, token_id in GatewayRecord.objects.filter(
+                query
+            ).values_list("gateway_id", "sequence", "token_id")
+        }
+
+    return [
+        (
+            "Added gateway record"
+            if id(gateway_record) in saved
+            or recorded.get((gateway_record.gateway_id, gateway_record.sequence))
+            == gateway_record.token_id
+            else SEQUENCE_REUSED
+        )
+        for gateway_record in gateway_records
+    ]
+
+
+def check_in(user, scan):
+    """
+    Checks a validated scan in at a gateway of `user` and returns the result
+    message. Raises `PinVerificationBusy` when the PIN could not be verified.
+    """
+    timestamp = scan.get("timestamp", timezone.now())
+    if duplicate_scan_filter.is_duplicate(user, scan, timestamp):
+        return "Added gateway record"
+
+    gateway = gateway_registry.get(scan["gateway_id"])
+    if gateway is None:
+        return "Invalid token or gateway"
+
+    # Check gateway belongs to authenticated site owner
+    if not _can_check_in_at(user, gateway):
+        return "Invalid gateway"
+
+    # Answer a retried scan with its first result
+    sequence = scan.get("sequence")
+    if sequence is not None:
+        result = check_in_results.get(gateway, scan)
+        if result is not None:
+            return result
+
+    token = Token.objects.filter(token_uuid=scan["token_uuid"], status=True).first()
+    result = _verify(token, scan)
+    if result is None:
+        gateway_record = GatewayRecord(
+            token=token, gateway_id=gateway.pk, timestamp=timestamp, sequence=sequence
+        )
+        [result] = _save([gateway_record])
+        if result != SEQUENCE_REUSED:
+            duplicate_scan_filter.remember(user, [(scan, timestamp)])
+            record_pin_verifiers([(gateway.site_owner_id, token, scan["pin"])])
+
+    # The sequence stays with the recorded scan when it was reused
+    if sequence is not None and result != SEQUENCE_REUSED:
+        check_in_results.set_many([(gateway, scan, result)])
+    return result
+
+
+def check_in_batch(user, scans):
+    """
+    Checks a list of raw scans in at gateways of `user` and returns one result
+    message per scan.
+
+    Tokens for the whole batch are resolved with one query, as are the gateways
+    missing from the gateway registry, and the accepted records are saved
+    together. Repeats of recently checked in scans, and retries of scans with a
+    sequence number, are answered up front. The PINs not verified recently are
+    verified in parallel, and `PinVerificationBusy` is raised when the PIN
+    verification queue has no room for all of them.
+    """
+    # Validate every scan, keeping invalid ones in place
+    results = [None] * len(scans)
+    valid_scans = {}
+    timestamps = {}
+    for idx, scan in enumerate(scans):
+        serializer = GatewayRecordSerializer(data=scan)
+        if not serializer.is_valid():
+            results[idx] = "Invalid"
+            continue
+        scan = serializer.validated_data
+        timestamps[idx] = scan.get("timestamp", timezone.now())
+        if duplicate_scan_filter.is_duplicate(user, scan, timestamps[idx]):
+            results[idx] = "Added gateway record"
+        else:
+            valid_scans[idx] = scan
+
+    gateways = gateway_registry.get_many(
+        {scan["gateway_id"] for scan in valid_scans.values()}
+    )
+    checked_scans = {}
+    sequenced = []
+    for idx, scan in valid_scans.items():
+        gateway = gateways.get(scan["gateway_id"])
+        if gateway is None:
+            results[idx] = "Invalid token or gateway"
+        elif not _can_check_in_at(user, gateway):
+            results[idx] = "Invalid gateway"
+        else:
+            checked_scans[idx] = (scan, gateway)
+            if scan.get("sequence") is not None:
+                sequenced.append((idx, gateway, scan))
+
+    # Answer retried scans with their first result, and scans repeated within
+    # the batch with the result of their first occurrence
+    replayed = check_in_results.get_many(sequenced)
+    first_scans = {}
+    repeats = {}
+    for idx, gateway, scan in sequenced:
+        if idx in replayed:
+            results[idx] = replayed.pop(idx)
+            del checked_scans[idx]
+            continue
+        first_idx = first_scans.setdefault((gateway.pk, scan["sequence"]), idx)
+        if first_idx == idx:
+            continue
+        del checked_scans[idx]
+        first_scan = checked_scans[first_idx][0]
+        if (first_scan["token_uuid"], first_scan["pin"]) == (
+            scan["token_uuid"],
+            scan["pin"],
+        ):
+            repeats[idx] = first_idx
+        else:
+            results[idx] = SEQUENCE_REUSED
+
+    tokens = {}
+    if checked_scans:
+        for token in Token.objects.filter(
+            token_uuid__in={scan["token_uuid"] for scan, _ in checked_scans.values()},
+            status=True,
+        ).order_by("id"):
+            tokens.setdefault(token.token_uuid, token)
+
+    # Verify the PINs of the batch in parallel
+    verifications = {
+        idx: (tokens[scan["token_uuid"]], scan["pin"])
+        for idx, (scan, _) in checked_scans.items()
+        if scan["token_uuid"] in tokens
+    }
+    valid_pins = dict(
+        zip(verifications, pin_cache.verify_many(list(verifications.values())))
+    )
+
+    gateway_records = {}
+    for idx, (scan, gateway) in checked_scans.items():
+        token = tokens.get(scan["token_uuid"])
+        results[idx] = _verify(token, scan, valid_pins.get(idx))
+        if results[idx] is None:
+            gateway_records[idx] = GatewayRecord(
+                token=token,
+                gateway_id=gateway.pk,
+                timestamp=timestamps[idx],
+                sequence=scan.get("sequence"),
+            )
+    checked_in = []
+    verified = []
+    for idx, result in zip(gateway_records, _save(list(gateway_records.values()))):
+        results[idx] = result
+        if result != SEQUENCE_REUSED:
+            scan, gateway = checked_scans[idx]
+            checked_in.append((scan, timestamps[idx]))
+            verified.append(
+                (gateway.site_owner_id, gateway_records[idx].token, scan["pin"])
+            )
+    duplicate_scan_filter.remember(user, checked_in)
+    record_pin_verifiers(verified)
+
+    for idx, first_idx in repeats.items():
+        results[idx] = results[first_idx]
+    check_in_results.set_many(
+        [
+            (gateway, scan, results[idx])
+            for idx, (scan, gateway) in checked_scans.items()
+            if scan.get("sequence") is not None and results[idx] != SEQUENCE_REUSED
+        ]
+    )
+
+    return results
@@ -0,0 +1,117 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from django.db.models import Q
+from ..models import Gateway, GatewayRecord
+
+SCOPES = ("gateway", "premises")
+
+# Number of (gateway, time range) conditions per contact query
+RANGES_PER_QUERY = 200
+
+
+def _merge_ranges(timestamps, window):
+    """
+    Returns the sorted timestamps widened by `window` on both sides, with
+    overlapping ranges merged.
+    """
+    ranges = []
+    for timestamp in sorted(timestamps):
+        start, end = timestamp - window, timestamp + window
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def _closest(timestamps, timestamp):
+    index = bisect_left(timestamps, timestamp)
+    candidates = timestamps[max(index - 1, 0) : index + 1]
+    return min(candidates, key=lambda candidate: abs(candidate - timestamp))
+
+
+def find_contacts(token_uuid, window_minutes, scope="gateway", start=None, end=None):
+    """
+    Returns the visits of every other token made within `window_minutes` of a
+    visit of `token_uuid`, at the same gateway or, with the "premises" scope,
+    at any gateway of the same site owner.
+
+    The visits of the token are turned into merged time ranges per gateway,
+    which are looked up in batches of OR-ed range conditions so that each one
+    is a range scan of the (gateway, timestamp) index.
+    """
+    window = timedelta(minutes=window_minutes)
+    visits = GatewayRecord.objects.filter(token__token_uuid=token_uuid)
+    if start is not None:
+        visits = visits.filter(timestamp__gte=start)
+    if end is not None:
+        visits = visits.filter(timestamp__lt=end)
+    visits = list(
+        visits.values_list("gateway_id", "gateway__site_owner_id", "timestamp")
+    )
+
+    # Timestamps of the visits of the token at every location
+    location_visits = defaultdict(list)
+    for gateway_id, site_owner_id, timestamp in visits:
+        location = site_owner_id if scope == "premises" else gateway_id
+        location_visits[location].append(timestamp)
+    for timestamps in location_visits.values():
+        timestamps.sort()
+
+    gateway_locations = {gateway_id: gateway_id for gateway_id, _, _ in visits}
+    if scope == "premises":
+        gateway_locations = dict(
+            Gateway.objects.filter(site_owner_id__in=location_visits).values_list(
+                "id", "site_owner_id"
+            )
+        )
+
+    ranges = [
+        Q(gateway_id=gateway_id, timestamp__gte=range_start, timestamp__lte=range_end)
+        for gateway_id, location in gateway_locations.items()
+        for range_start, range_end in _merge_ranges(location_visits[location], window)
+    ]
+
+    contacts = defaultdict(list)
+    for offset in range(0, len(ranges), RANGES_PER_QUERY):
+        records = (
+            GatewayRecord.objects.filter(
+                reduce(or_, ranges[offset : offset + RANGES_PER_QUERY])
+            )
+            .exclude(token__token_uuid=token_uuid)
+            .values_list(
+                "token__token_uuid", "gateway_id", "gateway__gateway_id", "timestamp"
+            )
+        )
+        for contact_uuid, gateway_id, gateway_name, timestamp in records.iterator():
+            # The closest visit of the token is within the window by construction
+            exposure = _closest(
+                location_visits[gateway_locations[gateway_id]], timestamp
+            )
+            contacts[contact_uuid].append(
+                {
+                    "gateway_id": gateway_name,
+                    "timestamp": timestamp,
+                    "exposure_timestamp": exposure,
+                }
+            )
+
+    return {
+        "token_uuid": token_uuid,
+        "window": window_minutes,
+        "scope": scope,
+        "visits": len(visits),
+        "contacts": [
+            {
+                "token_uuid": contact_uuid,
+                "visits": sorted(
+                    contact_visits,
+                    key=lambda visit: (visit["timestamp"], visit["gateway_id"]),
+                ),
+            }
+            for contact_uuid, contact_visits in sorted(contacts.items())
+        ],
+    }
@@ -0,0 +1,183 @@
+import logging
+import sys
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+from ..models import MedicalRecord
+
+logger = logging.getLogger(__name__)
+
+# Seconds of medical record changes before the last sync that are read again,
+# for transactions that committed after it
+SYNC_OVERLAP = 60
+
+
+class EligibilityIndex:
+    """
+    In-memory bitmap of the identities whose medical record is vaccinated.
+
+    Bit `n` is set when the identity with id `n` is vaccinated, so a check-in
+    decides eligibility from `token.owner_id` without querying the
+    medicalrecords table. The bitmap is built with a streaming query on first
+    use and kept up to date by the `post_save` and `post_delete` signals on
+    `MedicalRecord` of this worker.
+
+    Every `sync_interval` seconds, the next check-in applies the records whose
+    `updated_at` changed since the last sync, which brings in changes saved by
+    other workers and services: the database sets `updated_at` when a writer
+    does not. Deleted records, and records left with a NULL `updated_at`
+    from before the column existed, are picked up by the full rebuild in the
+    background every `refresh_interval` seconds.
+    """
+
+    def __init__(self, refresh_interval, chunk_size, sync_interval=5):
+        self.refresh_interval = refresh_interval
+        self.chunk_size = chunk_size
+        self.sync_interval = sync_interval
+        self._bitmap = None
+        self._built_at = None
+        self._synced_at = None
+        self._synced_until = None
+        self._build_logs = []
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._syncing = threading.Lock()
+
+    def build(self):
+        """
+        Rebuilds the bitmap from the medicalrecords table.
+        """
+        built_at = time.monotonic()
+        synced_until = timezone.now()
+        # Updates made while the table is read are applied to the new bitmap
+        build_log = []
+        with self._lock:
+            self._build_logs.append(build_log)
+        try:
+            bitmap = bytearray()
+            identity_ids = (
+                MedicalRecord.objects.filter(vaccination_status=True)
+                .values_list("identity_id", flat=True)
+                .iterator(chunk_size=self.chunk_size)
+            )
+            for identity_id in identity_ids:
+                self._set(bitmap, identity_id, True)
+        finally:
+            with self._lock:
+                self._build_logs.remove(build_log)
+
+        with self._lock:
+            for identity_id, vaccinated in build_log:
+                self._set(bitmap, identity_id, vaccinated)
+            self._bitmap = bitmap
+            self._built_at = self._synced_at = built_at
+            self._synced_until = synced_until
+
+    def sync(self):
+        """
+        Applies the medical records changed since the last sync.
+        """
+        synced_at = time.monotonic()
+        synced_until = timezone.now()
+        changes = MedicalRecord.objects.filter(
+            updated_at__gte=self._synced_until - timedelta(seconds=SYNC_OVERLAP)
+        ).values_list("identity_id", "vaccination_status")
+        for identity_id, vaccinated in changes:
+            self.update(identity_id, vaccinated)
+        with self._lock:
+            self._synced_at = synced_at
+            self._synced_until = max(self._synced_until, synced_until)
+
+    def _sync(self):
+        try:
+            self.sync()
+        except DatabaseError:
+            logger.exception("Unable to sync the eligibility index")
+        finally:
+            self._syncing.release()
+
+    def warm_up(self):
+        """
+        Builds the bitmap when a worker starts. On failure the bitmap is built
+        by the first check-in instead.
+        """
+        try:
+            self.build()
+        except Exception:
+            logger.exception("Unable to build the eligibility index")
+        finally:
+            connection.close()
+
+    def _refresh(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception("Unable to refresh the eligibility index")
+        finally:
+            connection.close()
+            self._refreshing.release()
+
+    def _ensure_fresh(self):
+        if self._bitmap is None:
+            self.build()
+            return
+        now = time.monotonic()
+        if now - self._built_at > self.refresh_interval:
+            # Keep serving the current bitmap while it is rebuilt
+            if self._refreshing.acquire(blocking=False):
+                threading.Thread(
+                    target=self._refresh, name="eligibility-refresh", daemon=True
+                ).start()
+        elif now - self._synced_at > self.sync_interval:
+            if self._syncing.acquire(blocking=False):
+                self._sync()
+
+    def is_eligible(self, identity_id):
+        self._ensure_fresh()
+        byte, bit = divmod(identity_id, 8)
+        with self._lock:
+            return byte < len(self._bitmap) and bool(self._bitmap[byte] & (1 << bit))
+
+    def update(self, identity_id, vaccinated):
+        """
+        Records a change to the vaccination status of an identity.
+        """
+        with self._lock:
+            for build_log in self._build_logs:
+                build_log.append((identity_id, vaccinated))
+            if self._bitmap is not None:
+                self._set(self._bitmap, identity_id, vaccinated)
+
+    @staticmethod
+    def _set(bitmap, identity_id, vaccinated):
+        byte, bit = divmod(identity_id, 8)
+        if vaccinated:
+            if byte >= len(bitmap):
+                bitmap.extend(bytes(byte - len(bitmap) + 1))
+            bitmap[byte] |= 1 << bit
+        elif byte < len(bitmap):
+            bitmap[byte] &= ~(1 << bit)
+
+    def reset(self):
+        with self._lock:
+            self._bitmap = None
+            self._built_at = self._synced_at = self._synced_until = None
+
+    def stats(self):
+        with self._lock:
+            if self._bitmap is None:
+                return {"vaccinated": 0, "memory_bytes": 0}
+            return {
+                "vaccinated": bin(int.from_bytes(self._bitmap, "little")).count("1"),
+                "memory_bytes": sys.getsizeof(self._bitmap),
+            }
+
+
+eligibility_index = EligibilityIndex(
+    refresh_interval=settings.ELIGIBILITY_INDEX_REFRESH_INTERVAL,
+    chunk_size=settings.ELIGIBILITY_INDEX_CHUNK_SIZE,
+    sync_interval=settings.ELIGIBILITY_INDEX_SYNC_INTERVAL,
+)
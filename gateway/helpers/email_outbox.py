@@ -0,0 +1,115 @@
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from ..models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the delay between two attempts of the same email
+MAX_RETRY_DELAY = 3600
+
+
+def queue_email(recipient, subject, body):
+    """
+    Adds an email to the outbox. It is sent later by `send_queued_emails`.
+    """
+    return EmailOutbox.objects.create(recipient=recipient, subject=subject, body=body)
+
+
+def retry_delay(attempts):
+    """
+    Returns the delay before the next attempt, doubling after every failure.
+    """
+    delay = settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, MAX_RETRY_DELAY))
+
+
+def _claim_due_emails(batch_size):
+    """
+    Returns up to `batch_size` due emails, claimed for `EMAIL_OUTBOX_LEASE`
+    seconds by pushing back their next attempt. Emails claimed by a sender
+    that stopped before recording their result are due again once the lease
+    has passed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due_emails = EmailOutbox.objects.filter(
+            sent_at__isnull=True,
+            attempts__lt=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+            next_attempt_at__lte=now,
+        ).order_by("next_attempt_at", "id")
+        # Let several workers share the outbox without sending an email twice
+        if connection.features.has_select_for_update_skip_locked:
+            due_emails = due_emails.select_for_update(skip_locked=True)
+        emails = list(due_emails[:batch_size])
+        EmailOutbox.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        )
+    return emails
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=["attempts", "last_error", "next_attempt_at"])
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        logger.error(
+            "Giving up on email %d to %s after %d attempts",
+            email.pk,
+            email.recipient,
+            email.attempts,
+        )
+
+
+def send_queued_emails(batch_size=None):
+    """
+    Sends up to `batch_size` due emails over a single SMTP connection.
+
+    The emails are claimed in a short transaction and sent outside of it, and
+    the result of each email is saved as soon as it is known, so a sender that
+    stops mid-batch only sends again the email it was sending. Failed emails
+    are retried with an exponential backoff until `EMAIL_OUTBOX_MAX_ATTEMPTS`
+    is reached. Returns the number of emails sent and the number that failed.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    sent = failed = 0
+    emails = _claim_due_emails(batch_size)
+    if not emails:
+        return sent, failed
+
+    mail_connection = get_connection()
+    try:
+        mail_connection.open()
+    except Exception as error:
+        logger.exception("Unable to connect to the mail server")
+        for email in emails:
+            _record_failure(email, error)
+        return sent, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                email.subject,
+                email.body,
+                settings.SERVER_EMAIL,
+                [email.recipient],
+                connection=mail_connection,
+            )
+            try:
+                message.send()
+            except Exception as error:
+                logger.warning("Unable to send email %d: %s", email.pk, error)
+                _record_failure(email, error)
+                failed += 1
+            else:
+                email.sent_at = timezone.now()
+                email.attempts += 1
+                email.save(update_fields=["sent_at", "attempts"])
+                sent += 1
+    finally:
+        mail_connection.close()
+    return sent, failed
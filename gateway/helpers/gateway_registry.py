@@ -0,0 +1,114 @@
+from collections import namedtuple
+from django.core.cache import caches
+from ..models import Gateway
+
+GatewayEntry = namedtuple(
+    "GatewayEntry",
+    [
+        "pk",
+        "gateway_id",
+        "site_owner_id",
+        "authentication_token",
+        "authentication_expiry",
+    ],
+)
+
+
+class GatewayRegistry:
+    """
+    Read-through cache of gateways keyed by gateway_id, and of gateway_id keyed
+    by authentication token hash.
+
+    Gateways only change when a site owner adds, removes or toggles one, so
+    check-ins read them from the `cache_alias` cache, which is shared by the
+    workers in production. Entries are dropped by the `post_save` and
+    `post_delete` signals on `Gateway`.
+    """
+
+    def __init__(self, cache_alias):
+        self.cache_alias = cache_alias
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _key(self, gateway_id):
+        return f"gateway:{gateway_id}"
+
+    def _token_key(self, token_hash):
+        return f"gateway_token:{token_hash}"
+
+    def _load(self, gateway_ids):
+        entries = {
+            entry.gateway_id: entry
+            for entry in map(
+                GatewayEntry._make,
+                Gateway.objects.filter(gateway_id__in=gateway_ids).values_list(
+                    "id",
+                    "gateway_id",
+                    "site_owner_id",
+                    "authentication_token",
+                    "authentication_expiry",
+                ),
+            )
+        }
+        self.cache.set_many(
+            {
+                self._key(gateway_id): tuple(entry)
+                for gateway_id, entry in entries.items()
+            }
+        )
+        return entries
+
+    def get(self, gateway_id):
+        """
+        Returns the `GatewayEntry` of a gateway, or None if it does not exist.
+        """
+        return self.get_many([gateway_id]).get(gateway_id)
+
+    def get_many(self, gateway_ids):
+        """
+        Returns a dict of gateway_id to `GatewayEntry` for the gateways that
+        exist, loading the uncached ones with a single query.
+        """
+        keys = {self._key(gateway_id): gateway_id for gateway_id in gateway_ids}
+        entries = {
+            keys[key]: GatewayEntry(*entry)
+            for key, entry in self.cache.get_many(keys).items()
+        }
+        missing = set(gateway_ids) - entries.keys()
+        if missing:
+            entries.update(self._load(missing))
+        return entries
+
+    def get_by_token(self, token_hash):
+        """
+        Returns the `GatewayEntry` of the gateway started with the token hashing
+        to `token_hash`, or None if there is none.
+        """
+        gateway_id = self.cache.get(self._token_key(token_hash))
+        if gateway_id is None:
+            gateway_id = (
+                Gateway.objects.filter(authentication_token=token_hash)
+                .values_list("gateway_id", flat=True)
+                .first()
+            )
+            if gateway_id is None:
+                return None
+            self.cache.set(self._token_key(token_hash), gateway_id)
+
+        # The token may have been stopped since it was cached
+        entry = self.get(gateway_id)
+        if entry is None or entry.authentication_token != token_hash:
+            self.cache.delete(self._token_key(token_hash))
+            return None
+        return entry
+
+    def invalidate(self, gateway_id):
+        self.cache.delete(self._key(gateway_id))
+
+    def clear(self):
+        self.cache.clear()
+
+
+gateway_registry = GatewayRegistry("gateways")
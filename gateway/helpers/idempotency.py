@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SEQUENCE_REUSED = "Sequence already used"
+
+
+class CheckInResults:
+    """
+    Results of the check-ins submitted with a sequence number, keyed by gateway
+    and sequence, for `ttl` seconds.
+
+    A gateway numbers its scans and resubmits a scan with the same sequence
+    when it did not get the response. The retry is answered with the stored
+    result before the token is looked up or the PIN hashed. A scan reusing the
+    sequence of a different scan is rejected. Scans are compared by a keyed
+    digest of their token and PIN. The unique constraint on the gateway and
+    sequence of gateway records still applies once the result has expired.
+    """
+
+    key_salt = "gateway.helpers.idempotency.CheckInResults"
+
+    def __init__(self, ttl, cache_alias="default"):
+        self.ttl = ttl
+        self.cache_alias = cache_alias
+        self.replayed = 0
+        self.reused = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _key(self, gateway, sequence):
+        return f"gateway:checkin:{gateway.pk}:{sequence}"
+
+    def _fingerprint(self, scan):
+        return salted_hmac(
+            self.key_salt, f"{scan['token_uuid']}:{scan['pin']}"
+        ).hexdigest()
+
+    def get_many(self, scans):
+        """
+        Returns the stored result of every retried scan among `scans`, given
+        as (key, gateway, scan) triples, keyed by key.
+        """
+        cache_keys = {
+            self._key(gateway, scan["sequence"]): key for key, gateway, scan in scans
+        }
+        stored = self.cache.get_many(cache_keys)
+        results = {}
+        for key, gateway, scan in scans:
+            entry = stored.get(self._key(gateway, scan["sequence"]))
+            if entry is None:
+                continue
+            fingerprint, result = entry
+            if constant_time_compare(fingerprint, self._fingerprint(scan)):
+                self.replayed += 1
+                results[key] = result
+            else:
+                self.reused += 1
+                results[key] = SEQUENCE_REUSED
+        return results
+
+    def get(self, gateway, scan):
+        return self.get_many([(None, gateway, scan)]).get(None)
+
+    def set_many(self, results):
+        """
+        Stores the results of scans, given as (gateway, scan, result) triples.
+        """
+        if results:
+            self.cache.set_many(
+                {
+                    self._key(gateway, scan["sequence"]): (
+                        self._fingerprint(scan),
+                        result,
+                    )
+                    for gateway, scan, result in results
+                },
+                timeout=self.ttl,
+            )
+
+    def stats(self):
+        return {"replayed": self.replayed, "reused": self.reused}
+
+
+check_in_results = CheckInResults(ttl=settings.CHECKIN_IDEMPOTENCY_TTL)
@@ -0,0 +1,209 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import GatewayCounter
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = ("minute", "hour")
+
+# Seconds between two removals of expired counters
+PRUNE_INTERVAL = 3600
+
+
+def bucket_start(moment, resolution):
+    moment = moment.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        moment = moment.replace(minute=0)
+    return moment
+
+
+class OccupancyCounters:
+    """
+    Check-in counters per gateway and per minute and hour bucket.
+
+    Check-ins are counted in memory, and every `flush_interval` seconds the
+    counts are added to the database, with a single UPDATE per gateway and
+    bucket. A busy gateway therefore updates its counter rows once per
+    interval and process rather than once per scan. Minute counters are kept
+    for a day and hour counters for the gateway record retention.
+
+    Counts are flushed by a background thread once `start` is called, so that
+    the last check-ins of a quiet worker show up within an interval, and by the
+    request that checks in next when the interval has passed.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self.flushed = 0
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._last_prune = 0
+        self._atexit_registered = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts flushing in a background thread, once per worker process.
+        """
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="occupancy-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            if not self._pending:
+                continue
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Unable to flush the check-in counters")
+
+    def add(self, gateway_records):
+        with self._lock:
+            for gateway_record in gateway_records:
+                for resolution in RESOLUTIONS:
+                    bucket = bucket_start(gateway_record.timestamp, resolution)
+                    self._pending[(gateway_record.gateway_id, resolution, bucket)] += 1
+            if not self._atexit_registered:
+                atexit.register(self.flush)
+                self._atexit_registered = True
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush(blocking=False)
+
+    def flush(self, blocking=True):
+        """
+        Adds the pending counts to the database. Returns without waiting when
+        another thread is already flushing, unless `blocking` is set.
+        """
+        if not self._flush_lock.acquire(blocking=blocking):
+            return
+        try:
+            with self._lock:
+                pending, self._pending = self._pending, Counter()
+                self._last_flush = time.monotonic()
+            # Prune only after a successful write, so that a flush at exit does
+            # not touch the database for nothing
+            if not pending or not self._write(pending):
+                return
+            if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = time.monotonic()
+                try:
+                    self.prune()
+                except DatabaseError:
+                    logger.exception("Unable to prune the check-in counters")
+        finally:
+            self._flush_lock.release()
+
+    def _write(self, pending):
+        try:
+            # Sorted so that concurrent flushes lock the rows in the same order
+            with transaction.atomic():
+                for key in sorted(pending):
+                    self._increment(key, pending[key])
+        except DatabaseError:
+            logger.exception("Unable to write %d check-in counters", len(pending))
+            with self._lock:
+                self._pending.update(pending)
+            return False
+        # Every check-in is counted once per resolution
+        self.flushed += sum(pending.values()) // len(RESOLUTIONS)
+        return True
+
+    def _increment(self, key, count):
+        gateway_id, resolution, bucket = key
+        counters = GatewayCounter.objects.filter(
+            gateway_id=gateway_id, resolution=resolution, bucket=bucket
+        )
+        if counters.update(count=F("count") + count):
+            return
+        try:
+            with transaction.atomic():
+                GatewayCounter.objects.create(
+                    gateway_id=gateway_id,
+                    resolution=resolution,
+                    bucket=bucket,
+                    count=count,
+                )
+        except IntegrityError:
+            # Created by another process in the meantime, or the gateway is gone
+            counters.update(count=F("count") + count)
+
+    def prune(self):
+        now = timezone.now()
+        GatewayCounter.objects.filter(
+            resolution="minute", bucket__lt=now - timedelta(days=1)
+        ).delete()
+        GatewayCounter.objects.filter(
+            resolution="hour",
+            bucket__lt=now - timedelta(days=settings.GATEWAY_RECORD_RETENTION_DAYS),
+        ).delete()
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._last_flush = time.monotonic()
+
+    def stats(self):
+        return {"pending": len(self._pending), "flushed": self.flushed}
+
+
+occupancy_counters = OccupancyCounters(flush_interval=settings.OCCUPANCY_FLUSH_INTERVAL)
+
+
+def occupancy_stats(gateways, now=None):
+    """
+    Returns the check-ins of the current minute, the last 60 minutes, the
+    current hour and today for every gateway and in total, from the counters.
+    """
+    now = now or timezone.now()
+    minute = bucket_start(now, "minute")
+    hour = bucket_start(now, "hour")
+    midnight = timezone.localtime(hour).replace(hour=0)
+    periods = {
+        "current_minute": ("minute", minute),
+        "last_hour": ("minute", minute - timedelta(minutes=59)),
+        "current_hour": ("hour", hour),
+        "today": ("hour", midnight),
+    }
+    counters = GatewayCounter.objects.filter(
+        gateway__in=gateways,
+        resolution="minute",
+        bucket__gte=periods["last_hour"][1],
+    ) | GatewayCounter.objects.filter(
+        gateway__in=gateways, resolution="hour", bucket__gte=midnight
+    )
+
+    totals = {gateway.pk: dict.fromkeys(periods, 0) for gateway in gateways}
+    for gateway_id, resolution, bucket, count in counters.values_list(
+        "gateway_id", "resolution", "bucket", "count"
+    ):
+        for period, (period_resolution, start) in periods.items():
+            if resolution == period_resolution and bucket >= start:
+                totals[gateway_id][period] += count
+
+    return {
+        "total": {
+            period: sum(counts[period] for counts in totals.values())
+            for period in periods
+        },
+        "gateways": [
+            {"gateway_id": gateway.gateway_id, **totals[gateway.pk]}
+            for gateway in gateways
+        ],
+    }
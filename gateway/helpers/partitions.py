@@ -0,0 +1,210 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from django.db import connection as default_connection
+from django.db.models.functions import TruncDay, TruncMonth
+from django.utils import timezone
+from ..models import GatewayRecord
+
+# A partition holds the gateway records with start <= timestamp < end
+Partition = namedtuple("Partition", ["name", "start", "end"])
+
+PERIODS = ("day", "month")
+
+
+def period_start(moment, period):
+    start = moment.astimezone(timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    if period == "month":
+        start = start.replace(day=1)
+    return start
+
+
+def next_period(start, period):
+    if period == "day":
+        return start + timedelta(days=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_for(start, period):
+    name = start.strftime("p%Y%m%d" if period == "day" else "p%Y%m")
+    return Partition(name, start, next_period(start, period))
+
+
+def partitions_between(start, end, period):
+    """
+    Returns the partitions covering `start` up to and including `end`.
+    """
+    start = period_start(start, period)
+    partitions = []
+    while start <= end:
+        partitions.append(partition_for(start, period))
+        start = partitions[-1].end
+    return partitions
+
+
+def expired_partitions(partitions, now, retention_days):
+    """
+    Returns the partitions whose records are all older than the retention.
+    """
+    cutoff = now - timedelta(days=retention_days)
+    return [partition for partition in partitions if partition.end <= cutoff]
+
+
+class MariaDBPartitionScheme:
+    """
+    Native RANGE COLUMNS partitioning of the gateway record table on MariaDB.
+
+    Every period has its own partition, followed by a catch-all `pmax`
+    partition that is split as partitions are added ahead of time. Dropping a
+    partition removes its records without scanning them.
+    """
+
+    table = GatewayRecord._meta.db_table
+    native = True
+
+    def __init__(self, period, connection=default_connection):
+        self.period = period
+        self.connection = connection
+
+    def _execute(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else None
+
+    def _partition_sql(self, partitions):
+        bounds = [
+            f"PARTITION {partition.name} VALUES LESS THAN "
+            f"('{partition.end:%Y-%m-%d %H:%M:%S}')"
+            for partition in partitions
+        ]
+        return ", ".join(bounds + ["PARTITION pmax VALUES LESS THAN (MAXVALUE)"])
+
+    def partitions(self):
+        rows = self._execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND PARTITION_NAME IS NOT NULL ORDER BY PARTITION_ORDINAL_POSITION",
+            [self.table],
+        )
+        partitions = []
+        for (name,) in rows:
+            if name == "pmax":
+                continue
+            start = datetime.strptime(
+                name, "p%Y%m%d" if self.period == "day" else "p%Y%m"
+            ).replace(tzinfo=timezone.utc)
+            partitions.append(partition_for(start, self.period))
+        return partitions
+
+    def is_enabled(self):
+        return bool(
+            self._execute(
+                "SELECT 1 FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+                "AND PARTITION_NAME = 'pmax'",
+                [self.table],
+            )
+        )
+
+    def enable(self, until):
+        """
+        Partitions the table from the period of its oldest record until
+        `until`. This rebuilds the table, so it is meant to be run once during
+        a maintenance window.
+
+        MariaDB does not support foreign keys on partitioned tables and
+        requires the partitioning column in the primary key, so the foreign
+        key constraints are dropped, the primary key becomes (id, timestamp)
+        and the unique key on gateway and sequence becomes (gateway_id,
+        sequence, timestamp). Django still protects tokens and gateways with
+        records from being deleted, and scans with a sequence must be submitted
+        with their timestamp, which a retry keeps.
+        """
+        constraints = self._execute(
+            "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+            "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            [self.table],
+        )
+        if constraints:
+            self._execute(
+                f"ALTER TABLE {self.table} "
+                + ", ".join(f"DROP FOREIGN KEY {name}" for (name,) in constraints)
+            )
+        self._execute(
+            f"ALTER TABLE {self.table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp), "
+            "DROP INDEX gatewayrecord_sequence_unique, "
+            "ADD UNIQUE KEY gatewayrecord_sequence_unique (gateway_id, sequence, timestamp)"
+        )
+        oldest = self._execute(f"SELECT MIN(timestamp) FROM {self.table}")[0][0]
+        if oldest is not None and timezone.is_naive(oldest):
+            oldest = timezone.make_aware(oldest, timezone.utc)
+        partitions = partitions_between(oldest or until, until, self.period)
+        self._execute(
+            f"ALTER TABLE {self.table} PARTITION BY RANGE COLUMNS(timestamp) "
+            f"({self._partition_sql(partitions)})"
+        )
+        return partitions
+
+    def create(self, partitions):
+        if partitions:
+            self._execute(
+                f"ALTER TABLE {self.table} REORGANIZE PARTITION pmax INTO "
+                f"({self._partition_sql(partitions)})"
+            )
+
+    def drop(self, partitions):
+        if partitions:
+            self._execute(
+                f"ALTER TABLE {self.table} DROP PARTITION "
+                + ", ".join(partition.name for partition in partitions)
+            )
+
+
+class EmulatedPartitionScheme:
+    """
+    Partition scheme for databases without native partitioning, such as
+    SQLite.
+
+    The partitions are the periods that have records, and dropping a partition
+    deletes its records. It behaves like the native scheme without its
+    performance, so the retention job can be run and tested anywhere.
+    """
+
+    native = False
+
+    def __init__(self, period, connection=default_connection):
+        self.period = period
+
+    def partitions(self):
+        trunc = TruncDay if self.period == "day" else TruncMonth
+        starts = (
+            GatewayRecord.objects.annotate(
+                period=trunc("timestamp", tzinfo=timezone.utc)
+            )
+            .values_list("period", flat=True)
+            .distinct()
+            .order_by("period")
+        )
+        return [partition_for(start, self.period) for start in starts]
+
+    def is_enabled(self):
+        return True
+
+    def enable(self, until):
+        return []
+
+    def create(self, partitions):
+        pass
+
+    def drop(self, partitions):
+        for partition in partitions:
+            GatewayRecord.objects.filter(
+                timestamp__gte=partition.start, timestamp__lt=partition.end
+            ).delete()
+
+
+def partition_scheme(period, connection=default_connection):
+    if connection.vendor == "mysql":
+        return MariaDBPartitionScheme(period, connection)
+    return EmulatedPartitionScheme(period, connection)
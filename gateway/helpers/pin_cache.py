@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+from django.utils.crypto import constant_time_compare, salted_hmac
+from .pin_executor import pin_executor
+
+
+class PinCache:
+    """
+    Bounded LRU cache of recently verified token PINs.
+
+    Entries are keyed on the token id and remember the hashed_pin they were
+    verified against, along with a keyed digest of the PIN. A repeat check-in
+    with the same PIN is then verified with a single HMAC instead of the
+    password hasher. Entries expire after `ttl` seconds and the least recently
+    used entry is evicted once `max_entries` is reached.
+    """
+
+    key_salt = "gateway.helpers.pin_cache.PinCache"
+
+    def __init__(self, ttl, max_entries, check=check_password, check_many=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.check = check
+        self.check_many = check_many or (
+            lambda pairs: [check(pin, hashed_pin) for pin, hashed_pin in pairs]
+        )
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, pin, hashed_pin):
+        return salted_hmac(self.key_salt, f"{hashed_pin}:{pin}").hexdigest()
+
+    def _is_cached(self, token, digest):
+        with self._lock:
+            entry = self._entries.get(token.pk)
+            if (
+                entry is not None
+                and entry[0] == token.hashed_pin
+                and entry[2] > time.monotonic()
+                and constant_time_compare(entry[1], digest)
+            ):
+                self._entries.move_to_end(token.pk)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def _remember(self, token, digest):
+        with self._lock:
+            self._entries[token.pk] = (
+                token.hashed_pin,
+                digest,
+                time.monotonic() + self.ttl,
+            )
+            self._entries.move_to_end(token.pk)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def verify(self, token, pin, check=None):
+        """
+        Returns whether `pin` matches the hashed PIN of `token`, only calling
+        `check` when the PIN has not been verified recently.
+        """
+        check = check or self.check
+        digest = self._digest(pin, token.hashed_pin)
+        if self._is_cached(token, digest):
+            return True
+
+        if not check(pin, token.hashed_pin):
+            return False
+        self._remember(token, digest)
+        return True
+
+    def verify_many(self, verifications):
+        """
+        Returns whether the PIN of each (token, pin) pair matches the hashed PIN
+        of the token, checking the ones not verified recently together with
+        `check_many`, once per distinct PIN of a token.
+        """
+        results = [None] * len(verifications)
+        misses = {}
+        for idx, (token, pin) in enumerate(verifications):
+            digest = self._digest(pin, token.hashed_pin)
+            if self._is_cached(token, digest):
+                results[idx] = True
+            else:
+                misses.setdefault((token.pk, digest), (token, pin, []))[2].append(idx)
+
+        checked = self.check_many(
+            [(pin, token.hashed_pin) for token, pin, _ in misses.values()]
+        )
+        for ((_, digest), (token, _, indexes)), valid in zip(misses.items(), checked):
+            if valid:
+                self._remember(token, digest)
+            for idx in indexes:
+                results[idx] = valid
+        return results
+
+    def invalidate(self, token_id):
+        with self._lock:
+            self._entries.pop(token_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+pin_cache = PinCache(
+    ttl=settings.PIN_CACHE_TTL,
+    max_entries=settings.PIN_CACHE_MAX_ENTRIES,
+    check=pin_executor.check_password,
+    check_many=pin_executor.check_many,
+)
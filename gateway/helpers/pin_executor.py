@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import check_password
+
+
+class PinVerificationBusy(Exception):
+    """
+    Raised when the PIN verification queue is full, a verification timed out or
+    the process pool broke.
+    """
+
+
+def init_worker():
+    # Spawned workers start without Django configured
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    django.setup()
+
+
+class PinExecutor:
+    """
+    Runs `check_password` in a process pool so the password hasher does not hold
+    the GIL of the request threads.
+
+    At most `workers + queue_size` verifications may be in flight; further ones
+    are rejected with `PinVerificationBusy` so the caller can shed load. A slot
+    is only freed once its verification is done or cancelled, so verifications
+    that timed out still count until the pool gets to them. With no workers,
+    PINs are verified inline in the calling thread.
+
+    A batch of PINs is verified in parallel with `check_many`, which takes a
+    slot for every PIN up front or rejects the whole batch.
+    """
+
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=init_worker
+                )
+            return self._pool
+
+    def _discard_pool(self, pool):
+        # A worker died, so the pool rejects every verification until replaced
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def check_password(self, pin, hashed_pin):
+        return self.check_many([(pin, hashed_pin)])[0]
+
+    def check_many(self, pairs):
+        """
+        Returns whether each (pin, hashed_pin) pair matches, verifying them all
+        at once in the pool. Raises `PinVerificationBusy` unless a slot is free
+        for every pair, or when they are not all verified within the timeout.
+        """
+        if not self.workers or not pairs:
+            return [check_password(pin, hashed_pin) for pin, hashed_pin in pairs]
+
+        acquired = 0
+        while acquired < len(pairs) and self._slots.acquire(blocking=False):
+            acquired += 1
+        if acquired < len(pairs):
+            for _ in range(acquired):
+                self._slots.release()
+            raise PinVerificationBusy
+        pool = self._get_pool()
+        futures = []
+        try:
+            for pin, hashed_pin in pairs:
+                future = pool.submit(check_password, pin, hashed_pin)
+                future.add_done_callback(lambda future: self._slots.release())
+                futures.append(future)
+        except BrokenProcessPool:
+            # Submitted verifications free their slot once failed or cancelled
+            for _ in range(len(pairs) - len(futures)):
+                self._slots.release()
+            for future in futures:
+                future.cancel()
+            self._discard_pool(pool)
+            raise PinVerificationBusy
+
+        deadline = time.monotonic() + self.timeout
+        try:
+            return [
+                future.result(timeout=max(deadline - time.monotonic(), 0))
+                for future in futures
+            ]
+        except TimeoutError:
+            # Drop the verifications that have not started yet
+            for future in futures:
+                future.cancel()
+            raise PinVerificationBusy
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise PinVerificationBusy
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+pin_executor = PinExecutor(
+    workers=settings.PIN_VERIFY_WORKERS,
+    queue_size=settings.PIN_VERIFY_QUEUE_SIZE,
+    timeout=settings.PIN_VERIFY_TIMEOUT,
+)
@@ -0,0 +1,118 @@
+import csv
+import json
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from ..models import GatewayRecord
+
+EXPORT_FIELDS = ("id", "timestamp", "gateway_id", "token_uuid")
+
+
+def parse_moment(params, name):
+    """
+    Returns the aware datetime of the `name` parameter, or None when it is not
+    given, raising ValueError when it is invalid.
+    """
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValueError(f"Invalid {name}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_export_filters(params):
+    """
+    Returns the filters of an export from its `gateway`, `token`, `start` and
+    `end` parameters, raising ValueError when they are invalid.
+    """
+    filters = {
+        "gateway_id": params.get("gateway") or None,
+        "token_uuid": params.get("token") or None,
+    }
+    if filters["gateway_id"] is None and filters["token_uuid"] is None:
+        raise ValueError("A gateway or token is required")
+    filters["start"] = parse_moment(params, "start")
+    filters["end"] = parse_moment(params, "end")
+    return filters
+
+
+def export_queryset(gateway_id=None, token_uuid=None, start=None, end=None):
+    """
+    Returns the gateway records of a gateway and/or token between `start`
+    (inclusive) and `end` (exclusive), as tuples of `EXPORT_FIELDS`.
+    """
+    records = GatewayRecord.objects.all()
+    if gateway_id is not None:
+        records = records.filter(gateway__gateway_id=gateway_id)
+    if token_uuid is not None:
+        records = records.filter(token__token_uuid=token_uuid)
+    if start is not None:
+        records = records.filter(timestamp__gte=start)
+    if end is not None:
+        records = records.filter(timestamp__lt=end)
+    return records.values_list(
+        "id", "timestamp", "gateway__gateway_id", "token__token_uuid"
+    )
+
+
+def iter_records(records, chunk_size):
+    """
+    Yields the records ordered by (timestamp, id), fetching `chunk_size` rows
+    per query.
+
+    Each page starts after the last (timestamp, id) of the previous one rather
+    than at an offset, so every query is a short index range scan and memory
+    stays constant however many records match.
+    """
+    records = records.order_by("timestamp", "id")
+    page = records
+    while True:
+        chunk = list(page[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id, last_timestamp = chunk[-1][0], chunk[-1][1]
+        page = records.filter(
+            Q(timestamp__gt=last_timestamp)
+            | Q(timestamp=last_timestamp, id__gt=last_id)
+        )
+
+
+def _serialize(record):
+    pk, timestamp, gateway_id, token_uuid = record
+    return pk, timestamp.isoformat(), gateway_id, token_uuid
+
+
+def render_ndjson(records):
+    for record in records:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, _serialize(record)))) + "\n"
+
+
+class _Echo:
+    """
+    File-like object that returns what is written, for use with csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_csv(records):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for record in records:
+        yield writer.writerow(_serialize(record))
+
+
+# Renderer and content type of every export format
+EXPORT_FORMATS = {
+    "ndjson": (render_ndjson, "application/x-ndjson"),
+    "csv": (render_csv, "text/csv"),
+}
@@ -0,0 +1,236 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+from ..models import GatewayRecord
+from .occupancy import occupancy_counters
+
+logger = logging.getLogger(__name__)
+
+
+def insert_gateway_records(gateway_records, batch_size=None):
+    """
+    Inserts gateway records and returns the inserted ones. When the batch
+    violates a constraint, typically the unique gateway and sequence of a
+    retried scan, the records are inserted one at a time and the failing ones
+    are skipped.
+    """
+    # Only records with a sequence can be retries
+    if all(gateway_record.sequence is None for gateway_record in gateway_records):
+        return GatewayRecord.objects.bulk_create(gateway_records, batch_size=batch_size)
+    try:
+        with transaction.atomic():
+            return GatewayRecord.objects.bulk_create(
+                gateway_records, batch_size=batch_size
+            )
+    except IntegrityError:
+        pass
+
+    inserted = []
+    for gateway_record in gateway_records:
+        try:
+            with transaction.atomic():
+                inserted += GatewayRecord.objects.bulk_create([gateway_record])
+        except IntegrityError as error:
+            logger.warning(
+                "Skipped gateway record of gateway %s with sequence %s: %s",
+                gateway_record.gateway_id,
+                gateway_record.sequence,
+                error,
+            )
+    return inserted
+
+
+class GatewayRecordQueue:
+    """
+    Write-behind queue for gateway records.
+
+    Check-ins enqueue their record and return immediately, while a background
+    thread writes them with `bulk_create` once `batch_size` records are waiting
+    or `flush_interval` seconds have passed. Records that cannot be written, or
+    that do not fit in the queue, are appended to the spill file at
+    `spill_path` and replayed on the next successful flush. The queue is
+    drained when the process exits.
+    """
+
+    def __init__(
+        self, batch_size, flush_interval, max_size, spill_path, autostart=True
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = str(spill_path)
+        self.autostart = autostart
+        self.flushed = 0
+        self.spilled = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="gateway-record-flusher", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.drain)
+
+    def put(self, gateway_record):
+        if self.autostart:
+            self._ensure_started()
+        try:
+            self._queue.put_nowait(gateway_record)
+        except queue.Full:
+            self._spill([gateway_record])
+
+    def _take(self, limit, block=False):
+        """
+        Takes up to `limit` records, waiting up to `flush_interval` for the
+        first one when `block` is set.
+        """
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < limit:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take(self.batch_size, block=True)
+            # Wait for a full batch or the end of the flush interval
+            if batch and len(batch) < self.batch_size:
+                self._stop.wait(self.flush_interval)
+                batch += self._take(self.batch_size - len(batch))
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """
+        Writes every queued record in the calling thread.
+        """
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                break
+            self._write(batch)
+
+    def drain(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self._replay_spill()
+
+    def _write(self, batch):
+        with self._flush_lock:
+            close_old_connections()
+            try:
+                inserted = insert_gateway_records(batch)
+            except DatabaseError:
+                logger.exception("Unable to write %d gateway records", len(batch))
+                self._spill(batch)
+                return
+            self.flushed += len(inserted)
+            self._replay_spill()
+
+    def _spill(self, gateway_records):
+        lines = "".join(
+            json.dumps(
+                {
+                    "token_id": gateway_record.token_id,
+                    "gateway_id": gateway_record.gateway_id,
+                    "timestamp": gateway_record.timestamp.isoformat(),
+                    "sequence": gateway_record.sequence,
+                }
+            )
+            + "\n"
+            for gateway_record in gateway_records
+        )
+        with self._spill_lock, open(self.spill_path, "a") as spill_file:
+            spill_file.write(lines)
+            spill_file.flush()
+            os.fsync(spill_file.fileno())
+        self.spilled += len(gateway_records)
+
+    def _replay_spill(self):
+        # Claim the spill file so other workers do not replay it too
+        replay_path = f"{self.spill_path}.{os.getpid()}.replay"
+        try:
+            os.replace(self.spill_path, replay_path)
+        except FileNotFoundError:
+            return
+
+        with open(replay_path) as replay_file:
+            gateway_records = [
+                GatewayRecord(
+                    token_id=record["token_id"],
+                    gateway_id=record["gateway_id"],
+                    timestamp=parse_datetime(record["timestamp"]),
+                    sequence=record.get("sequence"),
+                )
+                for record in map(json.loads, replay_file)
+            ]
+        try:
+            inserted = insert_gateway_records(
+                gateway_records, batch_size=self.batch_size
+            )
+        except DatabaseError:
+            logger.exception(
+                "Unable to replay %d gateway records", len(gateway_records)
+            )
+            self._spill(gateway_records)
+        else:
+            self.flushed += len(inserted)
+        os.remove(replay_path)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "flushed": self.flushed,
+            "spilled": self.spilled,
+        }
+
+
+gateway_record_queue = GatewayRecordQueue(
+    batch_size=settings.GATEWAY_RECORD_FLUSH_SIZE,
+    flush_interval=settings.GATEWAY_RECORD_FLUSH_INTERVAL,
+    max_size=settings.GATEWAY_RECORD_QUEUE_SIZE,
+    spill_path=settings.GATEWAY_RECORD_SPILL_PATH,
+)
+
+
+def save_gateway_records(gateway_records):
+    """
+    Saves gateway records, through the write-behind queue when it is enabled,
+    and returns the saved ones. Records with a sequence are always inserted
+    right away, so that the ones skipped for a recorded sequence are known.
+    """
+    if settings.GATEWAY_RECORD_WRITE_BEHIND:
+        sequenced = []
+        for gateway_record in gateway_records:
+            if gateway_record.sequence is None:
+                gateway_record_queue.put(gateway_record)
+            else:
+                sequenced.append(gateway_record)
+        inserted = insert_gateway_records(sequenced)
+        gateway_records = [
+            gateway_record
+            for gateway_record in gateway_records
+            if gateway_record.sequence is None
+        ] + inserted
+    else:
+        gateway_records = insert_gateway_records(gateway_records)
+    occupancy_counters.add(gateway_records)
+    return gateway_records
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+
+class DuplicateScanFilter:
+    """
+    Suppresses repeat scans of a token at a gateway.
+
+    Once a scan is checked in, a keyed digest of its user, gateway, token and
+    PIN is cached with its timestamp for `window` seconds. A repeat of the same
+    scan within `window` seconds of that timestamp is answered as checked in
+    without looking up the token or hashing the PIN, and no record is written.
+    Comparing scan timestamps rather than arrival times keeps buffered scans
+    uploaded together apart. A window of 0 disables the filter.
+
+    The scans of a token share one cache entry, so that a token whose PIN or
+    status changes is forgotten at every gateway at once.
+    """
+
+    key_salt = "gateway.helpers.scan_dedup.DuplicateScanFilter"
+
+    def __init__(self, window, cache_alias="default"):
+        self.window = window
+        self.cache_alias = cache_alias
+        self.suppressed = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _key(self, token_uuid):
+        return f"gateway:scan:{token_uuid}"
+
+    def _digest(self, user, scan):
+        return salted_hmac(
+            self.key_salt,
+            f"{user.pk}:{scan['gateway_id']}:{scan['token_uuid']}:{scan['pin']}",
+        ).hexdigest()
+
+    def is_duplicate(self, user, scan, timestamp):
+        """
+        Returns whether `scan` repeats a scan checked in by the same user with
+        the same PIN within the window.
+        """
+        if not self.window:
+            return False
+        entry = self.cache.get(self._key(scan["token_uuid"]), {}).get(
+            scan["gateway_id"]
+        )
+        if entry is None:
+            return False
+        digest, last_timestamp = entry
+        if abs((timestamp - last_timestamp).total_seconds()) >= self.window:
+            return False
+        if not constant_time_compare(digest, self._digest(user, scan)):
+            return False
+        self.suppressed += 1
+        return True
+
+    def remember(self, user, scans):
+        """
+        Remembers checked in scans, given as (scan, timestamp) pairs.
+        """
+        if not self.window or not scans:
+            return
+        keys = {self._key(scan["token_uuid"]) for scan, _ in scans}
+        entries = self.cache.get_many(keys)
+        for scan, timestamp in scans:
+            entries.setdefault(self._key(scan["token_uuid"]), {})[
+                scan["gateway_id"]
+            ] = (self._digest(user, scan), timestamp)
+        self.cache.set_many(entries, timeout=self.window)
+
+    def forget(self, token_uuid):
+        self.cache.delete(self._key(token_uuid))
+
+    def stats(self):
+        return {"window": self.window, "suppressed": self.suppressed}
+
+
+duplicate_scan_filter = DuplicateScanFilter(window=settings.CHECKIN_DEDUP_WINDOW)
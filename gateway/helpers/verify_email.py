@@ -1,30 +1,38 @@
-import hashlib
-from django.utils.crypto import get_random_string
-from django.core.mail import send_mail
-from rest_framework.reverse import reverse
-from django.conf import settings
+import secrets
+from django.db import IntegrityError, transaction
 from ..models import SiteOwner
-from config.settings import SECRET_KEY
+from .email_outbox import queue_email
 
+# 32 random bytes give a 43 character URL-safe key
+ACTIVATION_KEY_BYTES = 32
+ACTIVATION_KEY_ATTEMPTS = 3
 
-def generate_activation_key(email):
-    chars = "abcdefghijklmnopqrstuvwxyz0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ123456789!@#$%^&*(-_=+)"
-    while True:
-        saltPre = get_random_string(20, chars)
-        saltPost = get_random_string(20, chars)
-        activation_key = hashlib.sha512(
-            (saltPre + SECRET_KEY + email + saltPost).encode("utf-8")
-        ).hexdigest()
-        try:
-            new_session_user = SiteOwner.objects.get(activation_key=activation_key)
-        except:
-            break
-    return activation_key
 
+def generate_activation_key():
+    return secrets.token_urlsafe(ACTIVATION_KEY_BYTES)
 
-def sendVerificationEmail(request, activation_key, email):
-    email_verification_error = False
 
+def save_with_activation_key(save, attempts=ACTIVATION_KEY_ATTEMPTS):
+    """
+    Calls `save` with a fresh activation key, retrying with another key if
+    the key is already taken. The unique constraint on the key is relied on
+    instead of checking for an existing key before every insert.
+    """
+    for attempt in range(1, attempts + 1):
+        activation_key = generate_activation_key()
+        try:
+            with transaction.atomic():
+                return save(activation_key)
+        except IntegrityError:
+            # Only a clash on the activation key is worth retrying
+            if (
+                attempt == attempts
+                or not SiteOwner.objects.filter(activation_key=activation_key).exists()
+            ):
+                raise
+
+
+def verificationEmail(activation_key, email):
     subject = "Gateway Account Verification"
 
     message = f"""\n
@@ -38,8 +46,9 @@ def sendVerificationEmail(request, activation_key, email):
             {activation_key}
     """
 
-    try:
-        send_mail(subject, message, settings.SERVER_EMAIL, [email])
-    except:
-        email_verification_error = True
-    return email_verification_error
+    return subject, message
+
+
+def queueVerificationEmail(activation_key, email):
+    subject, message = verificationEmail(activation_key, email)
+    return queue_email(email, subject, message)
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from ...helpers.record_export import (
+    EXPORT_FORMATS,
+    export_queryset,
+    iter_records,
+    parse_export_filters,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports the gateway records of a gateway and/or token for contact "
+        "tracing, as NDJSON or CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--gateway", help="Gateway id, e.g. 610123-01-123-1.")
+        parser.add_argument("--token", help="Token uuid.")
+        parser.add_argument("--start", help="Earliest timestamp, inclusive.")
+        parser.add_argument("--end", help="Latest timestamp, exclusive.")
+        parser.add_argument("--format", choices=tuple(EXPORT_FORMATS), default="ndjson")
+        parser.add_argument(
+            "--output", help="File written to, standard output by default."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.GATEWAY_RECORD_EXPORT_CHUNK_SIZE,
+            help="Number of records fetched per query.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_export_filters(options)
+        except ValueError as error:
+            raise CommandError(error)
+
+        render, _ = EXPORT_FORMATS[options["format"]]
+        records = iter_records(export_queryset(**filters), options["chunk_size"])
+        if not options["output"]:
+            for chunk in render(records):
+                self.stdout.write(chunk, ending="")
+            return
+        with open(options["output"], "w", newline="") as output:
+            output.writelines(render(records))
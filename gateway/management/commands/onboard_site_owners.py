@@ -0,0 +1,263 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from ...helpers.pin_executor import init_worker
+from ...helpers.verify_email import generate_activation_key, verificationEmail
+from ...models import EmailOutbox, Gateway, SiteOwner
+
+User = get_user_model()
+
+
+def read_rows(path, format):
+    """
+    Yields the line number and fields of every site owner in a CSV or JSONL file.
+    """
+    with open(path, newline="") as file:
+        if format == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(file, start=1):
+                if line.strip():
+                    try:
+                        yield line_num, json.loads(line)
+                    except ValueError:
+                        yield line_num, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates site owners, their gateways and verification emails from a CSV "
+        "or JSONL file with email, password, postal_code, unit_no and optionally "
+        "gateways columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file of site owners.")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            help="Format of the file, guessed from its extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of site owners created per transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes hashing passwords, 0 to hash them inline.",
+        )
+        parser.add_argument(
+            "--gateways",
+            type=int,
+            default=1,
+            help="Gateways added per site owner without a gateways column.",
+        )
+
+    def handle(self, *args, **options):
+        format = options["format"] or (
+            "jsonl" if options["path"].endswith((".jsonl", ".json")) else "csv"
+        )
+        self.default_gateways = options["gateways"]
+        self.workers = options["workers"]
+        self.seen_emails = set()
+        self.seen_locations = set()
+        created = skipped = 0
+        start = time.perf_counter()
+
+        pool = None
+        if options["workers"]:
+            pool = ProcessPoolExecutor(
+                max_workers=options["workers"], initializer=init_worker
+            )
+        try:
+            rows = read_rows(options["path"], format)
+            while True:
+                batch = list(islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                site_owners = self.validate(batch)
+                skipped += len(batch) - len(site_owners)
+                self.hash_passwords(site_owners, pool)
+                try:
+                    self.create(site_owners)
+                except IntegrityError as error:
+                    raise CommandError(
+                        f"Batch starting at line {batch[0][0]} failed: {error}. "
+                        f"{created} site owners were created before it, run the "
+                        "command again to resume."
+                    )
+                created += len(site_owners)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"Onboarded {created} site owners, skipped {skipped} "
+                    f"({created / elapsed:.0f}/s)"
+                )
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {options['path']}")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Onboarded {created} site owners in "
+                f"{time.perf_counter() - start:.1f}s, skipped {skipped}"
+            )
+        )
+
+    def skip(self, line_num, reason):
+        self.stderr.write(f"Line {line_num}: {reason}")
+
+    def validate(self, batch):
+        """
+        Returns the valid site owners of a batch, skipping those whose email
+        or location is already taken.
+        """
+        site_owners = []
+        for line_num, row in batch:
+            if not isinstance(row, dict):
+                self.skip(line_num, "Invalid row")
+                continue
+            try:
+                email = User.objects.normalize_email(str(row.get("email") or ""))
+                validate_email(email)
+                password = str(row.get("password") or "")
+                validate_password(password, User(email=email))
+                postal_code = str(row.get("postal_code") or "")
+                unit_no = str(row.get("unit_no") or "")
+                if len(postal_code) != 6 or not postal_code.isdigit():
+                    raise ValidationError("Invalid postal code")
+                if not unit_no or len(unit_no) > 6:
+                    raise ValidationError("Invalid unit number")
+                gateways = row.get("gateways")
+                if gateways in (None, ""):
+                    gateways = self.default_gateways
+                gateways = int(gateways)
+                if not 0 <= gateways <= settings.MAX_GATEWAYS_PER_SITE_OWNER:
+                    raise ValidationError("Invalid number of gateways")
+            except ValidationError as error:
+                self.skip(line_num, " ".join(error.messages))
+                continue
+            except ValueError:
+                self.skip(line_num, "Invalid number of gateways")
+                continue
+
+            if email in self.seen_emails:
+                self.skip(line_num, "Email already in use.")
+                continue
+            if (postal_code, unit_no) in self.seen_locations:
+                self.skip(line_num, "There is already an account for this location")
+                continue
+            self.seen_emails.add(email)
+            self.seen_locations.add((postal_code, unit_no))
+            site_owners.append(
+                {
+                    "line_num": line_num,
+                    "email": email,
+                    "password": password,
+                    "postal_code": postal_code,
+                    "unit_no": unit_no,
+                    "gateways": gateways,
+                }
+            )
+
+        # Skip site owners that already have an account, so that a failed
+        # import can be run again
+        existing_emails = set(
+            User.objects.filter(
+                email__in=[site_owner["email"] for site_owner in site_owners]
+            ).values_list("email", flat=True)
+        )
+        existing_locations = set(
+            SiteOwner.objects.filter(
+                postal_code__in={
+                    site_owner["postal_code"] for site_owner in site_owners
+                }
+            ).values_list("postal_code", "unit_no")
+        )
+        new_site_owners = []
+        for site_owner in site_owners:
+            if site_owner["email"] in existing_emails:
+                self.skip(site_owner["line_num"], "Email already in use.")
+            elif (
+                site_owner["postal_code"],
+                site_owner["unit_no"],
+            ) in existing_locations:
+                self.skip(
+                    site_owner["line_num"],
+                    "There is already an account for this location",
+                )
+            else:
+                new_site_owners.append(site_owner)
+        return new_site_owners
+
+    def hash_passwords(self, site_owners, pool):
+        passwords = [site_owner["password"] for site_owner in site_owners]
+        if pool is None:
+            hashed_passwords = map(make_password, passwords)
+        else:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            hashed_passwords = pool.map(make_password, passwords, chunksize=chunksize)
+        for site_owner, hashed_password in zip(site_owners, hashed_passwords):
+            site_owner["password"] = hashed_password
+
+    @transaction.atomic
+    def create(self, site_owners):
+        User.objects.bulk_create(
+            User(email=site_owner["email"], password=site_owner["password"])
+            for site_owner in site_owners
+        )
+        # bulk_create does not set the ids of the users on MariaDB
+        user_ids = dict(
+            User.objects.filter(
+                email__in=[site_owner["email"] for site_owner in site_owners]
+            ).values_list("email", "id")
+        )
+
+        new_site_owners = []
+        gateways = []
+        emails = []
+        for site_owner in site_owners:
+            activation_key = generate_activation_key()
+            new_site_owners.append(
+                SiteOwner(
+                    user_id=user_ids[site_owner["email"]],
+                    postal_code=site_owner["postal_code"],
+                    unit_no=site_owner["unit_no"],
+                    activation_key=activation_key,
+                )
+            )
+            gateways.extend(
+                Gateway(
+                    gateway_id=f"{site_owner['postal_code']}-{site_owner['unit_no']}-{index}",
+                    site_owner_id=user_ids[site_owner["email"]],
+                )
+                for index in range(1, site_owner["gateways"] + 1)
+            )
+            subject, message = verificationEmail(activation_key, site_owner["email"])
+            emails.append(
+                EmailOutbox(
+                    recipient=site_owner["email"], subject=subject, body=message
+                )
+            )
+
+        SiteOwner.objects.bulk_create(new_site_owners)
+        Gateway.objects.bulk_create(gateways)
+        EmailOutbox.objects.bulk_create(emails)
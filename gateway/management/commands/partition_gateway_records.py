@@ -0,0 +1,90 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from ...helpers.partitions import (
+    PERIODS,
+    expired_partitions,
+    partition_scheme,
+    partitions_between,
+    period_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the gateway record partitions of the coming periods and drops the "
+        "partitions older than the retention. Meant to run daily, e.g. from cron. "
+        "On MariaDB the table must first be partitioned with --enable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--enable",
+            action="store_true",
+            help="Partition the gateway record table. This rebuilds the table.",
+        )
+        parser.add_argument(
+            "--period",
+            choices=PERIODS,
+            default=settings.GATEWAY_RECORD_PARTITION_PERIOD,
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.GATEWAY_RECORD_RETENTION_DAYS,
+            help="Age in days after which records are dropped.",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=settings.GATEWAY_RECORD_PARTITIONS_AHEAD,
+            help="Number of days to add partitions for in advance.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report the partitions that would be added and dropped.",
+        )
+
+    def handle(self, *args, **options):
+        period = options["period"]
+        scheme = partition_scheme(period)
+        now = timezone.now()
+        until = now + timedelta(days=options["ahead"])
+
+        if options["enable"] and not scheme.is_enabled():
+            if options["dry_run"]:
+                self.stdout.write("Would partition the gateway record table")
+                return
+            partitions = scheme.enable(until)
+            self.stdout.write(
+                f"Partitioned the gateway record table into {len(partitions)} "
+                f"partitions by {period}"
+            )
+        elif not scheme.is_enabled():
+            raise CommandError(
+                "The gateway record table is not partitioned, run with --enable"
+            )
+
+        partitions = scheme.partitions()
+        new_partitions = []
+        # Emulated partitions only exist once they have records
+        if scheme.native:
+            next_start = partitions[-1].end if partitions else period_start(now, period)
+            new_partitions = partitions_between(next_start, until, period)
+        expired = expired_partitions(partitions, now, options["retention_days"])
+
+        if options["dry_run"]:
+            self.report("Would add", new_partitions)
+            self.report("Would drop", expired)
+            return
+        scheme.create(new_partitions)
+        scheme.drop(expired)
+        self.report("Added", new_partitions)
+        self.report("Dropped", expired)
+
+    def report(self, action, partitions):
+        if partitions:
+            names = ", ".join(partition.name for partition in partitions)
+            self.stdout.write(f"{action} partitions {names}")
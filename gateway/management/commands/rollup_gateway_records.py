@@ -0,0 +1,54 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from ...helpers.occupancy import bucket_start
+from ...helpers.record_export import parse_moment
+from ...helpers.rollup import rollup_range, rollup_start
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregates the gateway records of the closed hours since the watermark "
+        "into the hourly rollup table. Meant to run every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lookback",
+            type=int,
+            default=settings.GATEWAY_RECORD_ROLLUP_LOOKBACK,
+            help="Hours before the watermark aggregated again for late records.",
+        )
+        parser.add_argument(
+            "--since",
+            help="Aggregate again from this timestamp instead of the watermark.",
+        )
+        parser.add_argument(
+            "--chunk-hours",
+            type=int,
+            default=24,
+            help="Hours aggregated per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_moment(options, "since")
+        except ValueError as error:
+            raise CommandError(error)
+
+        open_hour = bucket_start(timezone.now(), "hour")
+        start = rollup_start(options["lookback"], since)
+        if start is None:
+            self.stdout.write("No gateway records to roll up")
+            return
+
+        chunk = timedelta(hours=options["chunk_hours"])
+        rollups = 0
+        while start < open_hour:
+            end = min(start + chunk, open_hour)
+            rollups += rollup_range(start, end)
+            start = end
+        self.stdout.write(
+            f"Rolled up {rollups} gateway hours until {open_hour.isoformat()}"
+        )
@@ -0,0 +1,43 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from ...helpers.email_outbox import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Sends the emails queued in the outbox, retrying failed ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+            help="Maximum number of emails sent over one SMTP connection.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.EMAIL_OUTBOX_POLL_INTERVAL,
+            help="Seconds to wait when the outbox has no due emails.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Send the due emails and exit instead of polling the outbox.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                close_old_connections()
+                sent, failed = send_queued_emails(options["batch_size"])
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent} emails, {failed} failed")
+                # A partial batch means there are no more due emails for now
+                if sent + failed < options["batch_size"]:
+                    if options["once"]:
+                        return
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 
 
@@ -81,9 +82,15 @@ class Staff(models.Model):
 
 
 class Gateway(models.Model):
-    gateway_id = models.CharField(max_length=15, unique=True)
+    # "<postal code>-<unit no>-<index>", with room for indexes of 10 and up
+    gateway_id = models.CharField(max_length=20, unique=True)
     site_owner = models.ForeignKey(SiteOwner, on_delete=models.CASCADE)
-    authentication_token = models.CharField(max_length=64, blank=False, null=True)
+    authentication_token = models.CharField(
+        max_length=64, blank=False, null=True, unique=True
+    )
+    # Key and expiry of the knox token the gateway was started with
+    auth_token_key = models.CharField(max_length=8, blank=True, null=True)
+    authentication_expiry = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return self.gateway_id
@@ -110,16 +117,25 @@ class Token(models.Model):
     issuer = models.ForeignKey(Staff, null=True, on_delete=models.SET_NULL)
     status = models.BooleanField(default=True)
     hashed_pin = models.CharField(max_length=128)
+    # Read by the allow-list deltas. Also set by the database, see
+    # helpers.change_columns
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True)
 
     class Meta:
         managed = True
         db_table = "token"
+        indexes = [
+            models.Index(fields=["token_uuid", "status"], name="token_uuid_status_idx"),
+        ]
 
 
 class MedicalRecord(models.Model):
     identity = models.OneToOneField(Identity, on_delete=models.PROTECT)
     token = models.ForeignKey(Token, on_delete=models.PROTECT, blank=True, null=True)
     vaccination_status = models.BooleanField(default=False)
+    # Read by the eligibility index to pick up changes made by other workers
+    # and services. Also set by the database, see helpers.change_columns
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True)
 
     class Meta:
         managed = True
@@ -129,8 +145,104 @@ class MedicalRecord(models.Model):
 class GatewayRecord(models.Model):
     token = models.ForeignKey(Token, on_delete=models.PROTECT)
     gateway = models.ForeignKey(Gateway, on_delete=models.PROTECT)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    sequence = models.BigIntegerField(null=True, blank=True)
 
     class Meta:
         managed = True
         db_table = "gatewayrecord"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["gateway", "sequence"], name="gatewayrecord_sequence_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["gateway", "timestamp"], name="gatewayrecord_gateway_ts_idx"
+            ),
+            models.Index(
+                fields=["token", "timestamp"], name="gatewayrecord_token_ts_idx"
+            ),
+        ]
+
+
+class EmailOutbox(models.Model):
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        managed = True
+        db_table = "email_outbox"
+        indexes = [
+            models.Index(
+                fields=["sent_at", "next_attempt_at"], name="email_outbox_due_idx"
+            ),
+        ]
+
+
+class GatewayCounter(models.Model):
+    gateway = models.ForeignKey(Gateway, on_delete=models.CASCADE)
+    resolution = models.CharField(max_length=6)
+    bucket = models.DateTimeField()
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = "gatewaycounter"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["gateway", "resolution", "bucket"],
+                name="gatewaycounter_bucket_unique",
+            ),
+        ]
+
+
+class GatewayRecordRollup(models.Model):
+    gateway = models.ForeignKey(Gateway, on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    visits = models.IntegerField()
+
+    class Meta:
+        managed = True
+        db_table = "gatewayrecord_rollup"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["gateway", "hour"], name="gatewayrecord_rollup_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["hour"], name="gatewayrecord_rollup_hour_idx"),
+        ]
+
+
+class RollupWatermark(models.Model):
+    name = models.CharField(max_length=64, primary_key=True)
+    value = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = "rollup_watermark"
+
+
+class PinVerifier(models.Model):
+    site_owner = models.ForeignKey(SiteOwner, on_delete=models.CASCADE)
+    token = models.ForeignKey(Token, on_delete=models.CASCADE)
+    # Derived from the hashed PIN the verifier was made for
+    salt = models.CharField(max_length=16)
+    verifier = models.CharField(max_length=8)
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True)
+
+    class Meta:
+        managed = True
+        db_table = "pin_verifier"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["site_owner", "token"], name="pin_verifier_unique"
+            ),
+        ]
@@ -1,7 +1,10 @@
+from datetime import timedelta
+from django.conf import settings
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator, UniqueTogetherValidator
 from .models import Gateway, GatewayRecord, Token, SiteOwner
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.contrib.auth.password_validation import validate_password
 
 User = get_user_model()
@@ -15,8 +18,36 @@ class GatewaySerializer(serializers.ModelSerializer):
 
 class GatewayRecordSerializer(serializers.Serializer):
     token_uuid = serializers.CharField(max_length=36)
-    gateway_id = serializers.CharField(max_length=15)
+    gateway_id = serializers.CharField(max_length=20)
     pin = serializers.CharField(max_length=6)
+    timestamp = serializers.DateTimeField(required=False)
+    # Numbered by the gateway, so that a retried scan is not recorded twice
+    sequence = serializers.IntegerField(
+        required=False, min_value=0, max_value=2**63 - 1
+    )
+
+    def validate(self, data):
+        # Scans buffered by the gateway keep their time, but never in the future
+        timestamp = data.get("timestamp")
+        now = timezone.now()
+        if data.get("sequence") is None:
+            if timestamp is not None:
+                data["timestamp"] = min(timestamp, now)
+            return data
+
+        # A retry must carry the time of the first attempt, as the time is part
+        # of the unique key of the sequence on partitioned gateway records, so
+        # it is kept as sent rather than clamped to a time that moves between
+        # retries
+        if timestamp is None:
+            raise serializers.ValidationError(
+                {"timestamp": "A timestamp is required with a sequence."}
+            )
+        if timestamp > now + timedelta(seconds=settings.CHECKIN_MAX_CLOCK_SKEW):
+            raise serializers.ValidationError(
+                {"timestamp": "The timestamp is in the future."}
+            )
+        return data
 
 
 class TokenSerializer(serializers.ModelSerializer):
@@ -68,6 +99,7 @@ class SiteOwnerSerializer(serializers.ModelSerializer):
             user=user,
             postal_code=validated_data["postal_code"],
             unit_no=validated_data["unit_no"],
+            activation_key=validated_data["activation_key"],
         )
 
         return siteowner
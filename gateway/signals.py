@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from knox.models import AuthToken
+from .authentication import auth_token_cache_key
+from .helpers.eligibility import eligibility_index
+from .helpers.gateway_registry import gateway_registry
+from .helpers.pin_cache import pin_cache
+from .helpers.scan_dedup import duplicate_scan_filter
+from .models import Gateway, MedicalRecord, Token
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_pin(sender, instance, **kwargs):
+    """
+    Drops any verified PIN and recent scans of a token whose status or hashed
+    PIN may have changed.
+    """
+    pin_cache.invalidate(instance.pk)
+    duplicate_scan_filter.forget(instance.token_uuid)
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_auth_token(sender, instance, **kwargs):
+    """
+    Drops a cached auth token once it is deleted by logout or expiry.
+    """
+    cache.delete(auth_token_cache_key(instance.token_key))
+
+
+@receiver(post_delete, sender=AuthToken)
+def stop_gateways(sender, instance, **kwargs):
+    """
+    Stops the gateways started with an auth token once it is deleted by logout
+    or expiry.
+    """
+    gateways = Gateway.objects.filter(
+        site_owner_id=instance.user_id, auth_token_key=instance.token_key
+    )
+    gateway_ids = list(gateways.values_list("gateway_id", flat=True))
+    if not gateway_ids:
+        return
+    gateways.update(
+        authentication_token=None, auth_token_key=None, authentication_expiry=None
+    )
+    for gateway_id in gateway_ids:
+        gateway_registry.invalidate(gateway_id)
+
+
+@receiver(post_save, sender=Gateway)
+@receiver(post_delete, sender=Gateway)
+def invalidate_gateway(sender, instance, **kwargs):
+    """
+    Drops a gateway from the gateway registry once it is changed or removed.
+    """
+    gateway_registry.invalidate(instance.gateway_id)
+
+
+@receiver(post_save, sender=MedicalRecord)
+def update_eligibility(sender, instance, **kwargs):
+    """
+    Keeps the eligibility index in step with saved medical records.
+    """
+    eligibility_index.update(instance.identity_id, instance.vaccination_status)
+
+
+@receiver(post_delete, sender=MedicalRecord)
+def remove_eligibility(sender, instance, **kwargs):
+    eligibility_index.update(instance.identity_id, False)
+    # The deleted record no longer dates the change, so its tokens do for the
+    # allow-list deltas
+    Token.objects.filter(owner_id=instance.identity_id).update(
+        updated_at=timezone.now()
+    )
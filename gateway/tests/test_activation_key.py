@@ -0,0 +1,66 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from ..helpers import verify_email
+from ..models import SiteOwner
+
+User = get_user_model()
+
+
+class ActivationKeyTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.existing_key = "existing-activation-key"
+        SiteOwner.objects.create(
+            user=User.objects.create_user(
+                email="testuser1@gmail.com", password="testpassword1"
+            ),
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=cls.existing_key,
+        )
+
+    def register(self, email="newowner@gmail.com"):
+        return self.client.post(
+            reverse("register"),
+            {
+                "email": email,
+                "password": "Gateway-Pass-9021",
+                "password2": "Gateway-Pass-9021",
+                "postal_code": 610124,
+                "unit_no": "01-124",
+            },
+        )
+
+    def test_registration_activation_key_verifies_email(self):
+        self.register()
+
+        site_owner = SiteOwner.objects.get(user__email="newowner@gmail.com")
+        self.assertEqual(len(site_owner.activation_key), 43)
+        response = self.client.get(
+            reverse("verify_email", args=[site_owner.activation_key])
+        )
+        self.assertEqual(response.status_code, 200)
+        site_owner.refresh_from_db()
+        self.assertTrue(site_owner.email_validated)
+
+    def test_registration_retries_taken_activation_key(self):
+        with mock.patch(
+            "gateway.helpers.verify_email.secrets.token_urlsafe",
+            side_effect=[self.existing_key, "fresh-activation-key"],
+        ):
+            response = self.register()
+
+        self.assertEqual(response.data, "Account created for newowner@gmail.com")
+        site_owner = SiteOwner.objects.get(user__email="newowner@gmail.com")
+        self.assertEqual(site_owner.activation_key, "fresh-activation-key")
+        self.assertEqual(User.objects.filter(email="newowner@gmail.com").count(), 1)
+
+    def test_other_integrity_errors_are_not_retried(self):
+        save = mock.Mock(side_effect=IntegrityError("duplicate email"))
+
+        with self.assertRaises(IntegrityError):
+            verify_email.save_with_activation_key(save)
+        self.assertEqual(save.call_count, 1)
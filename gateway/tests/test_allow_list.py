@@ -0,0 +1,250 @@
+import hashlib
+import hmac
+import json
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from ..helpers.allow_list import (
+    current_version,
+    pin_salt,
+    pin_verifier,
+    pin_verifier_writer,
+    record_pin_verifiers,
+)
+from ..helpers.eligibility import eligibility_index
+from ..helpers.gateway_registry import gateway_registry
+from ..helpers.pin_cache import pin_cache
+from ..models import (
+    Gateway,
+    Identity,
+    MedicalRecord,
+    PinVerifier,
+    SiteOwner,
+    Token,
+)
+
+User = get_user_model()
+
+GATEWAY_TOKEN = "0123456789abcdef"
+OTHER_GATEWAY_TOKEN = "fedcba9876543210"
+GATEWAY_IDS = {GATEWAY_TOKEN: "610123-01-123-1", OTHER_GATEWAY_TOKEN: "610321-01-123-1"}
+
+
+class AllowListTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.site_owners = []
+        for i, (gateway_token, gateway_id) in enumerate(GATEWAY_IDS.items()):
+            user = User.objects.create_user(
+                email=f"testuser{i}@gmail.com", password="testpassword1"
+            )
+            site_owner = SiteOwner.objects.create(
+                user=user,
+                postal_code=gateway_id[:6],
+                unit_no="01-123",
+                activation_key=1234 + i,
+                email_validated=True,
+            )
+            Gateway.objects.create(
+                gateway_id=gateway_id,
+                site_owner=site_owner,
+                authentication_token=hashlib.sha256(gateway_token.encode()).hexdigest(),
+            )
+            cls.site_owners.append(site_owner)
+        cls.user = cls.site_owners[0].user
+
+        cls.tokens = []
+        for i in range(3):
+            identity = Identity.objects.create(
+                nric=f"S911111{i}A", fullname="", address="", phone_num=f"9123456{i}"
+            )
+            token = Token.objects.create(
+                token_uuid=f"c5:d7:14:84:f8:c{i}",
+                owner=identity,
+                hashed_pin=make_password("123456"),
+            )
+            MedicalRecord.objects.create(
+                identity=identity, token=token, vaccination_status=True
+            )
+            cls.tokens.append(token)
+
+    def setUp(self):
+        pin_cache.clear()
+        gateway_registry.clear()
+        eligibility_index.build()
+        cache.clear()
+        pin_verifier_writer.clear()
+
+    def check_in(self, token, pin="123456", gateway_token=GATEWAY_TOKEN):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + gateway_token)
+        response = self.client.post(
+            reverse("gateway_record"),
+            {
+                "token_uuid": token.token_uuid,
+                "gateway_id": GATEWAY_IDS[gateway_token],
+                "pin": pin,
+            },
+        )
+        self.assertEqual(response.data, "Added gateway record")
+        pin_verifier_writer.flush()
+
+    def fetch(self, gateway_token=GATEWAY_TOKEN, **params):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + gateway_token)
+        response = self.client.get(reverse("allow_list"), params)
+        self.assertEqual(response.status_code, 200)
+        *lines, signature = b"".join(response.streaming_content).splitlines(True)
+        token_hash = hashlib.sha256(gateway_token.encode()).hexdigest()
+        self.assertEqual(
+            json.loads(signature)["signature"],
+            hmac.new(token_hash.encode(), b"".join(lines), hashlib.sha256).hexdigest(),
+        )
+        header, *tokens = map(json.loads, lines)
+        self.assertEqual(response["X-Allow-List-Version"], str(header["version"]))
+        return header, tokens
+
+    def entry(self, token, eligible=1, pin="123456"):
+        salt = pin_salt(token.hashed_pin)
+        return [token.token_uuid, eligible, salt, pin_verifier(salt, pin)]
+
+    def test_full_snapshot_lists_tokens_checked_in_at_premises(self):
+        self.check_in(self.tokens[0])
+        self.check_in(self.tokens[1], gateway_token=OTHER_GATEWAY_TOKEN)
+
+        header, tokens = self.fetch()
+
+        self.assertTrue(header["full"])
+        self.assertLessEqual(header["version"], current_version())
+        self.assertEqual(tokens, [self.entry(self.tokens[0])])
+
+    def test_premises_get_the_same_verifier(self):
+        self.check_in(self.tokens[0])
+        self.check_in(self.tokens[0], gateway_token=OTHER_GATEWAY_TOKEN)
+
+        self.assertEqual(
+            self.fetch()[1], self.fetch(gateway_token=OTHER_GATEWAY_TOKEN)[1]
+        )
+
+    def test_verifier_is_only_written_once(self):
+        self.check_in(self.tokens[0])
+
+        with self.assertNumQueries(0):
+            record_pin_verifiers([(self.site_owners[0].pk, self.tokens[0], "123456")])
+        self.assertEqual(pin_verifier_writer.stats()["pending"], 0)
+        self.assertEqual(PinVerifier.objects.count(), 1)
+
+    def test_verifiers_are_written_in_a_constant_number_of_queries(self):
+        identity = self.tokens[0].owner
+        Token.objects.bulk_create(
+            Token(
+                token_uuid=f"c5:d7:14:84:f9:{i:02x}",
+                owner=identity,
+                hashed_pin=f"hashed-pin-{i}",
+            )
+            for i in range(50)
+        )
+        tokens = list(Token.objects.filter(token_uuid__startswith="c5:d7:14:84:f9"))
+        site_owner_id = self.site_owners[0].pk
+
+        # Check-ins only read the cache
+        with self.assertNumQueries(0):
+            record_pin_verifiers([(site_owner_id, token, "123456") for token in tokens])
+        # Stored verifiers, insert
+        with self.assertNumQueries(2):
+            pin_verifier_writer.flush()
+        self.assertEqual(PinVerifier.objects.count(), 50)
+
+        for token in tokens:
+            token.hashed_pin += "-changed"
+        record_pin_verifiers([(site_owner_id, token, "123456") for token in tokens])
+        # Stored verifiers, update
+        with self.assertNumQueries(2):
+            pin_verifier_writer.flush()
+        self.assertEqual(
+            set(PinVerifier.objects.values_list("salt", flat=True)),
+            {pin_salt(token.hashed_pin) for token in tokens},
+        )
+
+    @override_settings(ALLOW_LIST_SYNC_OVERLAP=0)
+    def test_delta_lists_changes_since_version(self):
+        for token in self.tokens:
+            self.check_in(token)
+        header, _ = self.fetch()
+
+        medical_record = MedicalRecord.objects.get(token=self.tokens[0])
+        medical_record.vaccination_status = False
+        medical_record.save()
+        self.tokens[1].status = False
+        self.tokens[1].save()
+        other_token = Token.objects.create(
+            token_uuid="c5:d7:14:84:f8:ff",
+            owner=self.tokens[2].owner,
+            hashed_pin="",
+        )
+
+        header, tokens = self.fetch(since=header["version"])
+
+        self.assertFalse(header["full"])
+        self.assertEqual(
+            tokens,
+            [
+                self.entry(self.tokens[0], eligible=0),
+                ["c5:d7:14:84:f8:c1"],
+            ],
+        )
+        self.assertNotIn(other_token.token_uuid, json.dumps(tokens))
+
+        # Nothing changed since the latest version
+        header, tokens = self.fetch(since=header["version"])
+        self.assertFalse(header["full"])
+        self.assertEqual(tokens, [])
+
+    @override_settings(ALLOW_LIST_SYNC_OVERLAP=0)
+    def test_pin_change_drops_token_until_checked_in(self):
+        token = self.tokens[0]
+        self.check_in(token)
+        header, _ = self.fetch()
+
+        token.hashed_pin = make_password("111111")
+        token.save()
+        header, tokens = self.fetch(since=header["version"])
+        self.assertEqual(tokens, [[token.token_uuid]])
+
+        self.check_in(token, pin="111111")
+        header, tokens = self.fetch(since=header["version"])
+        self.assertEqual(tokens, [self.entry(token, pin="111111")])
+
+    @override_settings(ALLOW_LIST_SYNC_OVERLAP=0)
+    def test_delta_lists_changes_made_outside_the_service(self):
+        self.check_in(self.tokens[0])
+        header, _ = self.fetch()
+
+        # Neither sets updated_at nor sends signals, like another service
+        Token.objects.filter(pk=self.tokens[0].pk).update(status=False)
+
+        header, tokens = self.fetch(since=header["version"])
+        self.assertFalse(header["full"])
+        self.assertEqual(tokens, [[self.tokens[0].token_uuid]])
+
+    @override_settings(ALLOW_LIST_DELTA_MAX_AGE=3600)
+    def test_old_or_unknown_version_gets_full_snapshot(self):
+        self.check_in(self.tokens[0])
+        version = current_version()
+
+        header, tokens = self.fetch(since=version - 3600 * 1000)
+        self.assertTrue(header["full"])
+        self.assertIsNone(header["since"])
+        self.assertEqual(len(tokens), 1)
+
+        self.assertTrue(self.fetch(since=version + 60 * 1000)[0]["full"])
+        response = self.client.get(reverse("allow_list"), {"since": "latest"})
+        self.assertEqual(response.data, "Invalid version")
+
+    def test_requires_started_gateway(self):
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse("allow_list"))
+
+        self.assertEqual(response.status_code, 403)
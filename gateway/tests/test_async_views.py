@@ -0,0 +1,100 @@
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import AsyncRequestFactory, TransactionTestCase
+from knox.models import AuthToken
+from ..async_views import AsyncGatewayList, AsyncGatewayRecordCreate, AsyncTokenDetail
+from ..helpers.occupancy import occupancy_counters
+from ..models import (
+    SiteOwner,
+    Gateway,
+    Identity,
+    Token,
+    MedicalRecord,
+    GatewayRecord,
+)
+
+User = get_user_model()
+
+
+class AsyncViewsTestCase(TransactionTestCase):
+    # Async views run their queries in a worker thread, so test data must be
+    # committed for them to see it
+    def setUp(self):
+        user = User.objects.create_user(
+            email="testuser1@gmail.com", password="testpassword1"
+        )
+        site_owner = SiteOwner.objects.create(
+            user=user,
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+            email_validated=True,
+        )
+        _, self.siteowner_auth_token = AuthToken.objects.create(user)
+        self.gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-1", site_owner=site_owner
+        )
+        identity = Identity.objects.create(
+            nric="S9111111A",
+            fullname="Test Person",
+            address="Test Address",
+            phone_num="91234567",
+        )
+        self.token = Token.objects.create(
+            token_uuid="c5:d7:14:84:f8:cf",
+            hashed_pin=make_password("123456"),
+            owner=identity,
+        )
+        MedicalRecord.objects.create(
+            identity=identity, token=self.token, vaccination_status=True
+        )
+        self.factory = AsyncRequestFactory()
+        occupancy_counters.clear()
+
+    async def test_async_gatewayrecord_valid_pin_return_added(self):
+        request = self.factory.post(
+            "/api/v1/gatewayrecord/",
+            {
+                "token_uuid": self.token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+                "pin": "123456",
+            },
+            content_type="application/json",
+            authorization="Token " + self.siteowner_auth_token,
+        )
+        response = await AsyncGatewayRecordCreate.as_view()(request)
+
+        self.assertEqual(json.loads(response.content), "Added gateway record")
+        self.assertEqual(await sync_to_async(GatewayRecord.objects.count)(), 1)
+
+    async def test_async_gatewayrecord_unauthenticated_return_401(self):
+        request = self.factory.post("/api/v1/gatewayrecord/")
+        response = await AsyncGatewayRecordCreate.as_view()(request)
+
+        self.assertEqual(response.status_code, 401)
+
+    async def test_async_token_retrieve_partial_identity(self):
+        request = self.factory.get(
+            f"/api/v1/token/{self.token.token_uuid}",
+            authorization="Token " + self.siteowner_auth_token,
+        )
+        response = await AsyncTokenDetail.as_view()(
+            request, token_uuid=self.token.token_uuid
+        )
+
+        self.assertEqual(
+            json.loads(response.content),
+            {"token_uuid": self.token.token_uuid, "nric": "S****111A"},
+        )
+
+    async def test_async_gateway_list(self):
+        request = self.factory.get(
+            "/api/v1/gateways/", authorization="Token " + self.siteowner_auth_token
+        )
+        response = await AsyncGatewayList.as_view()(request)
+
+        self.assertEqual(
+            json.loads(response.content)[0]["gateway_id"], self.gateway.gateway_id
+        )
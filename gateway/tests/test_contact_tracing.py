@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta, timezone
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from ..helpers.contact_tracing import find_contacts
+from ..models import Gateway, GatewayRecord, Identity, SiteOwner, Token
+
+User = get_user_model()
+
+
+class ContactTracingTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email="tracer@gmail.com", password="testpassword1"
+        )
+        cls.staff.is_staff = True
+        cls.staff.save()
+        site_owners = [
+            SiteOwner.objects.create(
+                user=User.objects.create_user(
+                    email=f"testuser{i}@gmail.com", password="testpassword1"
+                ),
+                postal_code="610123",
+                unit_no=f"01-12{i}",
+                activation_key=i,
+            )
+            for i in range(2)
+        ]
+        cls.entrance, cls.exit = [
+            Gateway.objects.create(
+                gateway_id=f"610123-01-120-{i}", site_owner=site_owners[0]
+            )
+            for i in (1, 2)
+        ]
+        cls.elsewhere = Gateway.objects.create(
+            gateway_id="610123-01-121-1", site_owner=site_owners[1]
+        )
+        tokens = {}
+        for i, name in enumerate(("infected", "near", "late", "exit", "elsewhere")):
+            identity = Identity.objects.create(
+                nric=f"S000000{i}A", fullname=name, address="", phone_num=f"9000000{i}"
+            )
+            tokens[name] = Token.objects.create(
+                token_uuid=f"00:00:00:00:00:0{i}", owner=identity, hashed_pin=""
+            )
+        cls.tokens = tokens
+        cls.visit = datetime(2021, 10, 1, 12, tzinfo=timezone.utc)
+        GatewayRecord.objects.bulk_create(
+            GatewayRecord(
+                token=tokens[name],
+                gateway=gateway,
+                timestamp=cls.visit + timedelta(minutes=minutes),
+            )
+            for name, gateway, minutes in (
+                ("infected", cls.entrance, 0),
+                ("infected", cls.entrance, 20),
+                ("near", cls.entrance, 12),
+                ("late", cls.entrance, 55),
+                ("exit", cls.exit, 5),
+                ("elsewhere", cls.elsewhere, 0),
+            )
+        )
+
+    def contact_uuids(self, result):
+        return [contact["token_uuid"] for contact in result["contacts"]]
+
+    def test_contacts_at_same_gateway(self):
+        with self.assertNumQueries(2):
+            result = find_contacts(self.tokens["infected"].token_uuid, 30)
+
+        self.assertEqual(result["visits"], 2)
+        self.assertEqual(self.contact_uuids(result), [self.tokens["near"].token_uuid])
+        self.assertEqual(
+            result["contacts"][0]["visits"],
+            [
+                {
+                    "gateway_id": self.entrance.gateway_id,
+                    "timestamp": self.visit + timedelta(minutes=12),
+                    "exposure_timestamp": self.visit + timedelta(minutes=20),
+                }
+            ],
+        )
+
+        # A wider window reaches the later visit
+        result = find_contacts(self.tokens["infected"].token_uuid, 40)
+        self.assertEqual(
+            self.contact_uuids(result),
+            [self.tokens["near"].token_uuid, self.tokens["late"].token_uuid],
+        )
+
+    def test_contacts_at_same_premises(self):
+        result = find_contacts(self.tokens["infected"].token_uuid, 30, scope="premises")
+
+        self.assertEqual(
+            self.contact_uuids(result),
+            [self.tokens["near"].token_uuid, self.tokens["exit"].token_uuid],
+        )
+
+    def test_contacts_outside_time_filter_are_ignored(self):
+        result = find_contacts(
+            self.tokens["infected"].token_uuid,
+            30,
+            start=self.visit + timedelta(hours=1),
+        )
+
+        self.assertEqual(result["visits"], 0)
+        self.assertEqual(result["contacts"], [])
+
+    def test_staff_can_trace_contacts(self):
+        url = reverse("contact_tracing")
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(
+            url,
+            {
+                "token": self.tokens["infected"].token_uuid,
+                "window": 5,
+                "scope": "premises",
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.contact_uuids(response.data), [self.tokens["exit"].token_uuid]
+        )
+        self.assertEqual(
+            self.client.get(url, {"token": "x", "window": "-1"}).data, "Invalid window"
+        )
+        self.assertEqual(self.client.get(url).data, "A token is required")
+
+        self.client.force_authenticate(user=self.entrance.site_owner.user)
+        response = self.client.get(url, {"token": self.tokens["infected"].token_uuid})
+        self.assertEqual(response.status_code, 403)
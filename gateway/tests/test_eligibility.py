@@ -0,0 +1,111 @@
+from unittest import mock
+from django.test import TestCase
+from datetime import timedelta
+from django.db import connection
+from django.utils import timezone
+from ..helpers.eligibility import EligibilityIndex, eligibility_index
+from ..models import Identity, MedicalRecord
+
+
+class EligibilityIndexTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vaccinated = Identity.objects.create(
+            nric="S9111111A",
+            fullname="Test Person",
+            address="Test Address",
+            phone_num="91234567",
+        )
+        MedicalRecord.objects.create(identity=cls.vaccinated, vaccination_status=True)
+        cls.unvaccinated = Identity.objects.create(
+            nric="S9222222A",
+            fullname="Test Person 2",
+            address="Test Address",
+            phone_num="92234567",
+        )
+        MedicalRecord.objects.create(
+            identity=cls.unvaccinated, vaccination_status=False
+        )
+
+    def setUp(self):
+        eligibility_index.build()
+
+    def test_eligibility_is_read_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(eligibility_index.is_eligible(self.vaccinated.id))
+            self.assertFalse(eligibility_index.is_eligible(self.unvaccinated.id))
+            self.assertFalse(eligibility_index.is_eligible(10**6))
+
+    def test_index_is_built_on_first_use(self):
+        index = EligibilityIndex(refresh_interval=300, chunk_size=100)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(index.is_eligible(self.vaccinated.id))
+
+    def test_saved_medical_record_updates_index(self):
+        medical_record = MedicalRecord.objects.get(identity=self.unvaccinated)
+        medical_record.vaccination_status = True
+        medical_record.save()
+        self.assertTrue(eligibility_index.is_eligible(self.unvaccinated.id))
+
+        medical_record.vaccination_status = False
+        medical_record.save()
+        self.assertFalse(eligibility_index.is_eligible(self.unvaccinated.id))
+
+    def test_deleted_medical_record_updates_index(self):
+        MedicalRecord.objects.get(identity=self.vaccinated).delete()
+
+        self.assertFalse(eligibility_index.is_eligible(self.vaccinated.id))
+
+    def test_changes_by_other_workers_are_synced(self):
+        MedicalRecord.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        index = EligibilityIndex(refresh_interval=300, chunk_size=100, sync_interval=0)
+        index.build()
+        # Saved by another service, which sets neither the signals nor
+        # updated_at
+        MedicalRecord.objects.filter(identity=self.unvaccinated).update(
+            vaccination_status=True
+        )
+
+        with self.assertNumQueries(1):
+            self.assertTrue(index.is_eligible(self.unvaccinated.id))
+
+    def test_records_inserted_without_updated_at_are_synced(self):
+        index = EligibilityIndex(refresh_interval=300, chunk_size=100, sync_interval=0)
+        index.build()
+        identity = Identity.objects.create(
+            nric="S9333333A", fullname="", address="", phone_num="93334567"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO medicalrecords (identity_id, vaccination_status) "
+                "VALUES (%s, %s)",
+                [identity.id, True],
+            )
+
+        self.assertIsNotNone(MedicalRecord.objects.get(identity=identity).updated_at)
+        self.assertTrue(index.is_eligible(identity.id))
+
+    def test_update_during_build_is_kept(self):
+        index = EligibilityIndex(refresh_interval=300, chunk_size=100)
+        read = list(
+            MedicalRecord.objects.filter(vaccination_status=True).values_list(
+                "identity_id", flat=True
+            )
+        )
+
+        def read_and_update(queryset, **kwargs):
+            # The records being read race with a save of another record
+            yield from read
+            index.update(self.unvaccinated.id, True)
+
+        with mock.patch("django.db.models.query.QuerySet.iterator", read_and_update):
+            index.build()
+
+        self.assertTrue(index.is_eligible(self.unvaccinated.id))
+
+    def test_stats_report_memory_footprint(self):
+        stats = eligibility_index.stats()
+
+        self.assertEqual(stats["vaccinated"], 1)
+        self.assertGreater(stats["memory_bytes"], 0)
@@ -0,0 +1,125 @@
+from io import StringIO
+from datetime import timedelta
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from ..helpers.email_outbox import queue_email, retry_delay, send_queued_emails
+from ..models import EmailOutbox, SiteOwner
+
+
+class CountingEmailBackend(EmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError("SMTP server unavailable")
+
+
+class CrashingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        if len(mail.outbox) == 1:
+            raise SystemExit("Worker stopped")
+        return super().send_messages(messages)
+
+
+class RegisterEmailTestCase(APITestCase):
+    def test_register_queues_verification_email(self):
+        response = self.client.post(
+            reverse("register"),
+            {
+                "email": "newowner@gmail.com",
+                "password": "Gateway-Pass-9021",
+                "password2": "Gateway-Pass-9021",
+                "postal_code": 610123,
+                "unit_no": "01-123",
+            },
+        )
+
+        self.assertEqual(response.data, "Account created for newowner@gmail.com")
+        # Nothing is sent from the request thread
+        self.assertEqual(len(mail.outbox), 0)
+        site_owner = SiteOwner.objects.get(user__email="newowner@gmail.com")
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.recipient, "newowner@gmail.com")
+        self.assertIn(site_owner.activation_key, email.body)
+
+        call_command("send_queued_emails", "--once", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["newowner@gmail.com"])
+        email.refresh_from_db()
+        self.assertIsNotNone(email.sent_at)
+
+
+class EmailOutboxTestCase(TestCase):
+    @override_settings(
+        EMAIL_BACKEND="gateway.tests.test_email_outbox.CountingEmailBackend"
+    )
+    def test_batch_is_sent_over_one_connection(self):
+        for i in range(5):
+            queue_email(f"owner{i}@gmail.com", "Subject", "Body")
+        CountingEmailBackend.opened = 0
+
+        self.assertEqual(send_queued_emails(batch_size=3), (3, 0))
+        self.assertEqual(send_queued_emails(batch_size=3), (2, 0))
+        self.assertEqual(send_queued_emails(batch_size=3), (0, 0))
+        self.assertEqual(CountingEmailBackend.opened, 2)
+        self.assertEqual(len(mail.outbox), 5)
+
+    @override_settings(
+        EMAIL_BACKEND="gateway.tests.test_email_outbox.FailingEmailBackend",
+        EMAIL_OUTBOX_RETRY_DELAY=30,
+        EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+    )
+    def test_failed_email_is_retried_with_backoff(self):
+        email = queue_email("owner@gmail.com", "Subject", "Body")
+
+        self.assertEqual(send_queued_emails(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("SMTP server unavailable", email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+        # Not retried before the backoff has passed
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+        # Given up on after the maximum number of attempts
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_emails(), (0, 1))
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_emails(), (0, 0))
+        self.assertIsNone(EmailOutbox.objects.get().sent_at)
+
+    def test_sender_stopped_mid_batch_only_sends_unsent_emails(self):
+        for i in range(3):
+            queue_email(f"owner{i}@gmail.com", "Subject", "Body")
+
+        with override_settings(
+            EMAIL_BACKEND="gateway.tests.test_email_outbox.CrashingEmailBackend"
+        ):
+            with self.assertRaises(SystemExit):
+                send_queued_emails()
+        self.assertEqual(EmailOutbox.objects.filter(sent_at__isnull=False).count(), 1)
+
+        # The unsent emails stay claimed until the lease has passed
+        self.assertEqual(send_queued_emails(), (0, 0))
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_emails(), (2, 0))
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [["owner0@gmail.com"], ["owner1@gmail.com"], ["owner2@gmail.com"]],
+        )
+
+    @override_settings(EMAIL_OUTBOX_RETRY_DELAY=30)
+    def test_retry_delay_doubles(self):
+        self.assertEqual(retry_delay(1), timedelta(seconds=30))
+        self.assertEqual(retry_delay(3), timedelta(seconds=120))
+        self.assertEqual(retry_delay(20), timedelta(hours=1))
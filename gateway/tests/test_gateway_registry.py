@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from ..helpers.gateway_registry import GatewayEntry, gateway_registry
+from ..models import SiteOwner, Gateway
+
+User = get_user_model()
+
+
+class GatewayRegistryTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email="testuser1@gmail.com", password="testpassword1"
+        )
+        cls.site_owner = SiteOwner.objects.create(
+            user=user,
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+            email_validated=True,
+        )
+        cls.gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-1", site_owner=cls.site_owner
+        )
+
+    def setUp(self):
+        gateway_registry.clear()
+
+    def test_registry_reads_through_cache(self):
+        with self.assertNumQueries(1):
+            entry = gateway_registry.get(self.gateway.gateway_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(gateway_registry.get(self.gateway.gateway_id), entry)
+
+        self.assertEqual(
+            entry,
+            GatewayEntry(
+                self.gateway.pk, self.gateway.gateway_id, self.site_owner.pk, None, None
+            ),
+        )
+
+    def test_registry_get_many_only_loads_missing_gateways(self):
+        gateway2 = Gateway.objects.create(
+            gateway_id="610123-01-123-2", site_owner=self.site_owner
+        )
+        gateway_registry.get(self.gateway.gateway_id)
+
+        with self.assertNumQueries(1):
+            entries = gateway_registry.get_many(
+                [self.gateway.gateway_id, gateway2.gateway_id, "610111-01-111-9"]
+            )
+
+        self.assertEqual(set(entries), {self.gateway.gateway_id, gateway2.gateway_id})
+
+    def test_saved_gateway_is_invalidated(self):
+        gateway_registry.get(self.gateway.gateway_id)
+        self.gateway.authentication_token = "a" * 64
+        self.gateway.save()
+
+        self.assertEqual(
+            gateway_registry.get(self.gateway.gateway_id).authentication_token,
+            "a" * 64,
+        )
+
+    def test_deleted_gateway_is_invalidated(self):
+        gateway_registry.get(self.gateway.gateway_id)
+        self.gateway.delete()
+
+        self.assertIsNone(gateway_registry.get(self.gateway.gateway_id))
+
+    def test_registry_finds_started_gateway_by_token(self):
+        self.gateway.authentication_token = "a" * 64
+        self.gateway.save()
+
+        self.assertEqual(gateway_registry.get_by_token("a" * 64).pk, self.gateway.pk)
+        self.assertIsNone(gateway_registry.get_by_token("b" * 64))
+
+    def test_registry_forgets_stopped_gateway_token(self):
+        self.gateway.authentication_token = "a" * 64
+        self.gateway.save()
+        gateway_registry.get_by_token("a" * 64)
+
+        self.gateway.authentication_token = None
+        self.gateway.save()
+
+        self.assertIsNone(gateway_registry.get_by_token("a" * 64))
+
+    def test_cache_keys_are_safe_for_memcached(self):
+        key = gateway_registry.cache.make_key(gateway_registry._key("1 2\n" * 100))
+
+        self.assertLessEqual(len(key), 250)
+        self.assertFalse(any(char.isspace() for char in key))
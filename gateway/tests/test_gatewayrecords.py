@@ -1,8 +1,25 @@
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
-from ..models import SiteOwner, Gateway, Identity, Token, MedicalRecord
+from ..helpers.allow_list import pin_verifier_writer
+from ..helpers.eligibility import eligibility_index
+from ..helpers.gateway_registry import gateway_registry
+from ..helpers.occupancy import occupancy_counters
+from ..helpers.pin_cache import pin_cache
+from ..helpers.pin_executor import PinVerificationBusy
+from ..models import (
+    SiteOwner,
+    Gateway,
+    Identity,
+    Token,
+    MedicalRecord,
+    GatewayRecord,
+)
 
 User = get_user_model()
 
@@ -137,6 +154,14 @@ class GatewayRecordTestCase(APITestCase):
             vaccination_status=False,
         )
 
+    def setUp(self):
+        pin_cache.clear()
+        gateway_registry.clear()
+        eligibility_index.build()
+        occupancy_counters.clear()
+        pin_verifier_writer.clear()
+        cache.clear()
+
     def test_token_retrieve_partial_identity(self):
         token_url = reverse("token", kwargs={"token_uuid": self.token.token_uuid})
         self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
@@ -231,3 +256,254 @@ class GatewayRecordTestCase(APITestCase):
         response = self.client.post(gatewayrecord_url, record_data)
 
         self.assertEqual(response.data, "Person is not vaccinated")
+
+    def test_gatewayrecord_batch_returns_result_per_scan(self):
+        gatewayrecord_batch_url = reverse("gateway_record_batch")
+        records_data = [
+            {
+                "token_uuid": self.token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+                "pin": "123456",
+            },
+            {
+                "token_uuid": self.token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+                "pin": "654321",
+            },
+            {
+                "token_uuid": self.inactive_token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+                "pin": "654321",
+            },
+            {
+                "token_uuid": self.token.token_uuid,
+                "gateway_id": self.gateway2.gateway_id,
+                "pin": "123456",
+            },
+            {
+                "token_uuid": self.unvax_token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+                "pin": "123456",
+            },
+            {
+                "token_uuid": self.token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+            },
+            {
+                "token_uuid": self.token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+                "pin": "123456",
+            },
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        response = self.client.post(
+            gatewayrecord_batch_url, records_data, format="json"
+        )
+
+        self.assertEqual(
+            response.data,
+            [
+                "Added gateway record",
+                "Invalid PIN entered",
+                "Invalid token or gateway",
+                "Invalid gateway",
+                "Person is not vaccinated",
+                "Invalid",
+                "Added gateway record",
+            ],
+        )
+        self.assertEqual(GatewayRecord.objects.filter(token=self.token).count(), 2)
+
+    def test_gatewayrecord_batch_empty_return_invalid(self):
+        gatewayrecord_batch_url = reverse("gateway_record_batch")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        response = self.client.post(gatewayrecord_batch_url, [], format="json")
+
+        self.assertEqual(response.data, "Invalid")
+
+    def test_gatewayrecord_pin_change_invalidates_cached_pin(self):
+        gatewayrecord_url = reverse("gateway_record")
+        record_data = {
+            "token_uuid": self.token.token_uuid,
+            "gateway_id": self.gateway.gateway_id,
+            "pin": "123456",
+        }
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        response = self.client.post(gatewayrecord_url, record_data)
+        self.assertEqual(response.data, "Added gateway record")
+
+        self.token.hashed_pin = make_password("111111")
+        self.token.save()
+        response = self.client.post(gatewayrecord_url, record_data)
+
+        self.assertEqual(response.data, "Invalid PIN entered")
+        self.assertNotIn(self.token.pk, pin_cache._entries)
+
+    def test_gatewayrecord_busy_pin_verification_return_503(self):
+        gatewayrecord_url = reverse("gateway_record")
+        record_data = {
+            "token_uuid": self.unvax_token.token_uuid,
+            "gateway_id": self.gateway.gateway_id,
+            "pin": "123456",
+        }
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        with mock.patch.object(pin_cache, "check", side_effect=PinVerificationBusy):
+            response = self.client.post(gatewayrecord_url, record_data)
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_gatewayrecord_batch_busy_pin_verification_return_503(self):
+        gatewayrecord_batch_url = reverse("gateway_record_batch")
+        records_data = [
+            {
+                "token_uuid": self.token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+                "pin": "123456",
+            }
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        with mock.patch.object(
+            pin_cache, "check_many", side_effect=PinVerificationBusy
+        ):
+            response = self.client.post(
+                gatewayrecord_batch_url, records_data, format="json"
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(GatewayRecord.objects.exists())
+
+    def test_gatewayrecord_check_in_queries(self):
+        gatewayrecord_url = reverse("gateway_record")
+        record_data = {
+            "token_uuid": self.token.token_uuid,
+            "gateway_id": self.gateway.gateway_id,
+            "pin": "123456",
+        }
+        self.client.force_authenticate(user=self.user)
+
+        # Token, gateway and insert
+        with self.assertNumQueries(3):
+            response = self.client.post(gatewayrecord_url, record_data)
+        self.assertEqual(response.data, "Added gateway record")
+
+        # Gateway is served from the gateway registry
+        record_data["timestamp"] = "2021-10-01T08:00:00Z"
+        with self.assertNumQueries(2):
+            response = self.client.post(gatewayrecord_url, record_data)
+        self.assertEqual(response.data, "Added gateway record")
+
+        # Repeat scan is answered from the duplicate scan filter
+        with self.assertNumQueries(0):
+            response = self.client.post(gatewayrecord_url, record_data)
+        self.assertEqual(response.data, "Added gateway record")
+
+    def test_gatewayrecord_batch_check_in_queries(self):
+        gatewayrecord_batch_url = reverse("gateway_record_batch")
+        records_data = [
+            {
+                "token_uuid": self.token.token_uuid,
+                "gateway_id": self.gateway.gateway_id,
+                "pin": "123456",
+                "timestamp": f"2021-10-01T08:{minute:02}:00Z",
+            }
+            for minute in range(50)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+        # Tokens, gateways and insert, whatever the number of scans
+        with self.assertNumQueries(3):
+            response = self.client.post(
+                gatewayrecord_batch_url, records_data, format="json"
+            )
+        self.assertEqual(response.data, ["Added gateway record"] * 50)
+
+    def test_gatewayrecord_keeps_past_timestamp(self):
+        gatewayrecord_url = reverse("gateway_record")
+        record_data = {
+            "token_uuid": self.token.token_uuid,
+            "gateway_id": self.gateway.gateway_id,
+            "pin": "123456",
+            "timestamp": "2021-10-01T08:00:00Z",
+        }
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        response = self.client.post(gatewayrecord_url, record_data)
+
+        self.assertEqual(response.data, "Added gateway record")
+        self.assertEqual(
+            GatewayRecord.objects.get(token=self.token).timestamp.isoformat(),
+            "2021-10-01T08:00:00+00:00",
+        )
+
+    def test_started_gateway_checks_in_without_user_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        gateway_url = reverse("gateways_detail", kwargs={"pk": self.gateway.id})
+        self.client.put(gateway_url)
+
+        gatewayrecord_url = reverse("gateway_record")
+        record_data = {
+            "token_uuid": self.token.token_uuid,
+            "gateway_id": self.gateway.gateway_id,
+            "pin": "123456",
+        }
+        response = self.client.post(gatewayrecord_url, record_data)
+        self.assertEqual(response.data, "Added gateway record")
+
+        # Token and insert
+        record_data["timestamp"] = "2021-10-01T08:00:00Z"
+        with self.assertNumQueries(2):
+            response = self.client.post(gatewayrecord_url, record_data)
+        self.assertEqual(response.data, "Added gateway record")
+
+    def test_started_gateway_cannot_check_in_at_other_gateway(self):
+        other_gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-2",
+            site_owner=self.site_owner,
+            authentication_token=None,
+        )
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        gateway_url = reverse("gateways_detail", kwargs={"pk": self.gateway.id})
+        self.client.put(gateway_url)
+
+        gatewayrecord_url = reverse("gateway_record")
+        record_data = {
+            "token_uuid": self.token.token_uuid,
+            "gateway_id": other_gateway.gateway_id,
+            "pin": "123456",
+        }
+        response = self.client.post(gatewayrecord_url, record_data)
+
+        self.assertEqual(response.data, "Invalid gateway")
+
+    def test_logout_stops_started_gateway(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        gateway_url = reverse("gateways_detail", kwargs={"pk": self.gateway.id})
+        self.client.put(gateway_url)
+        self.assertEqual(self.client.get(reverse("allow_list")).status_code, 200)
+
+        self.client.post(reverse("logout"))
+
+        gatewayrecord_url = reverse("gateway_record")
+        record_data = {
+            "token_uuid": self.token.token_uuid,
+            "gateway_id": self.gateway.gateway_id,
+            "pin": "123456",
+        }
+        response = self.client.post(gatewayrecord_url, record_data)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get(reverse("allow_list")).status_code, 401)
+        self.assertIsNone(Gateway.objects.get(pk=self.gateway.pk).authentication_token)
+
+    def test_expired_token_does_not_authenticate_gateway(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        gateway_url = reverse("gateways_detail", kwargs={"pk": self.gateway.id})
+        self.client.put(gateway_url)
+        self.assertIsNotNone(
+            Gateway.objects.get(pk=self.gateway.pk).authentication_expiry
+        )
+
+        Gateway.objects.filter(pk=self.gateway.pk).update(
+            authentication_expiry=timezone.now() - timedelta(seconds=1)
+        )
+        gateway_registry.clear()
+
+        self.assertEqual(self.client.get(reverse("allow_list")).status_code, 401)
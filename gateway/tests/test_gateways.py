@@ -1,3 +1,4 @@
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from django.contrib.auth import get_user_model
@@ -69,6 +70,47 @@ class GatewayTestCase(APITestCase):
 
         self.assertTrue(response.data, "Maximum number of gateways")
 
+    def test_siteowner_add_multiple_gateways(self):
+        gateway_url = reverse("gateways")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        response = self.client.post(gateway_url, {"count": 3})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [gateway["gateway_id"] for gateway in response.data],
+            [
+                f"{self.site_owner.postal_code}-{self.site_owner.unit_no}-{idx}"
+                for idx in range(1, 4)
+            ],
+        )
+
+        # Adding more than the remaining gateways adds none of them
+        response = self.client.post(gateway_url, {"count": 2})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(Gateway.objects.filter(site_owner=self.site_owner).count(), 3)
+
+    @override_settings(MAX_GATEWAYS_PER_SITE_OWNER=12)
+    def test_siteowner_remove_gateway_with_highest_index(self):
+        gateway_url = reverse("gateways")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        self.client.post(gateway_url, {"count": 11})
+        # SQLite does not enforce the column length
+        for gateway in Gateway.objects.filter(site_owner=self.site_owner):
+            gateway.clean_fields(exclude=["authentication_token"])
+
+        response = self.client.delete(gateway_url)
+        self.assertEqual(
+            response.data["gateway_id"],
+            f"{self.site_owner.postal_code}-{self.site_owner.unit_no}-11",
+        )
+
+        # The freed index is reused by the next gateway
+        response = self.client.post(gateway_url)
+        self.assertEqual(
+            response.data["gateway_id"],
+            f"{self.site_owner.postal_code}-{self.site_owner.unit_no}-11",
+        )
+
     def test_siteowner_can_remove_gateway_without_records(self):
         gateway_url = reverse("gateways")
         total_gateways_before = Gateway.objects.filter(
@@ -153,3 +195,61 @@ class GatewayTestCase(APITestCase):
         response = self.client.put(gateway_url)
 
         self.assertEqual(response.data["authentication_token"], None)
+
+    def test_siteowner_toggle_gateway_queries(self):
+        gateway = Gateway.objects.create(
+            gateway_id=f"{self.site_owner.postal_code}-{self.site_owner.unit_no}-1",
+            site_owner=self.site_owner,
+        )
+        for idx in range(2, 5):
+            Gateway.objects.create(
+                gateway_id=f"{self.site_owner.postal_code}-{self.site_owner.unit_no}-{idx}",
+                site_owner=self.site_owner,
+            )
+        gateway_url = reverse("gateways_detail", kwargs={"pk": gateway.id})
+        self.client.force_authenticate(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+
+        # Gateway and update
+        with self.assertNumQueries(2):
+            response = self.client.put(gateway_url)
+        self.assertIsNotNone(response.data["authentication_token"])
+
+    def test_siteowner_cannot_reuse_token_for_two_gateways(self):
+        gateway_url = reverse("gateways")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        gateway = Gateway.objects.get(
+            gateway_id=self.client.post(gateway_url).data["gateway_id"]
+        )
+        gateway2 = Gateway.objects.get(
+            gateway_id=self.client.post(gateway_url).data["gateway_id"]
+        )
+
+        self.client.put(reverse("gateways_detail", kwargs={"pk": gateway.id}))
+        response = self.client.put(
+            reverse("gateways_detail", kwargs={"pk": gateway2.id})
+        )
+
+        self.assertEqual(response.data, "Token already used")
+
+    def test_siteowner_cannot_toggle_other_siteowner_gateway(self):
+        user2 = User.objects.create_user(
+            email="testuser2@gmail.com", password="testpassword2"
+        )
+        site_owner2 = SiteOwner.objects.create(
+            user=user2,
+            postal_code="610321",
+            unit_no="10-321",
+            activation_key=4321,
+            email_validated=True,
+        )
+        gateway = Gateway.objects.create(
+            gateway_id="610321-10-321-1", site_owner=site_owner2
+        )
+
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        response = self.client.put(
+            reverse("gateways_detail", kwargs={"pk": gateway.id})
+        )
+
+        self.assertEqual(response.status_code, 403)
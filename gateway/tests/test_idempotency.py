@@ -0,0 +1,192 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from ..helpers.eligibility import eligibility_index
+from ..helpers.gateway_registry import gateway_registry
+from ..helpers.pin_cache import pin_cache
+from ..helpers.record_queue import insert_gateway_records
+from ..helpers.scan_dedup import duplicate_scan_filter
+from ..models import Gateway, GatewayRecord, Identity, MedicalRecord, SiteOwner, Token
+
+User = get_user_model()
+
+
+@mock.patch.object(duplicate_scan_filter, "window", 0)
+class IdempotentCheckInTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other_user = [
+            User.objects.create_user(email=email, password="testpassword1")
+            for email in ("testuser1@gmail.com", "testuser2@gmail.com")
+        ]
+        site_owner = SiteOwner.objects.create(
+            user=cls.user,
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+            email_validated=True,
+        )
+        cls.gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-1", site_owner=site_owner
+        )
+        identity = Identity.objects.create(
+            nric="S9111111A", fullname="", address="", phone_num="91234567"
+        )
+        cls.token = Token.objects.create(
+            token_uuid="c5:d7:14:84:f8:cf",
+            hashed_pin=make_password("123456"),
+            owner=identity,
+        )
+        MedicalRecord.objects.create(
+            identity=identity, token=cls.token, vaccination_status=True
+        )
+
+    def setUp(self):
+        pin_cache.clear()
+        gateway_registry.clear()
+        eligibility_index.build()
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def scan(self, sequence, **fields):
+        return {
+            "token_uuid": self.token.token_uuid,
+            "gateway_id": self.gateway.gateway_id,
+            "pin": "123456",
+            "sequence": sequence,
+            "timestamp": "2021-10-01T08:00:00Z",
+            **fields,
+        }
+
+    def check_in(self, sequence, **fields):
+        return self.client.post(
+            reverse("gateway_record"), self.scan(sequence, **fields)
+        ).data
+
+    def test_retry_is_answered_without_verifying_pin(self):
+        self.assertEqual(self.check_in(7), "Added gateway record")
+        self.assertEqual(self.check_in(8, pin="111111"), "Invalid PIN entered")
+
+        with mock.patch.object(pin_cache, "verify") as verify:
+            with self.assertNumQueries(0):
+                self.assertEqual(self.check_in(7), "Added gateway record")
+                self.assertEqual(self.check_in(8, pin="111111"), "Invalid PIN entered")
+        verify.assert_not_called()
+
+        self.assertEqual(GatewayRecord.objects.get().sequence, 7)
+
+    def test_sequence_of_other_scan_is_rejected(self):
+        self.check_in(7)
+
+        self.assertEqual(self.check_in(7, pin="111111"), "Sequence already used")
+        self.assertEqual(GatewayRecord.objects.count(), 1)
+
+    def test_retry_after_result_expired_is_not_recorded_twice(self):
+        self.check_in(7)
+        cache.clear()
+
+        self.assertEqual(self.check_in(7), "Added gateway record")
+        self.assertEqual(GatewayRecord.objects.count(), 1)
+
+    def test_sequence_of_other_token_is_rejected_after_result_expired(self):
+        other_token = Token.objects.create(
+            token_uuid="c5:d7:14:84:f8:ce",
+            hashed_pin=make_password("123456"),
+            owner=self.token.owner,
+        )
+        self.check_in(7)
+        cache.clear()
+
+        self.assertEqual(
+            self.check_in(7, token_uuid=other_token.token_uuid),
+            "Sequence already used",
+        )
+        response = self.client.post(
+            reverse("gateway_record_batch"),
+            [self.scan(7), self.scan(7, token_uuid=other_token.token_uuid)],
+            format="json",
+        )
+        self.assertEqual(
+            response.data, ["Added gateway record", "Sequence already used"]
+        )
+        self.assertEqual(GatewayRecord.objects.get().token, self.token)
+
+    def test_sequence_requires_timestamp(self):
+        scan = self.scan(7)
+        del scan["timestamp"]
+
+        response = self.client.post(reverse("gateway_record"), scan)
+
+        self.assertEqual(response.data, "Invalid")
+        self.assertFalse(GatewayRecord.objects.exists())
+
+    def test_sequence_keeps_timestamp_ahead_within_clock_skew(self):
+        timestamp = timezone.now() + timedelta(seconds=30)
+
+        # Retried after the clock of the server caught up with the gateway's
+        for _ in range(2):
+            self.assertEqual(
+                self.check_in(7, timestamp=timestamp.isoformat()),
+                "Added gateway record",
+            )
+            cache.clear()
+
+        self.assertEqual(GatewayRecord.objects.get().timestamp, timestamp)
+
+    def test_sequence_rejects_timestamp_beyond_clock_skew(self):
+        timestamp = timezone.now() + timedelta(minutes=5)
+
+        self.assertEqual(self.check_in(7, timestamp=timestamp.isoformat()), "Invalid")
+        self.assertFalse(GatewayRecord.objects.exists())
+
+    def test_other_user_cannot_take_sequence(self):
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.check_in(7), "Invalid gateway")
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.check_in(7), "Added gateway record")
+
+    def test_batch_retries_and_repeats(self):
+        self.check_in(1)
+        scans = [
+            self.scan(1),
+            self.scan(2),
+            self.scan(2),
+            self.scan(2, pin="111111"),
+            self.scan(None),
+        ]
+        scans[-1].pop("sequence")
+
+        response = self.client.post(
+            reverse("gateway_record_batch"), scans, format="json"
+        )
+
+        self.assertEqual(
+            response.data,
+            ["Added gateway record"] * 3
+            + ["Sequence already used", "Added gateway record"],
+        )
+        self.assertEqual(
+            sorted(
+                GatewayRecord.objects.values_list("sequence", flat=True),
+                key=str,
+            ),
+            [1, 2, None],
+        )
+
+    def test_insert_skips_recorded_sequences(self):
+        self.check_in(1)
+        gateway_records = [
+            GatewayRecord(token=self.token, gateway=self.gateway, sequence=sequence)
+            for sequence in (1, 2)
+        ]
+
+        inserted = insert_gateway_records(gateway_records)
+
+        self.assertEqual([record.sequence for record in inserted], [2])
+        self.assertEqual(GatewayRecord.objects.count(), 2)
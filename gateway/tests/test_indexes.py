@@ -0,0 +1,19 @@
+from django.test import TestCase
+from django.utils import timezone
+from ..models import GatewayRecord, Token
+
+
+class CheckInIndexTestCase(TestCase):
+    def test_token_lookup_uses_token_uuid_status_index(self):
+        plan = Token.objects.filter(
+            token_uuid="c5:d7:14:84:f8:cf", status=True
+        ).explain()
+
+        self.assertIn("token_uuid_status_idx", plan)
+
+    def test_gateway_record_window_uses_gateway_timestamp_index(self):
+        plan = GatewayRecord.objects.filter(
+            gateway_id=1, timestamp__gte=timezone.now()
+        ).explain()
+
+        self.assertIn("gatewayrecord_gateway_ts_idx", plan)
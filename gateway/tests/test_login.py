@@ -1,4 +1,7 @@
+from datetime import timedelta
+from unittest import mock
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from ..models import SiteOwner
@@ -72,3 +75,66 @@ class SiteOwnerLoginTestCase(APITestCase):
         gateway_url = reverse("gateways")
         response = self.client.get(gateway_url)
         self.assertNotEqual(response.status_code, 200)
+
+    def test_cached_auth_token_skips_token_lookup(self):
+        login_url = reverse("login")
+        login_data = {
+            "username": self.siteowner_email,
+            "password": self.siteowner_password,
+        }
+        response = self.client.post(login_url, login_data)
+        self.siteowner_auth_token = response.data["token"]
+
+        gateway_url = reverse("gateways")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+
+        # Token with user and site owner, user's other tokens and gateways
+        with self.assertNumQueries(3):
+            self.client.get(gateway_url)
+
+        # User with site owner and gateways
+        with self.assertNumQueries(2):
+            response = self.client.get(gateway_url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout_invalidates_cached_auth_token(self):
+        login_url = reverse("login")
+        login_data = {
+            "username": self.siteowner_email,
+            "password": self.siteowner_password,
+        }
+        response = self.client.post(login_url, login_data)
+        self.siteowner_auth_token = response.data["token"]
+
+        # Cache auth token
+        gateway_url = reverse("gateways")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        response = self.client.get(gateway_url)
+        self.assertEqual(response.status_code, 200)
+
+        logout_url = reverse("logout")
+        response = self.client.post(logout_url)
+        self.assertEqual(response.status_code, 204)
+
+        response = self.client.get(gateway_url)
+        self.assertEqual(response.status_code, 401)
+
+    def test_expired_auth_token_is_not_served_from_cache(self):
+        login_url = reverse("login")
+        login_data = {
+            "username": self.siteowner_email,
+            "password": self.siteowner_password,
+        }
+        response = self.client.post(login_url, login_data)
+        self.siteowner_auth_token = response.data["token"]
+
+        gateway_url = reverse("gateways")
+        self.client.credentials(HTTP_AUTHORIZATION="Token " + self.siteowner_auth_token)
+        self.client.get(gateway_url)
+
+        with mock.patch(
+            "django.utils.timezone.now",
+            return_value=timezone.now() + timedelta(hours=25),
+        ):
+            response = self.client.get(gateway_url)
+        self.assertEqual(response.status_code, 401)
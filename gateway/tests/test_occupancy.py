@@ -0,0 +1,142 @@
+import time
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from ..helpers.eligibility import eligibility_index
+from ..helpers.occupancy import OccupancyCounters, occupancy_counters, occupancy_stats
+from ..helpers.pin_cache import pin_cache
+from ..helpers.scan_dedup import duplicate_scan_filter
+from ..models import (
+    Gateway,
+    GatewayCounter,
+    GatewayRecord,
+    Identity,
+    MedicalRecord,
+    SiteOwner,
+    Token,
+)
+
+User = get_user_model()
+
+
+class OccupancyTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="testuser1@gmail.com", password="testpassword1"
+        )
+        cls.site_owner = SiteOwner.objects.create(
+            user=cls.user,
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+            email_validated=True,
+        )
+        cls.entrance, cls.exit = [
+            Gateway.objects.create(
+                gateway_id=f"610123-01-123-{i}", site_owner=cls.site_owner
+            )
+            for i in (1, 2)
+        ]
+        identity = Identity.objects.create(
+            nric="S9111111A", fullname="", address="", phone_num="91234567"
+        )
+        cls.token = Token.objects.create(
+            token_uuid="c5:d7:14:84:f8:cf",
+            hashed_pin=make_password("123456"),
+            owner=identity,
+        )
+        MedicalRecord.objects.create(
+            identity=identity, token=cls.token, vaccination_status=True
+        )
+
+    def setUp(self):
+        pin_cache.clear()
+        eligibility_index.build()
+        occupancy_counters.clear()
+
+    def record(self, gateway, timestamp):
+        return GatewayRecord(token=self.token, gateway=gateway, timestamp=timestamp)
+
+    # Counters of 2021 would otherwise be pruned by the first flush
+    @mock.patch("gateway.helpers.occupancy.PRUNE_INTERVAL", float("inf"))
+    def test_counts_are_written_in_batches(self):
+        counters = OccupancyCounters(flush_interval=3600)
+        now = datetime(2021, 10, 1, 12, 30, 15, tzinfo=timezone.utc)
+
+        counters.add([self.record(self.entrance, now)] * 3)
+        counters.add([self.record(self.exit, now)])
+        self.assertFalse(GatewayCounter.objects.exists())
+
+        counters.flush()
+        counters.add([self.record(self.entrance, now + timedelta(minutes=1))])
+        counters.flush()
+
+        self.assertEqual(
+            GatewayCounter.objects.get(
+                gateway=self.entrance,
+                resolution="minute",
+                bucket=datetime(2021, 10, 1, 12, 30, tzinfo=timezone.utc),
+            ).count,
+            3,
+        )
+        self.assertEqual(
+            GatewayCounter.objects.get(
+                gateway=self.entrance,
+                resolution="hour",
+                bucket=datetime(2021, 10, 1, 12, tzinfo=timezone.utc),
+            ).count,
+            4,
+        )
+        self.assertEqual(counters.stats(), {"pending": 0, "flushed": 5})
+
+        stats = occupancy_stats(
+            [self.entrance, self.exit], now=now + timedelta(minutes=1)
+        )
+        self.assertEqual(
+            stats["total"],
+            {"current_minute": 1, "last_hour": 5, "current_hour": 5, "today": 5},
+        )
+        self.assertEqual(stats["gateways"][1]["last_hour"], 1)
+
+    def test_quiet_worker_flushes_in_background(self):
+        counters = OccupancyCounters(flush_interval=0.01)
+        with mock.patch.object(counters, "flush") as flush:
+            counters.start()
+            counters.add([self.record(self.entrance, datetime.now(timezone.utc))])
+            for _ in range(100):
+                if flush.called:
+                    break
+                time.sleep(0.01)
+            counters._stop.set()
+
+        flush.assert_called_with()
+
+    @mock.patch.object(duplicate_scan_filter, "window", 0)
+    def test_check_in_updates_gateway_stats(self):
+        self.client.force_authenticate(user=self.user)
+        for gateway in (self.entrance, self.entrance, self.exit):
+            response = self.client.post(
+                reverse("gateway_record"),
+                {
+                    "token_uuid": self.token.token_uuid,
+                    "gateway_id": gateway.gateway_id,
+                    "pin": "123456",
+                },
+            )
+            self.assertEqual(response.data, "Added gateway record")
+
+        response = self.client.get(reverse("gateways_stats"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"]["last_hour"], 3)
+        self.assertEqual(
+            [
+                (gateway["gateway_id"], gateway["current_hour"])
+                for gateway in response.data["gateways"]
+            ],
+            [(self.entrance.gateway_id, 2), (self.exit.gateway_id, 1)],
+        )
@@ -0,0 +1,86 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from ..models import EmailOutbox, Gateway, SiteOwner
+
+User = get_user_model()
+
+
+class OnboardSiteOwnersTestCase(TestCase):
+    def write_file(self, suffix, content):
+        file = tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False)
+        self.addCleanup(os.remove, file.name)
+        with file:
+            file.write(content)
+        return file.name
+
+    def onboard(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command("onboard_site_owners", path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_onboard_site_owners_from_csv(self):
+        path = self.write_file(
+            ".csv",
+            "email,password,postal_code,unit_no,gateways\n"
+            "owner1@gmail.com,Gateway-Pass-9021,610123,01-101,2\n"
+            "owner2@gmail.com,Gateway-Pass-9021,610123,01-102,\n"
+            "owner1@gmail.com,Gateway-Pass-9021,610123,01-103,1\n"
+            "owner3@gmail.com,Gateway-Pass-9021,61012,01-104,1\n"
+            "owner4@gmail.com,Gateway-Pass-9021,610123,01-105,0\n",
+        )
+
+        stdout, stderr = self.onboard(path, "--workers", "0", "--batch-size", "2")
+
+        self.assertIn("Onboarded 3 site owners", stdout)
+        self.assertIn("Line 4: Email already in use.", stderr)
+        self.assertIn("Line 5: Invalid postal code", stderr)
+        self.assertEqual(SiteOwner.objects.count(), 3)
+        self.assertEqual(
+            list(
+                Gateway.objects.order_by("gateway_id").values_list(
+                    "gateway_id", flat=True
+                )
+            ),
+            ["610123-01-101-1", "610123-01-101-2", "610123-01-102-1"],
+        )
+        site_owner = SiteOwner.objects.get(user__email="owner1@gmail.com")
+        self.assertTrue(site_owner.user.check_password("Gateway-Pass-9021"))
+        self.assertFalse(site_owner.email_validated)
+        email = EmailOutbox.objects.get(recipient="owner1@gmail.com")
+        self.assertIn(site_owner.activation_key, email.body)
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+
+        # Running the import again skips the site owners already created
+        stdout, stderr = self.onboard(path, "--workers", "0")
+        self.assertIn("Onboarded 0 site owners", stdout)
+        self.assertEqual(SiteOwner.objects.count(), 3)
+
+    def test_onboard_site_owners_from_jsonl_with_process_pool(self):
+        path = self.write_file(
+            ".jsonl",
+            "\n".join(
+                json.dumps(
+                    {
+                        "email": f"owner{i}@gmail.com",
+                        "password": "Gateway-Pass-9021",
+                        "postal_code": "610123",
+                        "unit_no": f"01-{i:03d}",
+                    }
+                )
+                for i in range(4)
+            )
+            + "\nnot json\n",
+        )
+
+        stdout, stderr = self.onboard(path, "--workers", "2")
+
+        self.assertIn("Onboarded 4 site owners", stdout)
+        self.assertIn("Line 5: Invalid row", stderr)
+        self.assertEqual(Gateway.objects.count(), 4)
+        user = User.objects.get(email="owner3@gmail.com")
+        self.assertTrue(user.check_password("Gateway-Pass-9021"))
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone as django_timezone
+from ..helpers.partitions import (
+    MariaDBPartitionScheme,
+    expired_partitions,
+    partition_for,
+    partitions_between,
+)
+from ..models import Gateway, GatewayRecord, Identity, SiteOwner, Token
+
+User = get_user_model()
+
+
+class FakeCursor:
+    def __init__(self, executed, rows):
+        self.executed = executed
+        self.rows = rows
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        self.description = [("PARTITION_NAME",)] if sql.startswith("SELECT") else None
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, rows=()):
+        self.executed = []
+        self.rows = list(rows)
+
+    def cursor(self):
+        return FakeCursor(self.executed, self.rows)
+
+
+class PartitionHelperTestCase(SimpleTestCase):
+    def test_partitions_between_months(self):
+        partitions = partitions_between(
+            datetime(2021, 12, 31, 23, tzinfo=timezone.utc),
+            datetime(2022, 2, 1, tzinfo=timezone.utc),
+            "month",
+        )
+
+        self.assertEqual(
+            [partition.name for partition in partitions],
+            ["p202112", "p202201", "p202202"],
+        )
+        self.assertEqual(partitions[0].end, datetime(2022, 1, 1, tzinfo=timezone.utc))
+
+    def test_expired_partitions(self):
+        partitions = partitions_between(
+            datetime(2021, 10, 1, tzinfo=timezone.utc),
+            datetime(2021, 10, 5, tzinfo=timezone.utc),
+            "day",
+        )
+        now = datetime(2021, 10, 5, 12, tzinfo=timezone.utc)
+
+        expired = expired_partitions(partitions, now, retention_days=3)
+
+        # 2021-10-02 still holds records younger than three days
+        self.assertEqual([partition.name for partition in expired], ["p20211001"])
+
+    def test_mariadb_scheme_sql(self):
+        connection = FakeConnection([("p20211001",), ("p20211002",), ("pmax",)])
+        scheme = MariaDBPartitionScheme("day", connection)
+
+        partitions = scheme.partitions()
+        scheme.create([partition_for(partitions[-1].end, "day")])
+        scheme.drop(partitions[:1])
+
+        self.assertEqual(
+            [partition.name for partition in partitions], ["p20211001", "p20211002"]
+        )
+        self.assertEqual(
+            connection.executed[1:],
+            [
+                "ALTER TABLE gatewayrecord REORGANIZE PARTITION pmax INTO "
+                "(PARTITION p20211003 VALUES LESS THAN ('2021-10-04 00:00:00'), "
+                "PARTITION pmax VALUES LESS THAN (MAXVALUE))",
+                "ALTER TABLE gatewayrecord DROP PARTITION p20211001",
+            ],
+        )
+
+
+class PartitionCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        site_owner = SiteOwner.objects.create(
+            user=User.objects.create_user(
+                email="testuser1@gmail.com", password="testpassword1"
+            ),
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+        )
+        gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-1", site_owner=site_owner
+        )
+        identity = Identity.objects.create(
+            nric="S1234567A", fullname="", address="", phone_num="91234567"
+        )
+        token = Token.objects.create(
+            token_uuid="aa:bb:cc:dd:ee:ff", owner=identity, hashed_pin=""
+        )
+        now = django_timezone.now()
+        GatewayRecord.objects.bulk_create(
+            GatewayRecord(
+                token=token, gateway=gateway, timestamp=now - timedelta(days=days)
+            )
+            for days in (40, 40, 35, 1, 0)
+        )
+
+    def partition(self, *args):
+        stdout = StringIO()
+        call_command("partition_gateway_records", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_dry_run_keeps_records(self):
+        output = self.partition("--retention-days", "30", "--dry-run")
+
+        self.assertIn("Would drop partitions", output)
+        self.assertEqual(GatewayRecord.objects.count(), 5)
+
+    def test_expired_partitions_are_dropped(self):
+        output = self.partition("--retention-days", "30")
+
+        self.assertIn("Dropped partitions", output)
+        self.assertEqual(GatewayRecord.objects.count(), 2)
+        cutoff = django_timezone.now() - timedelta(days=30)
+        self.assertFalse(GatewayRecord.objects.filter(timestamp__lt=cutoff).exists())
+
+    def test_monthly_partitions_keep_recent_month(self):
+        self.partition("--period", "month", "--retention-days", "0")
+
+        # Only the current month, which has not ended yet, is kept
+        self.assertTrue(
+            GatewayRecord.objects.filter(
+                timestamp__gte=django_timezone.now().replace(
+                    day=1, hour=0, minute=0, second=0, microsecond=0
+                )
+            ).exists()
+        )
+        self.assertLess(GatewayRecord.objects.count(), 5)
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth.hashers import check_password, make_password
+from django.test import SimpleTestCase
+from ..helpers.pin_cache import PinCache
+
+
+class PinCacheTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.token = SimpleNamespace(pk=1, hashed_pin=make_password("123456"))
+
+    def setUp(self):
+        self.check = mock.Mock(side_effect=check_password)
+        self.pin_cache = PinCache(ttl=60, max_entries=2)
+
+    def test_repeat_verification_skips_hasher(self):
+        self.assertTrue(self.pin_cache.verify(self.token, "123456", self.check))
+        self.assertTrue(self.pin_cache.verify(self.token, "123456", self.check))
+
+        self.assertEqual(self.check.call_count, 1)
+        self.assertEqual(self.pin_cache.stats()["hits"], 1)
+        self.assertEqual(self.pin_cache.stats()["misses"], 1)
+
+    def test_wrong_pin_is_never_cached(self):
+        self.assertTrue(self.pin_cache.verify(self.token, "123456", self.check))
+        self.assertFalse(self.pin_cache.verify(self.token, "654321", self.check))
+        self.assertFalse(self.pin_cache.verify(self.token, "654321", self.check))
+
+        self.assertEqual(self.check.call_count, 3)
+
+    def test_changed_hashed_pin_misses(self):
+        self.pin_cache.verify(self.token, "123456", self.check)
+        new_token = SimpleNamespace(pk=1, hashed_pin=make_password("111111"))
+
+        self.assertFalse(self.pin_cache.verify(new_token, "123456", self.check))
+        self.assertEqual(self.check.call_count, 2)
+
+    def test_expired_entry_misses(self):
+        self.pin_cache.ttl = 0
+        self.pin_cache.verify(self.token, "123456", self.check)
+        self.pin_cache.verify(self.token, "123456", self.check)
+
+        self.assertEqual(self.check.call_count, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for pk in range(1, 4):
+            token = SimpleNamespace(pk=pk, hashed_pin=self.token.hashed_pin)
+            self.pin_cache.verify(token, "123456", self.check)
+        self.pin_cache.verify(self.token, "123456", self.check)
+
+        self.assertEqual(self.pin_cache.stats()["size"], 2)
+        self.assertEqual(self.check.call_count, 4)
+
+    def test_batch_verifies_misses_together(self):
+        other_token = SimpleNamespace(pk=2, hashed_pin=make_password("654321"))
+        check_many = mock.Mock(
+            side_effect=lambda pairs: [check_password(*pair) for pair in pairs]
+        )
+        pin_cache = PinCache(ttl=60, max_entries=2, check_many=check_many)
+        pin_cache.verify(self.token, "123456", self.check)
+
+        self.assertEqual(
+            pin_cache.verify_many(
+                [
+                    (self.token, "123456"),
+                    (other_token, "654321"),
+                    (other_token, "111111"),
+                    (other_token, "654321"),
+                ]
+            ),
+            [True, True, False, True],
+        )
+        # Once per distinct PIN of a token not verified recently
+        check_many.assert_called_once_with(
+            [("654321", other_token.hashed_pin), ("111111", other_token.hashed_pin)]
+        )
+        self.assertTrue(pin_cache.verify(other_token, "654321", self.check))
+        self.assertEqual(self.check.call_count, 1)
@@ -0,0 +1,93 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+from django.contrib.auth.hashers import make_password
+from django.test import SimpleTestCase
+from ..helpers.pin_executor import PinExecutor, PinVerificationBusy
+
+
+class PinExecutorTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.hashed_pin = make_password("123456")
+
+    def test_inline_executor_verifies_pin(self):
+        pin_executor = PinExecutor(workers=0, queue_size=0, timeout=5)
+
+        self.assertTrue(pin_executor.check_password("123456", self.hashed_pin))
+        self.assertFalse(pin_executor.check_password("654321", self.hashed_pin))
+
+    def test_pool_executor_verifies_pin(self):
+        pin_executor = PinExecutor(workers=1, queue_size=0, timeout=30)
+        self.addCleanup(pin_executor.shutdown)
+
+        self.assertTrue(pin_executor.check_password("123456", self.hashed_pin))
+        self.assertFalse(pin_executor.check_password("654321", self.hashed_pin))
+
+    def test_full_queue_sheds_load(self):
+        pin_executor = PinExecutor(workers=1, queue_size=0, timeout=30)
+        self.addCleanup(pin_executor.shutdown)
+        pin_executor._slots.acquire()
+
+        with self.assertRaises(PinVerificationBusy):
+            pin_executor.check_password("123456", self.hashed_pin)
+
+    def test_batch_is_verified_in_parallel(self):
+        pin_executor = PinExecutor(workers=2, queue_size=1, timeout=30)
+        self.addCleanup(pin_executor.shutdown)
+
+        self.assertEqual(
+            pin_executor.check_many(
+                [
+                    ("123456", self.hashed_pin),
+                    ("654321", self.hashed_pin),
+                    ("123456", self.hashed_pin),
+                ]
+            ),
+            [True, False, True],
+        )
+
+    def test_batch_without_enough_free_slots_is_rejected(self):
+        pin_executor = PinExecutor(workers=1, queue_size=1, timeout=30)
+        pool = mock.Mock()
+        pin_executor._slots.acquire()
+
+        with mock.patch.object(pin_executor, "_get_pool", return_value=pool):
+            with self.assertRaises(PinVerificationBusy):
+                pin_executor.check_many([("123456", self.hashed_pin)] * 2)
+
+        pool.submit.assert_not_called()
+        # The slot taken for the batch is freed again
+        self.assertTrue(pin_executor._slots.acquire(blocking=False))
+
+    def test_timed_out_verification_keeps_its_slot_until_done(self):
+        pin_executor = PinExecutor(workers=1, queue_size=0, timeout=0.01)
+        futures = [Future(), Future()]
+        futures[1].set_running_or_notify_cancel()
+        pool = mock.Mock(submit=mock.Mock(side_effect=futures))
+
+        with mock.patch.object(pin_executor, "_get_pool", return_value=pool):
+            # Queued verification is cancelled and frees its slot
+            with self.assertRaises(PinVerificationBusy):
+                pin_executor.check_password("123456", self.hashed_pin)
+            self.assertTrue(futures[0].cancelled())
+
+            # Running verification holds its slot until it is done
+            with self.assertRaises(PinVerificationBusy):
+                pin_executor.check_password("123456", self.hashed_pin)
+            self.assertFalse(pin_executor._slots.acquire(blocking=False))
+            futures[1].set_result(True)
+        self.assertTrue(pin_executor._slots.acquire(blocking=False))
+
+    def test_broken_pool_is_replaced(self):
+        pin_executor = PinExecutor(workers=1, queue_size=0, timeout=30)
+        self.addCleanup(pin_executor.shutdown)
+        broken_pool = mock.Mock(submit=mock.Mock(side_effect=BrokenProcessPool))
+        pin_executor._pool = broken_pool
+
+        with self.assertRaises(PinVerificationBusy):
+            pin_executor.check_password("123456", self.hashed_pin)
+
+        broken_pool.shutdown.assert_called_once_with(wait=False)
+        self.assertTrue(pin_executor.check_password("123456", self.hashed_pin))
@@ -0,0 +1,137 @@
+import csv
+import json
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from ..helpers.record_export import export_queryset, iter_records
+from ..models import Gateway, GatewayRecord, Identity, SiteOwner, Token
+
+User = get_user_model()
+
+
+class GatewayRecordExportTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email="tracer@gmail.com", password="testpassword1"
+        )
+        cls.staff.is_staff = True
+        cls.staff.save()
+        site_owner = SiteOwner.objects.create(
+            user=User.objects.create_user(
+                email="testuser1@gmail.com", password="testpassword1"
+            ),
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+            email_validated=True,
+        )
+        cls.gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-1", site_owner=site_owner
+        )
+        cls.other_gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-2", site_owner=site_owner
+        )
+        identity = Identity.objects.create(
+            nric="S1234567A", fullname="", address="", phone_num="91234567"
+        )
+        cls.token = Token.objects.create(
+            token_uuid="aa:bb:cc:dd:ee:ff", owner=identity, hashed_pin=""
+        )
+        cls.start = datetime(2021, 10, 1, 12, tzinfo=timezone.utc)
+        # Five records share a timestamp to exercise the keyset tie-breaker
+        GatewayRecord.objects.bulk_create(
+            [
+                GatewayRecord(
+                    token=cls.token,
+                    gateway=cls.gateway,
+                    timestamp=cls.start + timedelta(minutes=minute),
+                )
+                for minute in (0, 5, 5, 5, 5, 5, 10, 90)
+            ]
+            + [
+                GatewayRecord(
+                    token=cls.token, gateway=cls.other_gateway, timestamp=cls.start
+                )
+            ]
+        )
+
+    def test_iter_records_pages_by_timestamp_and_id(self):
+        records = export_queryset(gateway_id=self.gateway.gateway_id)
+        expected = list(records.order_by("timestamp", "id"))
+
+        with self.assertNumQueries(3):
+            exported = list(iter_records(records, chunk_size=3))
+
+        self.assertEqual(exported, expected)
+        self.assertEqual(len(exported), 8)
+
+    def test_staff_can_export_gateway_window_as_ndjson(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(
+            reverse("gateway_record_export"),
+            {
+                "gateway": self.gateway.gateway_id,
+                "start": self.start.isoformat(),
+                "end": (self.start + timedelta(hours=1)).isoformat(),
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        records = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(len(records), 7)
+        self.assertEqual(
+            records[0],
+            {
+                "id": records[0]["id"],
+                "timestamp": self.start.isoformat(),
+                "gateway_id": self.gateway.gateway_id,
+                "token_uuid": self.token.token_uuid,
+            },
+        )
+
+    def test_staff_can_export_token_as_csv(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(
+            reverse("gateway_record_export"),
+            {"token": self.token.token_uuid, "output": "csv"},
+        )
+
+        rows = list(
+            csv.reader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(rows[0], ["id", "timestamp", "gateway_id", "token_uuid"])
+        self.assertEqual(len(rows), 10)
+
+    def test_export_requires_filter_and_staff(self):
+        url = reverse("gateway_record_export")
+        self.client.force_authenticate(user=self.staff)
+        self.assertEqual(self.client.get(url).status_code, 400)
+        response = self.client.get(url, {"token": "x", "start": "yesterday"})
+        self.assertEqual(response.data, "Invalid start")
+
+        self.client.force_authenticate(user=self.gateway.site_owner.user)
+        response = self.client.get(url, {"token": self.token.token_uuid})
+        self.assertEqual(response.status_code, 403)
+
+    def test_export_command(self):
+        stdout = StringIO()
+        call_command(
+            "export_gateway_records",
+            "--gateway",
+            self.other_gateway.gateway_id,
+            "--format",
+            "csv",
+            stdout=stdout,
+        )
+
+        rows = list(csv.reader(stdout.getvalue().splitlines()))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2], self.other_gateway.gateway_id)
@@ -0,0 +1,97 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import OperationalError
+from django.test import TestCase
+from django.utils import timezone
+from ..helpers.record_queue import GatewayRecordQueue
+from ..models import SiteOwner, Gateway, Identity, Token, GatewayRecord
+
+User = get_user_model()
+
+
+class GatewayRecordQueueTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            email="testuser1@gmail.com", password="testpassword1"
+        )
+        site_owner = SiteOwner.objects.create(
+            user=user,
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+            email_validated=True,
+        )
+        cls.gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-1", site_owner=site_owner
+        )
+        identity = Identity.objects.create(
+            nric="S9111111A",
+            fullname="Test Person",
+            address="Test Address",
+            phone_num="91234567",
+        )
+        cls.token = Token.objects.create(
+            token_uuid="c5:d7:14:84:f8:cf", hashed_pin="", owner=identity
+        )
+
+    def setUp(self):
+        spill_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spill_dir.cleanup)
+        self.spill_path = os.path.join(spill_dir.name, "spill.jsonl")
+        self.queue = GatewayRecordQueue(
+            batch_size=2,
+            flush_interval=1,
+            max_size=3,
+            spill_path=self.spill_path,
+            autostart=False,
+        )
+
+    def make_record(self, timestamp=None):
+        return GatewayRecord(
+            token=self.token,
+            gateway=self.gateway,
+            timestamp=timestamp or timezone.now(),
+        )
+
+    def test_drain_writes_queued_records_with_their_timestamp(self):
+        timestamp = timezone.now() - timedelta(minutes=5)
+        for _ in range(3):
+            self.queue.put(self.make_record(timestamp))
+
+        self.assertEqual(GatewayRecord.objects.count(), 0)
+        self.queue.drain()
+
+        self.assertEqual(GatewayRecord.objects.filter(timestamp=timestamp).count(), 3)
+        self.assertEqual(self.queue.stats()["flushed"], 3)
+
+    def test_full_queue_spills_to_file(self):
+        for _ in range(4):
+            self.queue.put(self.make_record())
+
+        self.assertEqual(self.queue.stats()["queued"], 3)
+        self.assertEqual(self.queue.stats()["spilled"], 1)
+
+        self.queue.drain()
+
+        self.assertEqual(GatewayRecord.objects.count(), 4)
+        self.assertFalse(os.path.exists(self.spill_path))
+
+    def test_unavailable_database_spills_and_replays(self):
+        self.queue.put(self.make_record())
+        with mock.patch.object(
+            GatewayRecord.objects, "bulk_create", side_effect=OperationalError
+        ), self.assertLogs("gateway.helpers.record_queue", "ERROR"):
+            self.queue.flush()
+
+        self.assertEqual(GatewayRecord.objects.count(), 0)
+        self.assertTrue(os.path.exists(self.spill_path))
+
+        self.queue.put(self.make_record())
+        self.queue.flush()
+
+        self.assertEqual(GatewayRecord.objects.count(), 2)
+        self.assertFalse(os.path.exists(self.spill_path))
@@ -0,0 +1,139 @@
+from datetime import timedelta
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from ..helpers.occupancy import bucket_start
+from ..helpers.rollup import get_watermark, hourly_visits
+from ..models import (
+    Gateway,
+    GatewayRecord,
+    GatewayRecordRollup,
+    Identity,
+    SiteOwner,
+    Token,
+)
+
+User = get_user_model()
+
+
+class RollupTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email="analyst@gmail.com", password="testpassword1"
+        )
+        cls.staff.is_staff = True
+        cls.staff.save()
+        site_owner = SiteOwner.objects.create(
+            user=User.objects.create_user(
+                email="testuser1@gmail.com", password="testpassword1"
+            ),
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+        )
+        cls.entrance, cls.exit = [
+            Gateway.objects.create(
+                gateway_id=f"610123-01-123-{i}", site_owner=site_owner
+            )
+            for i in (1, 2)
+        ]
+        identity = Identity.objects.create(
+            nric="S9111111A", fullname="", address="", phone_num="91234567"
+        )
+        cls.token = Token.objects.create(
+            token_uuid="c5:d7:14:84:f8:cf", owner=identity, hashed_pin=""
+        )
+        cls.open_hour = bucket_start(timezone.now(), "hour")
+        for gateway, hours_ago in (
+            (cls.entrance, 3),
+            (cls.entrance, 3),
+            (cls.entrance, 2),
+            (cls.exit, 2),
+            (cls.entrance, 0),
+        ):
+            cls.check_in(gateway, cls.open_hour - timedelta(hours=hours_ago))
+
+    @classmethod
+    def check_in(cls, gateway, timestamp):
+        GatewayRecord.objects.create(
+            token=cls.token, gateway=gateway, timestamp=timestamp + timedelta(minutes=1)
+        )
+
+    def rollup(self, *args):
+        call_command("rollup_gateway_records", *args, stdout=StringIO())
+
+    def visits(self, by="gateway"):
+        return [
+            (
+                visit[by],
+                (self.open_hour - visit["hour"]) // timedelta(hours=1),
+                visit["visits"],
+            )
+            for visit in hourly_visits(
+                self.open_hour - timedelta(hours=4), timezone.now(), by=by
+            )
+        ]
+
+    def test_closed_hours_are_read_from_rollups(self):
+        expected = [
+            (self.entrance.gateway_id, 3, 2),
+            (self.entrance.gateway_id, 2, 1),
+            (self.exit.gateway_id, 2, 1),
+            (self.entrance.gateway_id, 0, 1),
+        ]
+        self.assertEqual(self.visits(), expected)
+
+        self.rollup()
+
+        self.assertEqual(get_watermark(), self.open_hour)
+        self.assertEqual(GatewayRecordRollup.objects.count(), 3)
+        # Only the open hour still comes from the gateway records
+        GatewayRecord.objects.filter(timestamp__lt=self.open_hour).delete()
+        with self.assertNumQueries(3):
+            self.assertEqual(self.visits(), expected)
+        self.assertEqual(
+            self.visits(by="premises"),
+            [("610123-01-123", 3, 2), ("610123-01-123", 2, 2), ("610123-01-123", 0, 1)],
+        )
+
+    def test_late_records_within_lookback_are_rolled_up(self):
+        self.rollup()
+        self.check_in(self.exit, self.open_hour - timedelta(hours=2))
+        self.check_in(self.exit, self.open_hour - timedelta(hours=5))
+
+        self.rollup("--lookback", "3")
+        self.rollup("--lookback", "3")
+
+        rollup = GatewayRecordRollup.objects.get(
+            gateway=self.exit, hour=self.open_hour - timedelta(hours=2)
+        )
+        self.assertEqual(rollup.visits, 2)
+        # Older than the lookback, until the hours are aggregated again
+        self.assertFalse(
+            GatewayRecordRollup.objects.filter(
+                hour=self.open_hour - timedelta(hours=5)
+            ).exists()
+        )
+        self.rollup("--since", (self.open_hour - timedelta(hours=6)).isoformat())
+        self.assertEqual(GatewayRecordRollup.objects.count(), 4)
+
+    def test_staff_can_read_hourly_visits(self):
+        url = reverse("hourly_visits")
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(
+            url, {"start": (self.open_hour - timedelta(hours=2)).isoformat()}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(visit["premises"], visit["visits"]) for visit in response.data],
+            [("610123-01-123", 2), ("610123-01-123", 1)],
+        )
+        self.assertEqual(self.client.get(url, {"by": "token"}).data, "Invalid grouping")
+
+        self.client.force_authenticate(user=self.entrance.site_owner.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
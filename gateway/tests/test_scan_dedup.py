@@ -0,0 +1,118 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from ..helpers.eligibility import eligibility_index
+from ..helpers.pin_cache import pin_cache
+from ..helpers.scan_dedup import duplicate_scan_filter
+from ..models import Gateway, GatewayRecord, Identity, MedicalRecord, SiteOwner, Token
+
+User = get_user_model()
+
+
+class DuplicateScanTestCase(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other_user = [
+            User.objects.create_user(email=email, password="testpassword1")
+            for email in ("testuser1@gmail.com", "testuser2@gmail.com")
+        ]
+        site_owner = SiteOwner.objects.create(
+            user=cls.user,
+            postal_code="610123",
+            unit_no="01-123",
+            activation_key=1234,
+            email_validated=True,
+        )
+        cls.gateway = Gateway.objects.create(
+            gateway_id="610123-01-123-1", site_owner=site_owner
+        )
+        identity = Identity.objects.create(
+            nric="S9111111A", fullname="", address="", phone_num="91234567"
+        )
+        cls.token = Token.objects.create(
+            token_uuid="c5:d7:14:84:f8:cf",
+            hashed_pin=make_password("123456"),
+            owner=identity,
+        )
+        MedicalRecord.objects.create(
+            identity=identity, token=cls.token, vaccination_status=True
+        )
+
+    def setUp(self):
+        pin_cache.clear()
+        eligibility_index.build()
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+
+    def scan(self, **fields):
+        return {
+            "token_uuid": self.token.token_uuid,
+            "gateway_id": self.gateway.gateway_id,
+            "pin": "123456",
+            **fields,
+        }
+
+    def check_in(self, **fields):
+        return self.client.post(reverse("gateway_record"), self.scan(**fields)).data
+
+    def test_repeat_scan_is_not_recorded(self):
+        self.assertEqual(self.check_in(), "Added gateway record")
+        suppressed = duplicate_scan_filter.suppressed
+
+        with mock.patch.object(pin_cache, "verify") as verify:
+            self.assertEqual(self.check_in(), "Added gateway record")
+        verify.assert_not_called()
+
+        self.assertEqual(GatewayRecord.objects.count(), 1)
+        self.assertEqual(duplicate_scan_filter.suppressed, suppressed + 1)
+
+    def test_repeat_scan_with_other_pin_is_verified(self):
+        self.check_in()
+
+        self.assertEqual(self.check_in(pin="111111"), "Invalid PIN entered")
+
+    def test_repeat_scan_by_other_user_is_verified(self):
+        self.check_in()
+        self.client.force_authenticate(user=self.other_user)
+
+        self.assertEqual(self.check_in(), "Invalid gateway")
+
+    def test_buffered_scans_outside_window_are_recorded(self):
+        scans = [
+            self.scan(timestamp="2021-10-01T08:00:00Z"),
+            self.scan(timestamp="2021-10-01T09:00:00Z"),
+            self.scan(timestamp="2021-10-01T09:00:10Z"),
+        ]
+        response = self.client.post(
+            reverse("gateway_record_batch"), scans[:2], format="json"
+        )
+        self.assertEqual(response.data, ["Added gateway record"] * 2)
+
+        response = self.client.post(
+            reverse("gateway_record_batch"), scans[2:], format="json"
+        )
+        self.assertEqual(response.data, ["Added gateway record"])
+        self.assertEqual(GatewayRecord.objects.count(), 2)
+
+    def test_pin_change_forgets_recent_scans(self):
+        self.check_in()
+        self.token.hashed_pin = make_password("111111")
+        self.token.save()
+
+        self.assertEqual(self.check_in(), "Invalid PIN entered")
+
+    def test_suppressed_scans_are_reported_in_metrics(self):
+        self.check_in()
+        self.check_in()
+        self.user.is_staff = True
+        self.user.save()
+
+        response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(
+            response.data["duplicate_scans"], duplicate_scan_filter.stats()
+        )
+        self.assertGreaterEqual(response.data["duplicate_scans"]["suppressed"], 1)
@@ -1,22 +1,65 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     LoginView,
     RegisterView,
     GatewayList,
     GatewayDetail,
+    GatewayStats,
     GatewayRecordCreate,
+    GatewayRecordBatchCreate,
+    GatewayRecordExport,
+    AllowListSnapshotView,
     TokenDetail,
     VerifyEmailView,
+    ContactTracingView,
+    HourlyVisitsView,
+    MetricsView,
 )
 from knox import views as knox_views
 
+# Serve the gateway hot paths with async views when deployed under ASGI
+if settings.ASYNC_VIEWS:
+    from .async_views import (
+        AsyncGatewayList as GatewayList,
+        AsyncGatewayRecordCreate as GatewayRecordCreate,
+        AsyncTokenDetail as TokenDetail,
+    )
+
 urlpatterns = [
     path("register/", RegisterView.as_view(), name="register"),
     path("verify-email/<str:key>", VerifyEmailView.as_view(), name="verify_email"),
     path("login/", LoginView.as_view(), name="login"),
     path("logout/", knox_views.LogoutView.as_view(), name="logout"),
     path("v1/gateways/", GatewayList.as_view(), name="gateways"),
+    path("v1/gateways/stats", GatewayStats.as_view(), name="gateways_stats"),
+    path(
+        "v1/gateways/allowlist/",
+        AllowListSnapshotView.as_view(),
+        name="allow_list",
+    ),
     path("v1/gateways/<int:pk>", GatewayDetail.as_view(), name="gateways_detail"),
     path("v1/gatewayrecord/", GatewayRecordCreate.as_view(), name="gateway_record"),
+    path(
+        "v1/gatewayrecord/batch/",
+        GatewayRecordBatchCreate.as_view(),
+        name="gateway_record_batch",
+    ),
+    path(
+        "v1/gatewayrecord/export/",
+        GatewayRecordExport.as_view(),
+        name="gateway_record_export",
+    ),
+    path(
+        "v1/gatewayrecord/contacts/",
+        ContactTracingView.as_view(),
+        name="contact_tracing",
+    ),
+    path(
+        "v1/gatewayrecord/hourly/",
+        HourlyVisitsView.as_view(),
+        name="hourly_visits",
+    ),
     path("v1/token/<str:token_uuid>", TokenDetail.as_view(), name="token"),
+    path("v1/metrics/", MetricsView.as_view(), name="metrics"),
 ]
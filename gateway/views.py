@@ -1,14 +1,18 @@
+from django.conf import settings
 from django.contrib.auth import login
-from django.contrib.auth.hashers import check_password
-from django.http import Http404
+from django.http import Http404, StreamingHttpResponse
+from django.db import IntegrityError, transaction
 from django.db.models import ProtectedError
+from django.utils import timezone
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.authtoken.serializers import AuthTokenSerializer
+from knox.models import AuthToken
 from knox.views import LoginView as KnoxLoginView
-from .models import Gateway, MedicalRecord, SiteOwner, Token, GatewayRecord
+from .models import Gateway, SiteOwner, Token
 from .serializers import (
     GatewaySerializer,
     GatewayRecordSerializer,
@@ -16,7 +20,33 @@ from .serializers import (
     SiteOwnerSerializer,
 )
 import hashlib
+from datetime import timedelta
+from itertools import islice
+from .authentication import CachedTokenAuthentication, GatewayTokenAuthentication
 from .helpers import verify_email
+from .helpers.allow_list import (
+    allow_list_snapshot,
+    encode_snapshot,
+    pin_verifier_writer,
+)
+from .helpers.checkin import check_in, check_in_batch
+from .helpers.contact_tracing import SCOPES, find_contacts
+from .helpers.eligibility import eligibility_index
+from .helpers.gateway_registry import gateway_registry
+from .helpers.idempotency import check_in_results
+from .helpers.occupancy import occupancy_counters, occupancy_stats
+from .helpers.pin_cache import pin_cache
+from .helpers.pin_executor import PinVerificationBusy
+from .helpers.record_export import (
+    EXPORT_FORMATS,
+    export_queryset,
+    iter_records,
+    parse_export_filters,
+    parse_moment,
+)
+from .helpers.rollup import GROUPINGS, hourly_visits
+from .helpers.record_queue import gateway_record_queue
+from .helpers.scan_dedup import duplicate_scan_filter
 
 
 class LoginView(KnoxLoginView):
@@ -65,19 +95,38 @@ class RegisterView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         email = serializer.validated_data["user"]["email"]
-        activation_key = verify_email.generate_activation_key(email=email)
-        email_verification_error = verify_email.sendVerificationEmail(
-            request, activation_key, email
-        )
-        if email_verification_error:
-            return Response("Unable to send email verification. Please try again")
-        site_owner = serializer.save()
-        site_owner.activation_key = activation_key
-        site_owner.save()
+
+        def save(activation_key):
+            site_owner = serializer.save(activation_key=activation_key)
+            # The email is sent by the `send_queued_emails` worker
+            verify_email.queueVerificationEmail(activation_key, email)
+            return site_owner
+
+        site_owner = verify_email.save_with_activation_key(save)
         return Response(f"Account created for {site_owner.user.email}")
 
 
-class GatewayList(APIView):
+def _gateway_index(gateway):
+    """
+    Returns the index of a gateway from its `<postal code>-<unit no>-<index>` id.
+    """
+    return int(gateway.gateway_id.rsplit("-", 1)[1])
+
+
+class SiteOwnerMixin:
+    """
+    Resolves the site owner of the authenticated user. The authentication class
+    loads it together with the user, so this does not query the database.
+    """
+
+    def get_site_owner(self):
+        try:
+            return self.request.user.siteowner
+        except SiteOwner.DoesNotExist:
+            raise PermissionDenied("User is not a site owner")
+
+
+class GatewayList(SiteOwnerMixin, APIView):
     """
     List all gateways, or create/delete gateway from the back.
 
@@ -91,52 +140,99 @@ class GatewayList(APIView):
         This method returns a list of all gateways for the current authenticated
         user.
         """
-        site_owner = SiteOwner.objects.get(user=self.request.user)
+        site_owner = self.get_site_owner()
         gateways = Gateway.objects.filter(site_owner=site_owner)
         serializer = GatewaySerializer(gateways, many=True)
         return Response(serializer.data)
 
     def post(self, request, format=None):
         """
-        This method adds a gateway from the back for the current authenticated user.
+        This method adds gateways from the back for the current authenticated user.
+        A single gateway is added unless a `count` is given, in which case the
+        list of added gateways is returned.
         """
-        site_owner = SiteOwner.objects.get(user=self.request.user)
-        num_gateways = Gateway.objects.filter(site_owner=site_owner).count()
-        if num_gateways == 4:
-            return Response("Maximum number of gateways", 204)
-        next_index = num_gateways + 1
-
-        gateway_id = f"{site_owner.postal_code}-{site_owner.unit_no}-{next_index}"
-
-        gateway = Gateway(
-            gateway_id=gateway_id,
-            site_owner=site_owner,
-        )
-        gateway.save()
+        try:
+            count = int(request.data.get("count", 1))
+        except (TypeError, ValueError):
+            return Response("Invalid count", 400)
+        if count < 1:
+            return Response("Invalid count", 400)
+
+        site_owner = self.get_site_owner()
+        with transaction.atomic():
+            # Lock the site owner so concurrent requests pick different indexes
+            SiteOwner.objects.select_for_update().get(pk=site_owner.pk)
+            used_indexes = {
+                _gateway_index(gateway)
+                for gateway in Gateway.objects.filter(site_owner=site_owner)
+            }
+            if len(used_indexes) + count > settings.MAX_GATEWAYS_PER_SITE_OWNER:
+                return Response("Maximum number of gateways", 204)
+
+            free_indexes = (
+                index
+                for index in range(1, settings.MAX_GATEWAYS_PER_SITE_OWNER + 1)
+                if index not in used_indexes
+            )
+            gateway_ids = [
+                f"{site_owner.postal_code}-{site_owner.unit_no}-{next_index}"
+                for next_index in islice(free_indexes, count)
+            ]
+            Gateway.objects.bulk_create(
+                Gateway(gateway_id=gateway_id, site_owner=site_owner)
+                for gateway_id in gateway_ids
+            )
 
-        serializer = GatewaySerializer(gateway)
+        # Reload the gateways as bulk_create does not set their ids on MariaDB
+        gateways = Gateway.objects.filter(gateway_id__in=gateway_ids).order_by("id")
+        if "count" not in request.data:
+            return Response(GatewaySerializer(gateways.get()).data)
+        serializer = GatewaySerializer(gateways, many=True)
         return Response(serializer.data)
 
     def delete(self, request, format=None):
         """
         This method removes a gateway from the back for the current authenticated user.
         """
-        site_owner = SiteOwner.objects.get(user=self.request.user)
-        gateway_to_delete = (
-            Gateway.objects.filter(site_owner=site_owner).order_by("gateway_id").last()
-        )
-        if gateway_to_delete is None:
-            return Response("", 204)
-
-        serializer = GatewaySerializer(gateway_to_delete)
-        try:
-            gateway_to_delete.delete()
-        except ProtectedError:
-            return Response("", 204)
+        site_owner = self.get_site_owner()
+        with transaction.atomic():
+            SiteOwner.objects.select_for_update().get(pk=site_owner.pk)
+            gateway_to_delete = max(
+                Gateway.objects.filter(site_owner=site_owner),
+                key=_gateway_index,
+                default=None,
+            )
+            if gateway_to_delete is None:
+                return Response("", 204)
+
+            serializer = GatewaySerializer(gateway_to_delete)
+            try:
+                gateway_to_delete.delete()
+            except ProtectedError:
+                return Response("", 204)
         return Response(serializer.data)
 
 
-class GatewayDetail(APIView):
+class GatewayStats(SiteOwnerMixin, APIView):
+    """
+    Check-in counts of the gateways of the current authenticated user, served
+    from the occupancy counters.
+
+    * Requires user to be authenticated
+    """
+
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, format=None):
+        # Include the check-ins this process has counted but not written yet
+        occupancy_counters.flush(blocking=False)
+        gateways = Gateway.objects.filter(site_owner=self.get_site_owner()).order_by(
+            "gateway_id"
+        )
+        return Response(occupancy_stats(list(gateways)))
+
+
+class GatewayDetail(SiteOwnerMixin, APIView):
     """
     Updates  authentication token of specified gateway.
 
@@ -147,16 +243,14 @@ class GatewayDetail(APIView):
 
     def get_object(self, pk):
         try:
-            return Gateway.objects.get(id=pk)
+            return Gateway.objects.get(id=pk, site_owner=self.get_site_owner())
         except Gateway.DoesNotExist:
-            raise Http404
+            raise PermissionDenied("Gateway does not belong to site owner")
 
     def put(self, request, pk, format=None):
         """
         This method updates the authentication token of the gateway.
         """
-        gateway = self.get_object(pk)
-
         # Get token value
         auth = self.request.headers["Authorization"].split()
         if auth[0].lower() != "token":
@@ -168,71 +262,116 @@ class GatewayDetail(APIView):
         token = auth[1]
         token_hash = hashlib.sha256(token.encode()).hexdigest()
 
-        site_owner = SiteOwner.objects.get(user=self.request.user)
-        gateways = Gateway.objects.filter(site_owner=site_owner)
-
         # Check gateway to update belongs to site owner
-        if gateway not in gateways:
-            return Response("Gateway does not belong to site owner", 403)
+        gateway = self.get_object(pk)
 
         # Toggle token value
-        if gateway.authentication_token == None:
-            # Start gateway
-            # Check that current token key has not been used
-            for check_gateway in gateways:
-                if token_hash == check_gateway.authentication_token:
-                    return Response("Token already used")
-            gateway.authentication_token = token_hash
+        auth_token_key = authentication_expiry = None
+        if gateway.authentication_token is None:
+            # Start gateway, until the site owner's token expires or is deleted
+            authentication_token = token_hash
+            if isinstance(request.auth, AuthToken):
+                auth_token_key = request.auth.token_key
+                authentication_expiry = request.auth.expiry
         else:
             # Stop gateway
-            gateway.authentication_token = None
-        gateway.save()
+            authentication_token = None
 
+        # Only update the gateway if it was not toggled since it was read. The
+        # unique constraint rejects a token already used by another gateway.
+        try:
+            updated = Gateway.objects.filter(
+                id=gateway.id, authentication_token=gateway.authentication_token
+            ).update(
+                authentication_token=authentication_token,
+                auth_token_key=auth_token_key,
+                authentication_expiry=authentication_expiry,
+            )
+        except IntegrityError:
+            return Response("Token already used")
+        if not updated:
+            return Response("Gateway was updated concurrently, please try again", 409)
+
+        gateway_registry.invalidate(gateway.gateway_id)
+        gateway.authentication_token = authentication_token
         serializer = GatewaySerializer(gateway)
         return Response(serializer.data)
 
 
 class GatewayRecordCreate(generics.CreateAPIView):
+    authentication_classes = (GatewayTokenAuthentication, CachedTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
 
     def post(self, request, format=None):
         serializer = GatewayRecordSerializer(data=request.data)
         if serializer.is_valid():
-            token_uuid = serializer.validated_data.get("token_uuid")
-            token = (
-                Token.objects.filter(token_uuid=token_uuid).filter(status=True).first()
-            )
-            gateway_id = serializer.validated_data.get("gateway_id")
-            gateway = Gateway.objects.filter(gateway_id=gateway_id).first()
-            pin = serializer.validated_data.get("pin")
+            try:
+                return Response(check_in(self.request.user, serializer.validated_data))
+            except PinVerificationBusy:
+                return Response("Server busy, please try again", 503)
+        return Response("Invalid")
 
-            # Check valid token (active)
-            if token is None or gateway is None:
-                return Response("Invalid token or gateway")
 
-            # Check gateway belongs to authenticated site owner
-            user = self.request.user
-            site_owner = SiteOwner.objects.get(user=user)
+class GatewayRecordBatchCreate(APIView):
+    """
+    Adds a batch of gateway records buffered by a gateway.
 
-            if gateway.site_owner != site_owner:
-                return Response("Invalid gateway")
+    The response holds one result per scan, in the order they were submitted.
 
-            # Check Token belongs to owner
-            if not check_password(pin, token.hashed_pin):
-                return Response("Invalid PIN entered")
+    * Requires user or gateway to be authenticated
+    """
 
-            # Get vaccination status
-            medical_record = MedicalRecord.objects.get(identity=token.owner)
-            if medical_record.vaccination_status != True:
-                return Response("Person is not vaccinated")
+    authentication_classes = (GatewayTokenAuthentication, CachedTokenAuthentication)
+    permission_classes = (permissions.IsAuthenticated,)
 
-            gateway_record = GatewayRecord(
-                token=token,
-                gateway=gateway,
-            )
-            gateway_record.save()
-            return Response("Added gateway record")
-        return Response("Invalid")
+    def post(self, request, format=None):
+        scans = request.data
+        if not isinstance(scans, list) or not scans:
+            return Response("Invalid")
+        if len(scans) > settings.GATEWAY_RECORD_BATCH_LIMIT:
+            return Response("Too many records", 400)
+
+        try:
+            return Response(check_in_batch(self.request.user, scans))
+        except PinVerificationBusy:
+            return Response("Server busy, please try again", 503)
+
+
+class AllowListSnapshotView(APIView):
+    """
+    This view streams the allow-list a gateway uses to check tokens in while
+    offline: the active tokens checked in at the premises of its site owner,
+    with their eligibility and PIN verifier, in full or as the changes since
+    the version given as `since`.
+
+    The body is JSON lines, the last of which holds the HMAC-SHA256 of the
+    others, keyed with the SHA-256 of the token the gateway was started with.
+
+    * Requires a started gateway
+    """
+
+    authentication_classes = (GatewayTokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def get(self, request, format=None):
+        gateway = getattr(request, "gateway", None)
+        if gateway is None:
+            raise PermissionDenied("Allow-list is only served to started gateways")
+
+        since = request.query_params.get("since")
+        if since is not None:
+            try:
+                since = int(since)
+            except ValueError:
+                return Response("Invalid version", 400)
+
+        version, lines = allow_list_snapshot(gateway.site_owner_id, since)
+        response = StreamingHttpResponse(
+            encode_snapshot(lines, gateway.authentication_token),
+            content_type="application/x-ndjson",
+        )
+        response["X-Allow-List-Version"] = version
+        return response
 
 
 class TokenDetail(APIView):
@@ -255,3 +394,120 @@ class TokenDetail(APIView):
         token = self.get_object(token_uuid)
         serializer = TokenSerializer(token)
         return Response(serializer.data)
+
+
+class GatewayRecordExport(APIView):
+    """
+    This view streams the gateway records of a gateway and/or token for
+    contact tracing, as NDJSON or CSV.
+
+    * Requires user to be staff
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, format=None):
+        output = request.query_params.get("output", "ndjson")
+        if output not in EXPORT_FORMATS:
+            return Response("Invalid output", 400)
+        try:
+            filters = parse_export_filters(request.query_params)
+        except ValueError as error:
+            return Response(str(error), 400)
+
+        render, content_type = EXPORT_FORMATS[output]
+        records = iter_records(
+            export_queryset(**filters), settings.GATEWAY_RECORD_EXPORT_CHUNK_SIZE
+        )
+        response = StreamingHttpResponse(render(records), content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="gatewayrecords.{output}"'
+        )
+        return response
+
+
+class ContactTracingView(APIView):
+    """
+    This view finds the tokens that visited the same gateway, or premises, as
+    a token within a window of minutes around each of its visits.
+
+    * Requires user to be staff
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, format=None):
+        params = request.query_params
+        scope = params.get("scope", "gateway")
+        if scope not in SCOPES:
+            return Response("Invalid scope", 400)
+        try:
+            window = int(params.get("window", settings.CONTACT_TRACING_WINDOW))
+        except ValueError:
+            return Response("Invalid window", 400)
+        if not 0 <= window <= settings.CONTACT_TRACING_MAX_WINDOW:
+            return Response("Invalid window", 400)
+        if not params.get("token"):
+            return Response("A token is required", 400)
+        try:
+            filters = parse_export_filters(params)
+        except ValueError as error:
+            return Response(str(error), 400)
+
+        return Response(
+            find_contacts(
+                filters["token_uuid"],
+                window,
+                scope=scope,
+                start=filters["start"],
+                end=filters["end"],
+            )
+        )
+
+
+class HourlyVisitsView(APIView):
+    """
+    This view returns the number of visits per premises, or gateway, and hour
+    between `start` and `end`, from the hourly rollups and the open hour.
+
+    * Requires user to be staff
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, format=None):
+        by = request.query_params.get("by", "premises")
+        if by not in GROUPINGS:
+            return Response("Invalid grouping", 400)
+        try:
+            start = parse_moment(request.query_params, "start")
+            end = parse_moment(request.query_params, "end")
+        except ValueError as error:
+            return Response(str(error), 400)
+
+        end = end or timezone.now()
+        start = start or end - timedelta(days=7)
+        return Response(hourly_visits(start, end, by=by))
+
+
+class MetricsView(APIView):
+    """
+    This view reports the counters of the in-process check-in caches.
+
+    * Requires user to be staff
+    """
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request, format=None):
+        return Response(
+            {
+                "pin_cache": pin_cache.stats(),
+                "eligibility_index": eligibility_index.stats(),
+                "gateway_record_queue": gateway_record_queue.stats(),
+                "occupancy_counters": occupancy_counters.stats(),
+                "pin_verifiers": pin_verifier_writer.stats(),
+                "duplicate_scans": duplicate_scan_filter.stats(),
+                "check_in_results": check_in_results.stats(),
+            }
+        )